@@ -87,11 +87,11 @@ class DocumentOwnerOrAdmin(permissions.BasePermission):
         if request.user.role == 'department_head':
             # Check if user is head of document's department
             if hasattr(obj, 'department'):
-                user_departments = request.user.department_assignments.filter(
+                if request.user.department_assignments.filter(
+                    department_id=obj.department.id,
                     end_date__isnull=True,
                     role='head'
-                ).values_list('department', flat=True)
-                if obj.department.id in user_departments:
+                ).exists():
                     return True
         
         # Log permission denial
@@ -118,12 +118,8 @@ class DocumentSharePermission(permissions.BasePermission):
         
         # Check if user has explicit share permission
         if hasattr(obj, 'permissions'):
-            has_share_permission = obj.permissions.filter(
-                user=request.user,
-                permission='share',
-                is_active=True
-            ).exists()
-            if has_share_permission:
+            from documents.utils import document_permission_granted
+            if document_permission_granted(obj.id, 'share', request.user.id):
                 return True
         
         security_logger.warning(
@@ -146,19 +142,19 @@ class DepartmentPermission(permissions.BasePermission):
         
         # Department heads can manage their own departments
         if request.user.role == 'department_head':
-            user_departments = request.user.department_assignments.filter(
+            if request.user.department_assignments.filter(
+                department_id=obj.id,
                 end_date__isnull=True,
                 role='head'
-            ).values_list('department', flat=True)
-            if obj.id in user_departments:
+            ).exists():
                 return True
         
         # Regular users can view departments they belong to
         if view.action in ['retrieve', 'list']:
-            user_departments = request.user.department_assignments.filter(
+            if request.user.department_assignments.filter(
+                department_id=obj.id,
                 end_date__isnull=True
-            ).values_list('department', flat=True)
-            if obj.id in user_departments:
+            ).exists():
                 return True
         
         return False
@@ -10,7 +10,7 @@ from django.contrib.auth.models import Group
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
 from django.utils import timezone
-from django.db.models import Q, Count
+from django.db.models import Count, Exists, OuterRef, Q
 from django.contrib.auth.hashers import make_password, check_password
 from django.core.mail import send_mail
 from django.conf import settings
@@ -22,7 +22,7 @@ from .serializers import (
     LoginAttemptSerializer, GroupSerializer, GroupMemberSerializer, GroupListSerializer
 )
 from .permissions import CanManageUsers
-from departments.models import Permission
+from departments.models import EmployeeDepartment, Permission
 from documents.utils import user_has_permission
 import logging
 
@@ -258,10 +258,14 @@ class UserListView(generics.ListAPIView):
                 end_date__isnull=True,
                 role='head'
             ).values_list('department', flat=True)
-            return queryset.filter(
-                department_assignments__department__in=user_departments,
-                department_assignments__end_date__isnull=True
-            ).distinct()
+            # EXISTS per user instead of joining assignments and de-duplicating with DISTINCT
+            return queryset.filter(Exists(
+                EmployeeDepartment.objects.filter(
+                    employee=OuterRef('pk'),
+                    department__in=user_departments,
+                    end_date__isnull=True
+                )
+            ))
         else:
             # Regular users can only see themselves
             return queryset.filter(id=user.id)
@@ -291,13 +295,13 @@ class UserDetailView(generics.RetrieveAPIView):
             user_departments = user.department_assignments.filter(
                 end_date__isnull=True,
                 role='head'
-            ).values_list('department', flat=True)
+            ).values('department')
             
-            target_departments = obj.department_assignments.filter(
-                end_date__isnull=True
-            ).values_list('department', flat=True)
-            
-            if any(dept in user_departments for dept in target_departments):
+            # One EXISTS with the head's departments as a subquery
+            if obj.department_assignments.filter(
+                end_date__isnull=True,
+                department__in=user_departments
+            ).exists():
                 return obj
         
         # Log unauthorized access attempt
@@ -479,27 +483,41 @@ def user_stats(request):
             status=status.HTTP_403_FORBIDDEN
         )
     
-    stats = {
-        'total_users': User.objects.count(),
-        'active_users': User.objects.filter(is_active=True).count(),
-        'verified_users': User.objects.filter(is_verified=True).count(),
-        'users_by_role': {},
-        'recent_registrations': User.objects.filter(
-            created_at__gte=timezone.now() - timezone.timedelta(days=30)
-        ).count(),
-        'recent_logins': LoginAttempt.objects.filter(
-            successful=True,
-            attempted_at__gte=timezone.now() - timezone.timedelta(days=7)
-        ).count(),
-        'failed_logins_today': LoginAttempt.objects.filter(
+    now = timezone.now()
+    
+    # One conditional aggregate per table instead of a COUNT per figure
+    user_counts = User.objects.aggregate(
+        total_users=Count('id'),
+        active_users=Count('id', filter=Q(is_active=True)),
+        verified_users=Count('id', filter=Q(is_verified=True)),
+        recent_registrations=Count('id', filter=Q(created_at__gte=now - timezone.timedelta(days=30))),
+        **{
+            f'role_{role_code}': Count('id', filter=Q(role=role_code))
+            for role_code, _ in User.ROLE_CHOICES
+        }
+    )
+    # Today's attempts are a subset of the last week's
+    week_ago = now - timezone.timedelta(days=7)
+    login_counts = LoginAttempt.objects.filter(attempted_at__gte=week_ago).aggregate(
+        recent_logins=Count('id', filter=Q(successful=True)),
+        failed_logins_today=Count('id', filter=Q(
             successful=False,
-            attempted_at__gte=timezone.now().replace(hour=0, minute=0, second=0)
-        ).count()
-    }
+            attempted_at__gte=now.replace(hour=0, minute=0, second=0)
+        ))
+    )
     
-    # Count users by role
-    for role_code, role_name in User.ROLE_CHOICES:
-        stats['users_by_role'][role_name] = User.objects.filter(role=role_code).count()
+    stats = {
+        'total_users': user_counts['total_users'],
+        'active_users': user_counts['active_users'],
+        'verified_users': user_counts['verified_users'],
+        'users_by_role': {
+            role_name: user_counts[f'role_{role_code}']
+            for role_code, role_name in User.ROLE_CHOICES
+        },
+        'recent_registrations': user_counts['recent_registrations'],
+        'recent_logins': login_counts['recent_logins'],
+        'failed_logins_today': login_counts['failed_logins_today'],
+    }
     
     return Response(stats)
 
@@ -891,13 +891,19 @@ def permission_report(request):
     
     try:
         # Get summary statistics
-        total_permissions = Permission.objects.filter(is_active=True).count()
-        user_permissions = Permission.objects.filter(entity_type='user', is_active=True).count()
-        dept_permissions = Permission.objects.filter(entity_type='department', is_active=True).count()
-        category_permissions = Permission.objects.filter(entity_type='category', is_active=True).count()
+        from django.db.models import Count, Q
+        counts = Permission.objects.filter(is_active=True).aggregate(
+            total=Count('id'),
+            user=Count('id', filter=Q(entity_type='user')),
+            department=Count('id', filter=Q(entity_type='department')),
+            category=Count('id', filter=Q(entity_type='category')),
+        )
+        total_permissions = counts['total']
+        user_permissions = counts['user']
+        dept_permissions = counts['department']
+        category_permissions = counts['category']
         
         # Get permission categories breakdown
-        from django.db.models import Count
         category_breakdown = Permission.objects.filter(is_active=True).values(
             'permission_category'
         ).annotate(count=Count('id')).order_by('-count')
@@ -43,6 +43,9 @@ class DocumentAdmin(admin.ModelAdmin):
         })
     )
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('category', 'created_by', 'owned_by')
+
     def save_model(self, request, obj, form, change):
         if not change:  # If creating new document
             obj.created_by = request.user
@@ -55,12 +58,18 @@ class DocumentCommentAdmin(admin.ModelAdmin):
     list_display = ['document', 'author', 'created_at']
     list_filter = ['created_at']
     search_fields = ['document__title', 'content', 'author__email']
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('document', 'author')
 
 @admin.register(DocumentPermission)
 class DocumentPermissionAdmin(admin.ModelAdmin):
     list_display = ['document', 'permission', 'user', 'department', 'granted_by', 'is_active']
     list_filter = ['permission', 'is_active', 'created_at']
     search_fields = ['document__title', 'user__email']
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('document', 'user', 'department', 'granted_by')
 
 @admin.register(DocumentShare)
 class DocumentShareAdmin(admin.ModelAdmin):
@@ -68,8 +77,14 @@ class DocumentShareAdmin(admin.ModelAdmin):
     list_filter = ['share_type', 'access_level', 'is_active']
     search_fields = ['document__title']
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('document', 'shared_by', 'shared_with_user')
+
 @admin.register(DocumentActivity)
 class DocumentActivityAdmin(admin.ModelAdmin):
     list_display = ['document', 'user', 'action', 'created_at']
     list_filter = ['action', 'created_at']
     search_fields = ['document__title', 'user__email']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('document', 'user')
@@ -1,14 +1,48 @@
 import json
 import logging
+import uuid
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any, Optional
 from django.conf import settings
 from .vector_service import vector_service
-from .models import Document
-from django.db import models
+from .models import Document, DocumentActivity, DocumentPermission, DocumentShare
+from .utils import get_user_department_ids
 
 logger = logging.getLogger(__name__)
 
+# Simple greetings or conversational queries that don't need document search
+_SIMPLE_QUERIES = {
+    'hello': "Hello! I'm your AI document assistant. I can help you find information from your uploaded documents. What would you like to know?",
+    'hi': "Hi there! I'm here to help you search through your documents and answer questions about them. What can I help you find?",
+    'hey': "Hey! I'm your AI document assistant. Ask me anything about your uploaded documents!",
+    'good morning': "Good morning! I'm ready to help you find information in your documents. What would you like to know?",
+    'good afternoon': "Good afternoon! I'm here to assist you with your document queries. How can I help?",
+    'good evening': "Good evening! I'm your AI document assistant. What information can I help you find?",
+    'how are you': "I'm doing well, thank you! I'm here to help you search and understand your documents. What would you like to know about them?",
+    'thanks': "You're welcome! Is there anything else you'd like to know about your documents?",
+    'thank you': "You're very welcome! Feel free to ask me any questions about your uploaded documents.",
+    'help': "I'm your AI document assistant! I can help you find information from your uploaded documents. Try asking questions like 'What is Assignment 1 about?' or 'What are the course requirements?'",
+    'what can you do': "I can search through your uploaded documents and answer questions about their content. I use AI to find relevant information and provide detailed answers with source citations. Try asking me about specific documents or topics!",
+}
+
+_PROMPT_TEMPLATE = """You are a helpful AI assistant that answers questions about documents. You have access to the following documents:
+
+{context}
+
+Based on the above documents, please answer the following question. Be specific and detailed, citing information from the documents when possible. If the answer is not in the documents, say so clearly.
+
+Question: {question}
+
+Answer:"""
+
+_MODEL_UNAVAILABLE_MESSAGE = "AI model is not available. Please try again in a few minutes."
+_SERVICE_UNAVAILABLE_MESSAGE = "AI service temporarily unavailable"
+_NO_DOCUMENTS_RESPONSE = "I couldn't find any relevant documents to answer your question. Please make sure documents are uploaded and indexed. You can also try rephrasing your question or asking about specific topics covered in your documents."
+
+
 class AIDocumentAssistant:
     """AI-powered document assistant using Ollama and RAG"""
     
@@ -17,26 +51,43 @@ class AIDocumentAssistant:
         self.model_name = getattr(settings, 'OLLAMA_MODEL', 'tinyllama')
         self.max_context_docs = getattr(settings, 'MAX_CONTEXT_DOCS', 5)
         self.max_context_length = getattr(settings, 'MAX_CONTEXT_LENGTH', 4000)
+        self.audit_access = getattr(settings, 'AI_AUDIT_ACCESS', False)
+        self._model_ready = False
+        
+        # Keep-alive connection pool to Ollama with a small retry budget for transient failures
+        self._session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=32,
+            max_retries=Retry(total=2, backoff_factor=0.2)
+        )
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
     
     def ensure_model_loaded(self) -> bool:
         """Ensure the AI model is loaded and ready"""
+        # Once the model has been seen on the Ollama server there is no need to re-check
+        if self._model_ready:
+            return True
+        
         try:
             # Check if model is available
-            response = requests.get(f"{self.ollama_url}/api/tags", timeout=10)
+            response = self._session.get(f"{self.ollama_url}/api/tags", timeout=10)
             if response.status_code == 200:
                 models = response.json().get('models', [])
-                model_names = [model['name'] for model in models]
-                
-                if self.model_name not in model_names:
+
+                if not any(model.get('name') == self.model_name for model in models):
                     logger.info(f"Downloading model {self.model_name}...")
                     # Pull the model
-                    pull_response = requests.post(
+                    pull_response = self._session.post(
                         f"{self.ollama_url}/api/pull",
                         json={"name": self.model_name},
                         timeout=300  # 5 minutes for model download
                     )
-                    return pull_response.status_code == 200
+                    self._model_ready = pull_response.status_code == 200
+                    return self._model_ready
                 
+                self._model_ready = True
                 return True
             return False
         except Exception as e:
@@ -46,42 +97,88 @@ class AIDocumentAssistant:
     def search_relevant_documents(self, query: str, user_id: Optional[str] = None) -> List[Dict[str, Any]]:
         """Search for documents relevant to the user's question"""
         try:
-            # Use vector search to find relevant documents (without user filtering first)
+            # Resolve the requesting user and their active departments once per search
+            # instead of once per candidate document
+            user = None
+            user_department_ids = set()
+            if user_id:
+                from accounts.models import User
+                user = User.objects.get(id=user_id)
+                user_department_ids = set(get_user_department_ids(user))
+            
+            # Let Qdrant skip chunks the user cannot possibly read; staff may read everything.
+            # The checks below still run on every candidate.
+            acl_tokens = None
+            if user and not (user.is_staff or user.is_superuser):
+                acl_tokens = [f"u:{user.id}"] + [f"d:{department_id}" for department_id in user_department_ids]
+            
+            # Use vector search to find relevant documents
             vector_results = vector_service.search_documents(
                 query=query,
-                limit=self.max_context_docs * 2  # Get more results to filter by permissions
+                limit=self.max_context_docs * 2,  # Get more results to filter by permissions
+                acl_tokens=acl_tokens
             )
             
-            relevant_docs = []
+            # Phase 1: resolve permissions for the whole candidate batch, best scores first,
+            # and keep only as many documents as we can put in the context
+            vector_results = sorted(vector_results, key=lambda r: r['score'], reverse=True)
+            
+            ranked = []
             for result in vector_results:
                 try:
-                    # Get the full document
-                    document = Document.objects.get(id=result['document_id'])
-                    
-                    # ⚠️ CRITICAL SECURITY CHECK: Verify user has permission to access this document
-                    if user_id and not self._user_can_access_document(user_id, document):
-                        logger.info(f"User {user_id} denied access to document {document.id} via AI assistant")
-                        continue  # Skip this document - user doesn't have permission
-                    
-                    relevant_docs.append({
-                        'title': result['title'],
-                        'content_snippet': result['content_snippet'],
-                        'score': result['score'],
-                        'document_id': result['document_id'],
-                        'category': document.category.name,
-                        'file_type': document.file_type,
-                        'created_at': document.created_at.strftime('%Y-%m-%d'),
-                        'full_content': self._get_document_text(document)[:2000]  # Limit content
-                    })
-                    
-                    # Stop once we have enough permitted documents
-                    if len(relevant_docs) >= self.max_context_docs:
-                        break
-                        
-                except (Document.DoesNotExist, ValueError) as e:
-                    # Skip invalid document IDs or documents that don't exist
+                    ranked.append((result, uuid.UUID(str(result['document_id']))))
+                except (KeyError, ValueError) as e:
+                    # Skip invalid document IDs
                     logger.warning(f"Skipping invalid document ID {result.get('document_id', 'unknown')}: {e}")
+            
+            candidate_ids = [document_id for _, document_id in ranked]
+            documents = Document.objects.select_related('category').in_bulk(candidate_ids)
+            granted_document_ids = self._get_granted_document_ids(user, candidate_ids) if user else set()
+            
+            allowed = []
+            audit_rows = []
+            denied_count = 0
+            for result, document_id in ranked:
+                document = documents.get(document_id)
+                if document is None:
+                    # Skip documents that don't exist
                     continue
+                
+                # ⚠️ CRITICAL SECURITY CHECK: Verify user has permission to access this document
+                if user and not self._user_can_access_document(user, user_department_ids, document, granted_document_ids):
+                    denied_count += 1
+                    if self.audit_access:
+                        audit_rows.append((document.id, user.id, 'ai_denied', {}))
+                    continue  # Skip this document - user doesn't have permission
+                
+                allowed.append((result, document))
+                if user and self.audit_access:
+                    audit_rows.append((document.id, user.id, 'ai_context', {}))
+                
+                # Stop once we have enough permitted documents
+                if len(allowed) >= self.max_context_docs:
+                    break
+            
+            if denied_count:
+                logger.info(f"User {user.id} denied access to {denied_count} documents via AI assistant")
+            
+            # Queue the access decisions with one RPUSH instead of one INSERT per document
+            if audit_rows:
+                DocumentActivity.log_many_async(audit_rows)
+            
+            # Phase 2: only the surviving documents pay for text extraction
+            relevant_docs = []
+            for result, document in allowed:
+                relevant_docs.append({
+                    'title': result['title'],
+                    'content_snippet': result['content_snippet'],
+                    'score': result['score'],
+                    'document_id': result['document_id'],
+                    'category': document.category.name,
+                    'file_type': document.file_type,
+                    'created_at': document.created_at.date().isoformat(),
+                    'full_content': self._get_document_text(document)[:2000]  # Limit content
+                })
             
             return relevant_docs
         
@@ -89,19 +186,34 @@ class AIDocumentAssistant:
             logger.error(f"Error searching documents: {e}")
             return []
     
-    def _user_can_access_document(self, user_id: str, document: 'Document') -> bool:
+    def _get_granted_document_ids(self, user, document_ids: List[uuid.UUID]) -> set:
+        """IDs of the given documents the user can read through an explicit permission or an active share"""
+        granted = set(
+            DocumentPermission.objects.live().filter(
+                document_id__in=document_ids,
+                user=user,
+                permission__in=['view', 'edit', 'delete']
+            ).values_list('document_id', flat=True)
+        )
+        granted.update(
+            DocumentShare.objects.live().filter(
+                document_id__in=document_ids,
+                shared_with_user=user
+            ).values_list('document_id', flat=True)
+        )
+        return granted
+    
+    def _user_can_access_document(self, user, user_department_ids: set, document: 'Document',
+                                  granted_document_ids: set) -> bool:
         """Check if user has permission to access a document"""
         try:
-            from accounts.models import User
-            user = User.objects.get(id=user_id)
-            
             # Check basic document visibility rules
             # 1. Document must be published (not draft)
             if document.status != 'published':
                 return False
             
             # 2. Check if user is the document owner
-            if str(document.created_by.id) == user_id:
+            if document.created_by_id == user.id:
                 return True
             
             # 3. Check if user is admin/superuser (can access all documents)
@@ -109,53 +221,25 @@ class AIDocumentAssistant:
                 return True
             
             # 4. Check department-level access
-            if hasattr(user, 'profile') and user.profile and user.profile.department:
-                if document.category and document.category.department:
-                    if user.profile.department == document.category.department.name:
-                        return True
-            
-            # 5. Check explicit document permissions
-            from .models import DocumentPermission
-            permission = DocumentPermission.objects.filter(
-                document=document,
-                user=user,
-                permission__in=['view', 'edit', 'delete']
-            ).first()
-            
-            if permission:
+            if document.category.department_id and document.category.department_id in user_department_ids:
                 return True
             
-            # 6. Check document shares
-            from .models import DocumentShare
-            from django.utils import timezone
-            
-            active_share = DocumentShare.objects.filter(
-                document=document,
-                shared_with_user=user,
-                is_active=True
-            ).filter(
-                # Check expiry
-                models.Q(expires_at__isnull=True) | models.Q(expires_at__gt=timezone.now())
-            ).first()
-            
-            if active_share:
+            # 5./6. Check explicit document permissions and active document shares
+            if document.id in granted_document_ids:
                 return True
             
             # 7. Default: deny access
             return False
             
         except Exception as e:
-            logger.error(f"Error checking document access for user {user_id}: {e}")
+            logger.error(f"Error checking document access for user {user.id}: {e}")
             return False  # Default to deny access on error
     
     def _get_document_text(self, document: Document) -> str:
         """Extract text content from a document"""
         try:
             if document.file:
-                return vector_service.extract_text_from_file(
-                    document.file.path, 
-                    document.file_type
-                )
+                return vector_service.extract_document_text(document)
             return ""
         except Exception as e:
             logger.error(f"Error extracting text from document {document.id}: {e}")
@@ -171,7 +255,7 @@ class AIDocumentAssistant:
             prompt = self._create_prompt(question, context)
             
             # Call Ollama API
-            response = requests.post(
+            response = self._session.post(
                 f"{self.ollama_url}/api/generate",
                 json={
                     "model": self.model_name,
@@ -198,7 +282,7 @@ class AIDocumentAssistant:
                 logger.error(f"Ollama API error: {response.status_code}")
                 return {
                     "status": "error",
-                    "message": "AI service temporarily unavailable"
+                    "message": _SERVICE_UNAVAILABLE_MESSAGE
                 }
         
         except Exception as e:
@@ -232,63 +316,47 @@ Content: {doc['full_content']}
     
     def _create_prompt(self, question: str, context: str) -> str:
         """Create the prompt for the AI model"""
-        return f"""You are a helpful AI assistant that answers questions about documents. You have access to the following documents:
-
-{context}
-
-Based on the above documents, please answer the following question. Be specific and detailed, citing information from the documents when possible. If the answer is not in the documents, say so clearly.
-
-Question: {question}
-
-Answer:"""
+        return _PROMPT_TEMPLATE.format(context=context, question=question)
     
     def chat(self, question: str, user_id: Optional[str] = None) -> Dict[str, Any]:
         """Main chat interface - combines search and generation"""
         try:
-            # Ensure model is loaded
-            if not self.ensure_model_loaded():
-                return {
-                    "status": "error",
-                    "message": "AI model is not available. Please try again in a few minutes."
-                }
-            
-            # Check if this is a simple greeting or conversational query that doesn't need document search
-            simple_queries = {
-                'hello': "Hello! I'm your AI document assistant. I can help you find information from your uploaded documents. What would you like to know?",
-                'hi': "Hi there! I'm here to help you search through your documents and answer questions about them. What can I help you find?",
-                'hey': "Hey! I'm your AI document assistant. Ask me anything about your uploaded documents!",
-                'good morning': "Good morning! I'm ready to help you find information in your documents. What would you like to know?",
-                'good afternoon': "Good afternoon! I'm here to assist you with your document queries. How can I help?",
-                'good evening': "Good evening! I'm your AI document assistant. What information can I help you find?",
-                'how are you': "I'm doing well, thank you! I'm here to help you search and understand your documents. What would you like to know about them?",
-                'thanks': "You're welcome! Is there anything else you'd like to know about your documents?",
-                'thank you': "You're very welcome! Feel free to ask me any questions about your uploaded documents.",
-                'help': "I'm your AI document assistant! I can help you find information from your uploaded documents. Try asking questions like 'What is Assignment 1 about?' or 'What are the course requirements?'",
-                'what can you do': "I can search through your uploaded documents and answer questions about their content. I use AI to find relevant information and provide detailed answers with source citations. Try asking me about specific documents or topics!",
-            }
-            
             # Normalize the question for comparison
             normalized_question = question.lower().strip()
             
             # Check for exact matches or simple greetings
-            for greeting, response in simple_queries.items():
+            simple_response = None
+            for greeting, response in _SIMPLE_QUERIES.items():
                 if normalized_question == greeting or (len(normalized_question.split()) <= 3 and greeting in normalized_question):
-                    return {
-                        "status": "success",
-                        "response": response,
-                        "sources": [],
-                        "source_count": 0,
-                        "document_details": []
-                    }
+                    simple_response = response
+                    break
             
-            # If it's not a simple greeting, proceed with document search
-            # Search for relevant documents
-            relevant_docs = self.search_relevant_documents(question, user_id)
+            # The model check (HTTP) and the document search (vector DB + ORM) are independent,
+            # so run the model check in the background while searching on this thread
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                model_future = executor.submit(self.ensure_model_loaded)
+                relevant_docs = [] if simple_response else self.search_relevant_documents(question, user_id)
+                model_ready = model_future.result()
+            
+            if not model_ready:
+                return {
+                    "status": "error",
+                    "message": _MODEL_UNAVAILABLE_MESSAGE
+                }
+            
+            if simple_response:
+                return {
+                    "status": "success",
+                    "response": simple_response,
+                    "sources": [],
+                    "source_count": 0,
+                    "document_details": []
+                }
             
             if not relevant_docs:
                 return {
                     "status": "success",
-                    "response": "I couldn't find any relevant documents to answer your question. Please make sure documents are uploaded and indexed. You can also try rephrasing your question or asking about specific topics covered in your documents.",
+                    "response": _NO_DOCUMENTS_RESPONSE,
                     "sources": [],
                     "source_count": 0
                 }
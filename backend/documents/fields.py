@@ -0,0 +1,64 @@
+"""
+Custom model fields and field defaults for the documents app
+"""
+import os
+import time
+import uuid
+from django.db import models
+
+
+def uuid7() -> uuid.UUID:
+    """
+    Time-ordered UUID (RFC 9562 version 7) for primary keys.
+
+    The leading 48-bit millisecond timestamp keeps new rows at the right edge
+    of the primary key index instead of scattering them like uuid4.
+    """
+    timestamp_ms = time.time_ns() // 1_000_000
+    rand = int.from_bytes(os.urandom(10), 'big')
+    value = (timestamp_ms & ((1 << 48) - 1)) << 80
+    value |= 0x7 << 76
+    value |= (rand >> 62 & 0xFFF) << 64
+    value |= 0b10 << 62
+    value |= rand & ((1 << 62) - 1)
+    return uuid.UUID(int=value)
+
+
+class SmallIntChoiceField(models.PositiveSmallIntegerField):
+    """
+    Store a string choice as a smallint (its position in ``choices``).
+
+    Model instances, querysets, serializers and the API keep working with the
+    string values; only the database column is compact. Choices may be
+    appended, but never reordered or removed, without a data migration.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._codes = {value: code for code, (value, _) in enumerate(self.choices or [])}
+        self._values = {code: value for value, code in self._codes.items()}
+
+    @property
+    def validators(self):
+        # The integer range validators would compare against the string value
+        return [*self.default_validators, *self._validators]
+
+    def get_internal_type(self):
+        return 'PositiveSmallIntegerField'
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return self._values.get(value, value)
+
+    def to_python(self, value):
+        if isinstance(value, int) and not isinstance(value, bool):
+            return self._values.get(value, value)
+        return value
+
+    def get_prep_value(self, value):
+        value = models.Field.get_prep_value(self, value)
+        if value is None or isinstance(value, int):
+            return value
+        # Unknown values map to NULL: lookups match nothing, saves fail loudly
+        return self._codes.get(value)
@@ -0,0 +1,44 @@
+import time
+from django.core.management.base import BaseCommand
+from documents.models import DocumentActivity
+
+
+class Command(BaseCommand):
+    help = 'Bulk insert document activities queued in Redis by DocumentActivity.log_async'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Drain the queue once and exit instead of polling'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=1.0,
+            help='Seconds to wait between polls once the queue is empty'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Maximum activities inserted per bulk_create'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        while True:
+            drained = 0
+            while True:
+                inserted = DocumentActivity.drain_queue(batch_size)
+                drained += inserted
+                if inserted < batch_size:
+                    break
+
+            if drained:
+                self.stdout.write(f'Inserted {drained} activities')
+
+            if options['once']:
+                break
+            time.sleep(options['interval'])
@@ -1,10 +1,29 @@
 from django.core.management.base import BaseCommand
+from documents.models import Document
+from documents.tasks import document_index_metadata, documents_for_indexing, index_document_task
 from documents.vector_service import vector_service
 
 
 class Command(BaseCommand):
     help = 'Initialize the vector database collection'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--index',
+            action='store_true',
+            help='Index published documents whose file content changed since they were last indexed'
+        )
+        parser.add_argument(
+            '--quantize',
+            action='store_true',
+            help='Enable int8 quantization on a collection created before it was the default'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='With --index, re-embed every document even if its content is unchanged'
+        )
+
     def handle(self, *args, **options):
         self.stdout.write('Initializing vector database...')
         
@@ -19,4 +38,66 @@ class Command(BaseCommand):
         except Exception as e:
             self.stdout.write(
                 self.style.ERROR(f'Failed to initialize vector database: {str(e)}')
-            ) 
\ No newline at end of file
+            )
+            return
+        
+        # Idempotent; covers collections created before the acl index existed
+        vector_service.ensure_payload_indexes()
+        self._backfill_acl()
+        
+        if options['quantize']:
+            vector_service.enable_quantization()
+            self.stdout.write(self.style.SUCCESS('Enabled vector quantization'))
+        
+        if options['index']:
+            self._index_documents(skip_unchanged=not options['force'])
+    
+    def _backfill_acl(self):
+        """
+        Write the access payload onto chunks indexed before it existed, so the
+        acl filter in search_documents doesn't hide them. Payload only; nothing
+        is re-embedded.
+        """
+        documents = documents_for_indexing().filter(
+            status__in=['published', 'approved'],
+            is_latest_version=True
+        )
+        
+        updated = failed = 0
+        for document in documents.iterator(chunk_size=200):
+            metadata = document_index_metadata(document)
+            try:
+                vector_service.set_document_payload(
+                    str(document.id),
+                    {"accessible_by": metadata["accessible_by"], "acl": metadata["acl"]}
+                )
+                updated += 1
+            except Exception as e:
+                failed += 1
+                self.stdout.write(self.style.WARNING(f'Failed to update access payload for {document.id}: {e}'))
+        
+        self.stdout.write(self.style.SUCCESS(f'Updated access payload on {updated} documents, {failed} failed'))
+    
+    def _index_documents(self, skip_unchanged):
+        """Index documents in-process, skipping files whose content hash is unchanged"""
+        documents = Document.objects.filter(
+            status__in=['published', 'approved'],
+            is_latest_version=True
+        ).values_list('id', flat=True)
+        
+        counts = {}
+        for document_id in documents.iterator():
+            result = index_document_task.apply(
+                args=[str(document_id)],
+                kwargs={'skip_unchanged': skip_unchanged}
+            )
+            # The task raises once its retries are exhausted
+            status = result.get(propagate=False).get('status', 'error') if result.successful() else 'error'
+            counts[status] = counts.get(status, 0) + 1
+        
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Indexed {counts.get('success', 0)}, skipped {counts.get('skipped', 0)} unchanged, "
+                f"{counts.get('error', 0) + counts.get('warning', 0)} failed or empty"
+            )
+        )
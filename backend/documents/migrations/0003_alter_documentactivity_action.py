@@ -0,0 +1,18 @@
+# Generated by Django 4.2.21 on 2026-10-16 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0002_documentshare_documentshare_valid_share_target'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='documentactivity',
+            name='action',
+            field=models.CharField(choices=[('created', 'Created'), ('viewed', 'Viewed'), ('downloaded', 'Downloaded'), ('edited', 'Edited'), ('deleted', 'Deleted'), ('shared', 'Shared'), ('reviewed', 'Reviewed'), ('approved', 'Approved'), ('published', 'Published'), ('archived', 'Archived'), ('ai_context', 'Used as AI Context'), ('ai_denied', 'Denied to AI Assistant')], max_length=20),
+        ),
+    ]
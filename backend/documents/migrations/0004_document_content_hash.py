@@ -0,0 +1,18 @@
+# Generated by Django 4.2.21 on 2026-10-16 09:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0003_alter_documentactivity_action'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='content_hash',
+            field=models.CharField(blank=True, editable=False, help_text='SHA1 of the file content last indexed in the vector database', max_length=40),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.21 on 2026-10-16 10:05
+
+from django.db import migrations, models
+
+
+BACKFILL_PATH_SQL = """
+WITH RECURSIVE tree AS (
+    SELECT id, name AS path
+    FROM documents_documentcategory
+    WHERE parent_category_id IS NULL
+    UNION ALL
+    SELECT c.id, tree.path || ' > ' || c.name
+    FROM documents_documentcategory c
+    JOIN tree ON c.parent_category_id = tree.id
+)
+UPDATE documents_documentcategory
+SET path = tree.path
+FROM tree
+WHERE documents_documentcategory.id = tree.id;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0004_document_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentcategory',
+            name='path',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=512),
+        ),
+        migrations.RunSQL(BACKFILL_PATH_SQL, reverse_sql=migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.21 on 2026-10-16 10:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0005_documentcategory_path'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='document',
+            name='documents_d_categor_fec314_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='documentshare',
+            name='documents_d_documen_787239_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='documentshare',
+            name='documents_d_public__e1ae1e_idx',
+        ),
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(fields=['category', 'status', '-created_at'], name='doc_cat_status_created'),
+        ),
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(fields=['owned_by', 'status'], name='doc_owner_status'),
+        ),
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(condition=models.Q(('is_latest_version', True), ('status', 'published')), fields=['-created_at'], name='doc_published_latest'),
+        ),
+        migrations.AddIndex(
+            model_name='documentshare',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['document', 'is_active'], name='share_doc_active'),
+        ),
+        migrations.AddIndex(
+            model_name='documentshare',
+            index=models.Index(condition=models.Q(('public_link_token__isnull', False)), fields=['public_link_token'], name='share_public_token'),
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 4.2.21 on 2026-10-16 10:45
+
+from django.db import migrations, models
+import documents.fields
+
+
+STATUS_CHOICES = [('draft', 'Draft'), ('review', 'Under Review'), ('approved', 'Approved'), ('published', 'Published'), ('archived', 'Archived'), ('obsolete', 'Obsolete')]
+PRIORITY_CHOICES = [('low', 'Low'), ('medium', 'Medium'), ('high', 'High'), ('critical', 'Critical')]
+PERMISSION_CHOICES = [('view', 'View'), ('download', 'Download'), ('edit', 'Edit'), ('delete', 'Delete'), ('share', 'Share')]
+ACTION_CHOICES = [('created', 'Created'), ('viewed', 'Viewed'), ('downloaded', 'Downloaded'), ('edited', 'Edited'), ('deleted', 'Deleted'), ('shared', 'Shared'), ('reviewed', 'Reviewed'), ('approved', 'Approved'), ('published', 'Published'), ('archived', 'Archived'), ('ai_context', 'Used as AI Context'), ('ai_denied', 'Denied to AI Assistant')]
+SHARE_TYPE_CHOICES = [('user', 'Individual User'), ('department', 'Department'), ('public_link', 'Public Link')]
+ACCESS_LEVEL_CHOICES = [('view', 'View Only'), ('download', 'View & Download'), ('comment', 'View, Download & Comment'), ('edit', 'Full Edit Access')]
+
+
+def to_smallint(model_name, field_name, choices, default=None):
+    """Rewrite a varchar choice column in place as smallint codes (position in choices)"""
+    table = f'documents_{model_name}'
+    to_codes = ' '.join(f"WHEN '{value}' THEN {code}" for code, (value, _) in enumerate(choices))
+    to_strings = ' '.join(f"WHEN {code} THEN '{value}'" for code, (value, _) in enumerate(choices))
+    field_kwargs = {'choices': choices}
+    if default is not None:
+        field_kwargs['default'] = default
+    return migrations.SeparateDatabaseAndState(
+        database_operations=[
+            migrations.RunSQL(
+                f'ALTER TABLE "{table}" ALTER COLUMN "{field_name}" TYPE smallint '
+                f'USING CASE "{field_name}" {to_codes} END',
+                reverse_sql=f'ALTER TABLE "{table}" ALTER COLUMN "{field_name}" TYPE varchar(20) '
+                            f'USING CASE "{field_name}" {to_strings} END',
+            ),
+        ],
+        state_operations=[
+            migrations.AlterField(
+                model_name=model_name,
+                name=field_name,
+                field=documents.fields.SmallIntChoiceField(**field_kwargs),
+            ),
+        ],
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0006_document_share_composite_indexes'),
+    ]
+
+    operations = [
+        # Index predicates and check constraints compare against the old string
+        # literals, so they are dropped around the type change and rebuilt.
+        migrations.RemoveIndex(
+            model_name='document',
+            name='doc_published_latest',
+        ),
+        migrations.RemoveConstraint(
+            model_name='documentshare',
+            name='valid_share_target',
+        ),
+        to_smallint('document', 'status', STATUS_CHOICES, default='draft'),
+        to_smallint('document', 'priority', PRIORITY_CHOICES, default='medium'),
+        to_smallint('documentpermission', 'permission', PERMISSION_CHOICES),
+        to_smallint('documentactivity', 'action', ACTION_CHOICES),
+        to_smallint('documentshare', 'share_type', SHARE_TYPE_CHOICES),
+        to_smallint('documentshare', 'access_level', ACCESS_LEVEL_CHOICES, default='view'),
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(condition=models.Q(('is_latest_version', True), ('status', 'published')), fields=['-created_at'], name='doc_published_latest'),
+        ),
+        migrations.AddConstraint(
+            model_name='documentshare',
+            constraint=models.CheckConstraint(check=models.Q(models.Q(('share_type', 'user'), ('shared_with_user__isnull', False)), models.Q(('share_type', 'department'), ('shared_with_department__isnull', False)), models.Q(('share_type', 'public_link'), ('public_link_token__isnull', False)), _connector='OR'), name='valid_share_target'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.21 on 2026-10-16 11:20
+
+from django.db import migrations, models
+import documents.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0007_smallint_choice_fields'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='documentcategory',
+            name='id',
+            field=models.UUIDField(default=documents.fields.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='document',
+            name='id',
+            field=models.UUIDField(default=documents.fields.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='documenttag',
+            name='id',
+            field=models.UUIDField(default=documents.fields.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='documentpermission',
+            name='id',
+            field=models.UUIDField(default=documents.fields.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='documentactivity',
+            name='id',
+            field=models.UUIDField(default=documents.fields.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='documentcomment',
+            name='id',
+            field=models.UUIDField(default=documents.fields.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='documentshare',
+            name='id',
+            field=models.UUIDField(default=documents.fields.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+    ]
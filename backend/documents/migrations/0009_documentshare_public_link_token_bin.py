@@ -0,0 +1,54 @@
+# Generated by Django 4.2.21 on 2026-10-16 11:40
+
+import base64
+from django.db import migrations, models
+
+
+def copy_tokens_to_bytes(apps, schema_editor):
+    DocumentShare = apps.get_model('documents', 'DocumentShare')
+    shares = DocumentShare.objects.filter(public_link_token__isnull=False).only('id', 'public_link_token')
+    for share in shares.iterator():
+        token = share.public_link_token
+        share.public_link_token_bin = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        share.save(update_fields=['public_link_token_bin'])
+
+
+def copy_tokens_to_text(apps, schema_editor):
+    DocumentShare = apps.get_model('documents', 'DocumentShare')
+    shares = DocumentShare.objects.filter(public_link_token_bin__isnull=False).only('id', 'public_link_token_bin')
+    for share in shares.iterator():
+        raw = bytes(share.public_link_token_bin)
+        share.public_link_token = base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+        share.save(update_fields=['public_link_token'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0008_uuid7_primary_keys'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='documentshare',
+            name='valid_share_target',
+        ),
+        migrations.RemoveIndex(
+            model_name='documentshare',
+            name='share_public_token',
+        ),
+        migrations.AddField(
+            model_name='documentshare',
+            name='public_link_token_bin',
+            field=models.BinaryField(blank=True, max_length=32, null=True, unique=True),
+        ),
+        migrations.RunPython(copy_tokens_to_bytes, copy_tokens_to_text),
+        migrations.RemoveField(
+            model_name='documentshare',
+            name='public_link_token',
+        ),
+        migrations.AddConstraint(
+            model_name='documentshare',
+            constraint=models.CheckConstraint(check=models.Q(models.Q(('share_type', 'user'), ('shared_with_user__isnull', False)), models.Q(('share_type', 'department'), ('shared_with_department__isnull', False)), models.Q(('share_type', 'public_link'), ('public_link_token_bin__isnull', False)), _connector='OR'), name='valid_share_target'),
+        ),
+    ]
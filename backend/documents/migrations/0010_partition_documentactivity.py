@@ -0,0 +1,75 @@
+# Generated by Django 4.2.21 on 2026-10-16 12:05
+
+from django.db import migrations
+
+# Index names match the ones Django created for DocumentActivity.Meta.indexes in 0001
+INDEXES_SQL = """
+CREATE INDEX documents_d_documen_72d411_idx ON documents_documentactivity (document_id);
+CREATE INDEX documents_d_user_id_445354_idx ON documents_documentactivity (user_id);
+CREATE INDEX documents_d_action_79226c_idx ON documents_documentactivity (action);
+CREATE INDEX documents_d_created_9e08de_idx ON documents_documentactivity (created_at);
+ALTER TABLE documents_documentactivity
+    ADD CONSTRAINT documents_documentactivity_document_id_fk
+    FOREIGN KEY (document_id) REFERENCES documents_document (id) DEFERRABLE INITIALLY DEFERRED;
+ALTER TABLE documents_documentactivity
+    ADD CONSTRAINT documents_documentactivity_user_id_fk
+    FOREIGN KEY (user_id) REFERENCES accounts_user (id) DEFERRABLE INITIALLY DEFERRED;
+"""
+
+# Monthly range partitions from the oldest row through two months ahead, plus a
+# default partition catching anything outside them. Postgres requires the
+# partition key in the primary key, so it becomes (id, created_at).
+PARTITION_SQL = """
+ALTER TABLE documents_documentactivity RENAME TO documents_documentactivity_old;
+
+CREATE TABLE documents_documentactivity (
+    LIKE documents_documentactivity_old INCLUDING DEFAULTS INCLUDING CONSTRAINTS
+) PARTITION BY RANGE (created_at);
+
+DO $$
+DECLARE
+    month_start date;
+BEGIN
+    FOR month_start IN
+        SELECT generate_series(
+            date_trunc('month', COALESCE((SELECT min(created_at) FROM documents_documentactivity_old), now())),
+            date_trunc('month', now()) + interval '2 months',
+            interval '1 month'
+        )::date
+    LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF documents_documentactivity FOR VALUES FROM (%L) TO (%L)',
+            'documents_documentactivity_' || to_char(month_start, 'YYYY_MM'), month_start, month_start + interval '1 month'
+        );
+    END LOOP;
+END $$;
+CREATE TABLE documents_documentactivity_default PARTITION OF documents_documentactivity DEFAULT;
+
+INSERT INTO documents_documentactivity SELECT * FROM documents_documentactivity_old;
+DROP TABLE documents_documentactivity_old;
+ALTER TABLE documents_documentactivity ADD PRIMARY KEY (id, created_at);
+""" + INDEXES_SQL
+
+UNPARTITION_SQL = """
+ALTER TABLE documents_documentactivity RENAME TO documents_documentactivity_old;
+
+CREATE TABLE documents_documentactivity (
+    LIKE documents_documentactivity_old INCLUDING DEFAULTS INCLUDING CONSTRAINTS
+);
+
+INSERT INTO documents_documentactivity SELECT * FROM documents_documentactivity_old;
+DROP TABLE documents_documentactivity_old;
+ALTER TABLE documents_documentactivity ADD PRIMARY KEY (id);
+""" + INDEXES_SQL
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('documents', '0009_documentshare_public_link_token_bin'),
+    ]
+
+    operations = [
+        migrations.RunSQL(PARTITION_SQL, reverse_sql=UNPARTITION_SQL),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.21 on 2026-10-16 12:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0010_partition_documentactivity'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='documentshare',
+            name='share_doc_active',
+        ),
+        migrations.AddIndex(
+            model_name='documentshare',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['document', 'expires_at'], name='share_live'),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 4.2.21 on 2026-10-16 12:55
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('documents', '0011_documentshare_share_live'),
+    ]
+
+    operations = [
+        # Document: created_by already has its FK index; category and owned_by
+        # lead doc_cat_status_created and doc_owner_status.
+        migrations.RemoveIndex(
+            model_name='document',
+            name='documents_d_created_54b6f7_idx',
+        ),
+        migrations.AlterField(
+            model_name='document',
+            name='category',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='documents', to='documents.documentcategory'),
+        ),
+        migrations.AlterField(
+            model_name='document',
+            name='owned_by',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='owned_documents', to=settings.AUTH_USER_MODEL),
+        ),
+        # DocumentActivity: (document, -created_at) and (user, -created_at) replace
+        # the single-column indexes and also serve the newest-first listings.
+        migrations.RemoveIndex(
+            model_name='documentactivity',
+            name='documents_d_documen_72d411_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='documentactivity',
+            name='documents_d_user_id_445354_idx',
+        ),
+        migrations.AddIndex(
+            model_name='documentactivity',
+            index=models.Index(fields=['document', '-created_at'], name='act_doc_created'),
+        ),
+        migrations.AddIndex(
+            model_name='documentactivity',
+            index=models.Index(fields=['user', '-created_at'], name='act_user_created'),
+        ),
+        # 0010 rebuilt the partitioned activity table without the implicit FK
+        # indexes, so only the model state changes here.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='documentactivity',
+                    name='document',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='activities', to='documents.document'),
+                ),
+                migrations.AlterField(
+                    model_name='documentactivity',
+                    name='user',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='document_activities', to=settings.AUTH_USER_MODEL),
+                ),
+            ],
+        ),
+    ]
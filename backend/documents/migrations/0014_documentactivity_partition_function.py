@@ -0,0 +1,64 @@
+# Generated by Django 4.2.21 on 2026-10-16 18:20
+
+from django.db import migrations
+
+# Creates the monthly DocumentActivity partitions from the current month through
+# months_ahead months out. A month whose rows already landed in the default
+# partition is created detached, has those rows moved into it, then attached;
+# a plain CREATE ... PARTITION OF would fail on the overlapping default rows.
+# Called here and daily by tasks.ensure_activity_partitions.
+ENSURE_PARTITIONS_SQL = """
+CREATE FUNCTION documents_ensure_activity_partitions(months_ahead integer) RETURNS integer AS $$
+DECLARE
+    month_start date;
+    partition_name text;
+    created integer := 0;
+BEGIN
+    FOR month_start IN
+        SELECT generate_series(
+            date_trunc('month', now()),
+            date_trunc('month', now()) + make_interval(months => months_ahead),
+            interval '1 month'
+        )::date
+    LOOP
+        partition_name := 'documents_documentactivity_' || to_char(month_start, 'YYYY_MM');
+        CONTINUE WHEN to_regclass(partition_name) IS NOT NULL;
+
+        EXECUTE format(
+            'CREATE TABLE %I (LIKE documents_documentactivity INCLUDING DEFAULTS INCLUDING CONSTRAINTS)',
+            partition_name
+        );
+        EXECUTE format(
+            'WITH moved AS (DELETE FROM documents_documentactivity_default '
+            'WHERE created_at >= %L AND created_at < %L RETURNING *) '
+            'INSERT INTO %I SELECT * FROM moved',
+            month_start, month_start + interval '1 month', partition_name
+        );
+        EXECUTE format(
+            'ALTER TABLE documents_documentactivity ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+            partition_name, month_start, month_start + interval '1 month'
+        );
+        created := created + 1;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Two years of partitions up front, so a stalled beat schedule has a long runway
+SELECT documents_ensure_activity_partitions(24);
+"""
+
+DROP_ENSURE_PARTITIONS_SQL = """
+DROP FUNCTION documents_ensure_activity_partitions(integer);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0013_document_search_vector'),
+    ]
+
+    operations = [
+        migrations.RunSQL(ENSURE_PARTITIONS_SQL, reverse_sql=DROP_ENSURE_PARTITIONS_SQL),
+    ]
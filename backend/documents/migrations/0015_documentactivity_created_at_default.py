@@ -0,0 +1,25 @@
+# Generated by Django 4.2.21 on 2026-10-16 19:05
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0014_documentactivity_partition_function'),
+    ]
+
+    operations = [
+        # auto_now_add overwrote the event time queued activities carry; the
+        # column itself is unchanged, so only the model state moves
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='documentactivity',
+                    name='created_at',
+                    field=models.DateTimeField(default=django.utils.timezone.now),
+                ),
+            ],
+        ),
+    ]
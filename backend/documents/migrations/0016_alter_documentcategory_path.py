@@ -0,0 +1,19 @@
+# Generated by Django 4.2.21 on 2026-10-16 19:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0015_documentactivity_created_at_default'),
+    ]
+
+    operations = [
+        # A deep hierarchy of long names outgrew varchar(512)
+        migrations.AlterField(
+            model_name='documentcategory',
+            name='path',
+            field=models.TextField(blank=True, db_index=True, editable=False),
+        ),
+    ]
@@ -1,10 +1,28 @@
-from django.db import models
+from django.db import DatabaseError, IntegrityError, models, transaction
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.db.models.functions import Now
 from django.core.validators import FileExtensionValidator
 from django.utils.text import slugify
+import base64
+import binascii
+import json
+import logging
+import re
+import secrets
 import uuid
 import os
+import redis
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from portal_backend.redis_client import get_redis
+from .fields import SmallIntChoiceField, uuid7
+
+logger = logging.getLogger(__name__)
+
+# Redis list buffering DocumentActivity rows for the drain_activity_queue command
+ACTIVITY_QUEUE_KEY = 'activity:q'
 
 
 def document_upload_path(instance, filename):
@@ -17,11 +35,69 @@ def document_upload_path(instance, filename):
     return os.path.join('documents', str(instance.category.id), filename)
 
 
-class DocumentCategory(models.Model):
+_SLUG_STRIP = re.compile(r'[^\w\s-]')
+_SLUG_HYPHENATE = re.compile(r'[-\s]+')
+
+
+def fast_slugify(value):
+    """
+    django.utils.text.slugify with a precompiled fast path for ASCII input.
+    
+    ASCII text is unchanged by slugify's Unicode normalization, so only its two
+    substitutions are applied; the output is identical.
+    """
+    value = str(value)
+    if not value.isascii():
+        return slugify(value)
+    value = _SLUG_STRIP.sub('', value.lower())
+    return _SLUG_HYPHENATE.sub('-', value).strip('-_')
+
+
+def share_token_bytes(token):
+    """Decode a public link token from its URL form; None if it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+    except (binascii.Error, ValueError):
+        return None
+    return raw if len(raw) == 32 else None
+
+
+def share_token_str(raw):
+    """Encode raw public link token bytes in the URL-safe form used in share links"""
+    return base64.urlsafe_b64encode(bytes(raw)).rstrip(b'=').decode('ascii')
+
+
+class SlugBulkCreateMixin:
+    """
+    Bulk-create helper for models that derive their slug from another field
+    """
+    slug_source_field = 'name'
+    
+    @classmethod
+    def bulk_create_with_slugs(cls, objs, batch_size=1000, **kwargs):
+        """Fill in missing slugs up front and insert without a per-row save()"""
+        for obj in objs:
+            if not obj.slug:
+                obj.slug = fast_slugify(getattr(obj, cls.slug_source_field))
+        return cls.objects.bulk_create(objs, batch_size=batch_size, **kwargs)
+
+
+class DocumentCategoryQuerySet(models.QuerySet):
+    def with_counts(self):
+        """Annotate the document counts category serializers render"""
+        return self.annotate(
+            documents_count=models.Count('documents', distinct=True),
+            published_documents_count=models.Count(
+                'documents', filter=models.Q(documents__status='published'), distinct=True
+            )
+        )
+
+
+class DocumentCategory(SlugBulkCreateMixin, models.Model):
     """
     Categories for organizing documents
     """
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     name = models.CharField(max_length=100, unique=True)
     slug = models.SlugField(max_length=100, unique=True, blank=True)
     description = models.TextField(blank=True)
@@ -34,6 +110,8 @@ class DocumentCategory(models.Model):
         blank=True,
         related_name='sub_categories'
     )
+    # Materialized "Parent > Child" hierarchy, maintained on save
+    path = models.TextField(blank=True, editable=False, db_index=True)
     
     # Permissions
     department = models.ForeignKey(
@@ -53,31 +131,131 @@ class DocumentCategory(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = DocumentCategoryQuerySet.as_manager()
+    
     class Meta:
         db_table = 'documents_documentcategory'
         verbose_name = 'Document Category'
         verbose_name_plural = 'Document Categories'
         ordering = ['name']
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_path = instance.__dict__.get('path')
+        return instance
+    
     def save(self, *args, **kwargs):
         if not self.slug:
-            self.slug = slugify(self.name)
+            self.slug = fast_slugify(self.name)
+        
+        if self.parent_category_id:
+            self.path = f"{self.parent_category.get_full_hierarchy()} > {self.name}"
+        else:
+            self.path = self.name
+        
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'path'}
+        
         super().save(*args, **kwargs)
+        
+        # Renaming or moving a category changes the path of its whole subtree
+        loaded_path = getattr(self, '_loaded_path', None)
+        self._loaded_path = self.path
+        if loaded_path is not None and loaded_path != self.path:
+            for child in self.sub_categories.all():
+                child.parent_category = self
+                child.save(update_fields=['path'])
     
     def __str__(self):
         return self.name
     
     def get_full_hierarchy(self):
         """Return full category hierarchy as string"""
+        if self.path:
+            return self.path
         if self.parent_category:
             return f"{self.parent_category.get_full_hierarchy()} > {self.name}"
         return self.name
 
 
-class Document(models.Model):
+# Document columns rendered by DocumentDetailSerializer
+DOCUMENT_DETAIL_COLUMNS = (
+    'id', 'title', 'slug', 'description', 'file', 'file_size', 'file_type',
+    'content_hash', 'status', 'priority', 'reviewed_at', 'review_notes',
+    'published_at', 'expires_at', 'version', 'is_latest_version',
+    'download_count', 'view_count', 'created_at', 'updated_at',
+    'category', 'created_by', 'owned_by', 'reviewer', 'previous_version',
+)
+
+# Document columns rendered by DocumentSearchSerializer
+DOCUMENT_SEARCH_COLUMNS = (
+    'id', 'title', 'description', 'status', 'file_type', 'created_at',
+    'category', 'created_by',
+)
+
+
+class DocumentQuerySet(models.QuerySet):
+    def for_list(self):
+        """Skip long text columns that list serializers never render"""
+        return self.defer('description', 'review_notes', 'search_vector')
+    
+    def with_related(self):
+        """Load the FKs and tags document serializers render, in two queries"""
+        return self.select_related(
+            'category', 'created_by', 'owned_by', 'reviewer'
+        ).prefetch_related(
+            models.Prefetch('tags', queryset=DocumentTag.objects.with_counts())
+        )
+    
+    def with_counts(self):
+        return self.annotate(comments_count=models.Count('comments', distinct=True))
+    
+    def for_search(self):
+        """Exactly the columns, joins and tags DocumentSearchSerializer renders"""
+        return self.select_related('category', 'created_by').only(
+            *DOCUMENT_SEARCH_COLUMNS,
+            'category__name', 'created_by__first_name', 'created_by__last_name'
+        ).prefetch_related(
+            models.Prefetch('tags', queryset=DocumentTag.objects.with_counts())
+        )
+    
+    def with_detail(self):
+        """Exactly the columns, joins and nested sets DocumentDetailSerializer renders"""
+        return self.select_related('category', 'owned_by').only(
+            *DOCUMENT_DETAIL_COLUMNS,
+            'category__name', 'owned_by__first_name', 'owned_by__last_name'
+        ).prefetch_related(
+            models.Prefetch('tags', queryset=DocumentTag.objects.with_counts()),
+            models.Prefetch(
+                'permissions',
+                queryset=DocumentPermission.objects.select_related('user', 'department', 'granted_by')
+            ),
+            models.Prefetch(
+                'activities',
+                queryset=DocumentActivity.objects.for_list().select_related('user')
+            ),
+            models.Prefetch(
+                'comments',
+                queryset=DocumentComment.objects.with_related().filter(parent_comment__isnull=True),
+                to_attr='top_level_comments'
+            ),
+            models.Prefetch(
+                'shares',
+                queryset=DocumentShare.objects.with_expiry().select_related(
+                    'shared_by', 'shared_with_user', 'shared_with_department'
+                )
+            ),
+        )
+
+
+class Document(SlugBulkCreateMixin, models.Model):
     """
     Main document model
     """
+    slug_source_field = 'title'
+    
     STATUS_CHOICES = [
         ('draft', 'Draft'),
         ('review', 'Under Review'),
@@ -94,7 +272,7 @@ class Document(models.Model):
         ('critical', 'Critical'),
     ]
     
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     title = models.CharField(max_length=255)
     slug = models.SlugField(max_length=255, unique=True, blank=True)
     description = models.TextField(blank=True)
@@ -109,9 +287,21 @@ class Document(models.Model):
     )
     file_size = models.PositiveIntegerField(null=True, blank=True)  # Size in bytes
     file_type = models.CharField(max_length=100, blank=True)
+    content_hash = models.CharField(
+        max_length=40,
+        blank=True,
+        editable=False,
+        help_text="SHA1 of the file content last indexed in the vector database"
+    )
     
     # Organization
-    category = models.ForeignKey(DocumentCategory, on_delete=models.CASCADE, related_name='documents')
+    # Lookups by category or owner are served by the composite indexes in Meta
+    category = models.ForeignKey(
+        DocumentCategory,
+        on_delete=models.CASCADE,
+        related_name='documents',
+        db_index=False
+    )
     tags = models.ManyToManyField('DocumentTag', blank=True, related_name='documents')
     
     # Ownership and Control
@@ -123,12 +313,13 @@ class Document(models.Model):
     owned_by = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
-        related_name='owned_documents'
+        related_name='owned_documents',
+        db_index=False
     )
     
     # Status and Priority
-    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='draft')
-    priority = models.CharField(max_length=20, choices=PRIORITY_CHOICES, default='medium')
+    status = SmallIntChoiceField(choices=STATUS_CHOICES, default='draft')
+    priority = SmallIntChoiceField(choices=PRIORITY_CHOICES, default='medium')
     
     # Review Process
     reviewer = models.ForeignKey(
@@ -160,9 +351,15 @@ class Document(models.Model):
     download_count = models.PositiveIntegerField(default=0)
     view_count = models.PositiveIntegerField(default=0)
     
+    # Weighted title (A) + description (B) tsvector, maintained by a database
+    # trigger (migration 0013) so queryset updates and bulk_create keep it current
+    search_vector = SearchVectorField(null=True, editable=False)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = DocumentQuerySet.as_manager()
+    
     class Meta:
         db_table = 'documents_document'
         verbose_name = 'Document'
@@ -170,23 +367,44 @@ class Document(models.Model):
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['status']),
-            models.Index(fields=['category']),
-            models.Index(fields=['created_by']),
             models.Index(fields=['created_at']),
+            models.Index(fields=['category', 'status', '-created_at'], name='doc_cat_status_created'),
+            models.Index(fields=['owned_by', 'status'], name='doc_owner_status'),
+            models.Index(
+                fields=['-created_at'],
+                condition=models.Q(is_latest_version=True, status='published'),
+                name='doc_published_latest'
+            ),
+            GinIndex(fields=['search_vector'], name='doc_search_vector'),
         ]
     
     def save(self, *args, **kwargs):
         if not self.slug:
-            self.slug = slugify(self.title)
-        if self.file and not self.file_size:
-            self.file_size = self.file.size
-        if self.file and not self.file_type:
-            self.file_type = self.file.name.split('.')[-1].upper()
+            self.slug = fast_slugify(self.title)
+        # Partial updates that don't touch the file skip the storage stat call
+        update_fields = kwargs.get('update_fields')
+        if self.file and (update_fields is None or 'file' in update_fields):
+            if not self.file_size:
+                self.file_size = self.file.size
+            if not self.file_type:
+                self.file_type = os.path.splitext(self.file.name)[1][1:].upper()
         super().save(*args, **kwargs)
     
     def __str__(self):
         return f"{self.title} (v{self.version})"
     
+    @property
+    def view_count_live(self):
+        """view_count including increments still buffered in Redis"""
+        from .utils import pending_counter
+        return self.view_count + pending_counter('document', self.pk, 'view_count')
+    
+    @property
+    def download_count_live(self):
+        """download_count including increments still buffered in Redis"""
+        from .utils import pending_counter
+        return self.download_count + pending_counter('document', self.pk, 'download_count')
+    
     @property
     def file_size_mb(self):
         """Return file size in MB"""
@@ -195,17 +413,24 @@ class Document(models.Model):
         return 0
 
 
-class DocumentTag(models.Model):
+class DocumentTagQuerySet(models.QuerySet):
+    def with_counts(self):
+        return self.annotate(documents_count=models.Count('documents', distinct=True))
+
+
+class DocumentTag(SlugBulkCreateMixin, models.Model):
     """
     Tags for document categorization
     """
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     name = models.CharField(max_length=50, unique=True)
     slug = models.SlugField(max_length=50, unique=True, blank=True)
     color = models.CharField(max_length=7, default='#6B7280', help_text="Hex color code for tag")
     
     created_at = models.DateTimeField(auto_now_add=True)
     
+    objects = DocumentTagQuerySet.as_manager()
+    
     class Meta:
         db_table = 'documents_documenttag'
         verbose_name = 'Document Tag'
@@ -214,13 +439,47 @@ class DocumentTag(models.Model):
     
     def save(self, *args, **kwargs):
         if not self.slug:
-            self.slug = slugify(self.name)
+            self.slug = fast_slugify(self.name)
         super().save(*args, **kwargs)
     
+    @classmethod
+    def get_or_create_many(cls, names):
+        """
+        Return the tags with the given names, creating any that are missing.
+        
+        Runs a constant three queries regardless of how many names are passed.
+        """
+        names = {name.strip() for name in names if name and name.strip()}
+        if not names:
+            return []
+        existing = set(cls.objects.filter(name__in=names).values_list('name', flat=True))
+        missing = [cls(name=name) for name in names - existing]
+        if missing:
+            # A concurrent request may have created some of them in between
+            cls.bulk_create_with_slugs(missing, ignore_conflicts=True)
+        return list(cls.objects.filter(name__in=names))
+    
     def __str__(self):
         return self.name
 
 
+class DocumentPermissionQuerySet(models.QuerySet):
+    def live(self):
+        """Active grants that have not expired, filtered in SQL"""
+        return self.filter(is_active=True).filter(
+            models.Q(expires_at__isnull=True) | models.Q(expires_at__gt=timezone.now())
+        )
+    
+    def with_related(self):
+        """Own columns plus only the related names DocumentPermissionSerializer renders"""
+        return self.select_related('document', 'user', 'department', 'granted_by').only(
+            'id', 'document', 'user', 'department', 'permission', 'granted_by',
+            'expires_at', 'is_active', 'created_at',
+            'document__title', 'user__first_name', 'user__last_name',
+            'department__name', 'granted_by__first_name', 'granted_by__last_name'
+        )
+
+
 class DocumentPermission(models.Model):
     """
     Document access permissions
@@ -233,7 +492,7 @@ class DocumentPermission(models.Model):
         ('share', 'Share'),
     ]
     
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='permissions')
     
     # Grant permission to user or department
@@ -252,7 +511,7 @@ class DocumentPermission(models.Model):
         related_name='document_permissions'
     )
     
-    permission = models.CharField(max_length=20, choices=PERMISSION_CHOICES)
+    permission = SmallIntChoiceField(choices=PERMISSION_CHOICES)
     granted_by = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
@@ -264,6 +523,8 @@ class DocumentPermission(models.Model):
     
     created_at = models.DateTimeField(auto_now_add=True)
     
+    objects = DocumentPermissionQuerySet.as_manager()
+    
     class Meta:
         db_table = 'documents_documentpermission'
         verbose_name = 'Document Permission'
@@ -280,6 +541,20 @@ class DocumentPermission(models.Model):
         return f"{self.document.title} - {self.permission} for {target}"
 
 
+class DocumentActivityQuerySet(models.QuerySet):
+    def for_list(self):
+        """Skip the raw user agent, which activity listings don't render"""
+        return self.defer('user_agent')
+    
+    def with_related(self):
+        """Listed columns plus only the related names DocumentActivitySerializer renders"""
+        return self.select_related('document', 'user').only(
+            'id', 'document', 'user', 'action', 'description', 'ip_address',
+            'previous_version', 'new_version', 'created_at',
+            'document__title', 'user__first_name', 'user__last_name'
+        )
+
+
 class DocumentActivity(models.Model):
     """
     Track document activities for audit trail
@@ -295,17 +570,31 @@ class DocumentActivity(models.Model):
         ('approved', 'Approved'),
         ('published', 'Published'),
         ('archived', 'Archived'),
+        ('ai_context', 'Used as AI Context'),
+        ('ai_denied', 'Denied to AI Assistant'),
     ]
     
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='activities')
+    # The table is range-partitioned by month on created_at (migrations 0010 and
+    # 0014), so its actual primary key is (id, created_at) and its foreign keys
+    # are the hand-named *_fk constraints. Django 4.2 cannot express a composite
+    # key, so the model state keeps id alone; uuid7 ids are unique on their own.
+    # Schema changes to this table must be written as RunSQL.
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
+    # Lookups by document or user are served by the (fk, -created_at) indexes in Meta
+    document = models.ForeignKey(
+        Document,
+        on_delete=models.CASCADE,
+        related_name='activities',
+        db_index=False
+    )
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
-        related_name='document_activities'
+        related_name='document_activities',
+        db_index=False
     )
     
-    action = models.CharField(max_length=20, choices=ACTION_CHOICES)
+    action = SmallIntChoiceField(choices=ACTION_CHOICES)
     description = models.TextField(blank=True)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     user_agent = models.TextField(blank=True)
@@ -314,7 +603,10 @@ class DocumentActivity(models.Model):
     previous_version = models.CharField(max_length=20, blank=True)
     new_version = models.CharField(max_length=20, blank=True)
     
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Set when the event happens, not when a queued row is drained (see log_many_async)
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    objects = DocumentActivityQuerySet.as_manager()
     
     class Meta:
         db_table = 'documents_documentactivity'
@@ -322,21 +614,111 @@ class DocumentActivity(models.Model):
         verbose_name_plural = 'Document Activities'
         ordering = ['-created_at']
         indexes = [
-            models.Index(fields=['document']),
-            models.Index(fields=['user']),
             models.Index(fields=['action']),
             models.Index(fields=['created_at']),
+            models.Index(fields=['document', '-created_at'], name='act_doc_created'),
+            models.Index(fields=['user', '-created_at'], name='act_user_created'),
         ]
     
     def __str__(self):
         return f"{self.user.get_full_name()} {self.action} {self.document.title}"
+    
+    @classmethod
+    def log_async(cls, document_id, user_id, action, **context):
+        """
+        Queue an activity in Redis to be bulk inserted by drain_queue.
+        
+        Falls back to a synchronous insert if Redis is unavailable. Rows only
+        reach the database through drain_activity_queue_task, so a celery beat
+        process is required wherever this is called.
+        """
+        cls.log_many_async([(document_id, user_id, action, context)])
+    
+    @classmethod
+    def log_many_async(cls, entries):
+        """
+        Queue (document_id, user_id, action, context) activities with a single
+        RPUSH; falls back to one bulk insert if Redis is unavailable.
+        """
+        # Stamped now, so a row drained late still lands at its event time and partition
+        created_at = timezone.now().isoformat()
+        payloads = [
+            {
+                'document_id': str(document_id), 'user_id': str(user_id), 'action': action,
+                'created_at': created_at, **context
+            }
+            for document_id, user_id, action, context in entries
+        ]
+        if not payloads:
+            return
+        try:
+            get_redis().rpush(ACTIVITY_QUEUE_KEY, *[json.dumps(payload) for payload in payloads])
+        except redis.RedisError as e:
+            logger.warning(f"Activity queue unavailable, logging synchronously: {e}")
+            cls.objects.bulk_create([cls._from_payload(payload) for payload in payloads])
+    
+    @classmethod
+    def _from_payload(cls, payload):
+        """Unsaved activity from a log_many_async payload"""
+        created_at = payload.pop('created_at', None)
+        return cls(created_at=parse_datetime(created_at) if created_at else timezone.now(), **payload)
+    
+    @classmethod
+    def drain_queue(cls, batch_size=500):
+        """
+        Pop up to batch_size activities queued by log_async and insert them in
+        one statement. Returns how many were popped.
+        """
+        pipe = get_redis().pipeline()
+        pipe.lrange(ACTIVITY_QUEUE_KEY, 0, batch_size - 1)
+        pipe.ltrim(ACTIVITY_QUEUE_KEY, batch_size, -1)
+        batch, _ = pipe.execute()
+        
+        activities = [cls._from_payload(json.loads(item)) for item in batch]
+        if not activities:
+            return 0
+        
+        try:
+            with transaction.atomic():
+                cls.objects.bulk_create(activities, batch_size=batch_size)
+        except IntegrityError:
+            # A row referencing a deleted document or user must not sink the batch
+            for activity in activities:
+                try:
+                    with transaction.atomic():
+                        activity.save(force_insert=True)
+                except IntegrityError as e:
+                    logger.warning(f"Dropped activity for document {activity.document_id}: {e}")
+        except DatabaseError:
+            # The audit trail must survive an unreachable database: put the batch
+            # back at the head of the queue, in order, for the next run
+            get_redis().lpush(ACTIVITY_QUEUE_KEY, *reversed(batch))
+            raise
+        
+        return len(batch)
+
+
+class DocumentCommentQuerySet(models.QuerySet):
+    def with_related(self):
+        # Replies are fetched in one query by DocumentCommentListSerializer
+        return self.select_related('author', 'resolved_by')
+    
+    def with_replies(self):
+        """For serializing single comments: replies land in _prefetched_replies"""
+        return self.with_related().prefetch_related(
+            models.Prefetch(
+                'replies',
+                queryset=DocumentComment.objects.with_related(),
+                to_attr='_prefetched_replies'
+            )
+        )
 
 
 class DocumentComment(models.Model):
     """
     Comments on documents
     """
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='comments')
     author = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -368,6 +750,8 @@ class DocumentComment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = DocumentCommentQuerySet.as_manager()
+    
     class Meta:
         db_table = 'documents_documentcomment'
         verbose_name = 'Document Comment'
@@ -378,6 +762,38 @@ class DocumentComment(models.Model):
         return f"Comment by {self.author.get_full_name()} on {self.document.title}"
 
 
+class DocumentShareQuerySet(models.QuerySet):
+    def live(self):
+        """Active shares that have not expired, filtered in SQL"""
+        return self.filter(is_active=True).filter(
+            models.Q(expires_at__isnull=True) | models.Q(expires_at__gt=timezone.now())
+        )
+    
+    def with_related(self):
+        """Own columns plus only the related names DocumentShareSerializer renders"""
+        return self.select_related(
+            'document', 'shared_by', 'shared_with_user', 'shared_with_department'
+        ).only(
+            'id', 'document', 'share_type', 'access_level', 'shared_with_user',
+            'shared_with_department', 'public_link_token_bin', 'shared_by', 'shared_at',
+            'expires_at', 'is_active', 'access_count', 'last_accessed_at',
+            'allow_download', 'allow_reshare', 'notify_on_access',
+            'document__title', 'shared_by__first_name', 'shared_by__last_name',
+            'shared_with_user__first_name', 'shared_with_user__last_name',
+            'shared_with_department__name'
+        )
+    
+    def with_expiry(self):
+        """Annotate is_expired_db so serializers skip the per-row is_expired() call"""
+        return self.annotate(
+            is_expired_db=models.Case(
+                models.When(expires_at__lt=Now(), then=models.Value(True)),
+                default=models.Value(False),
+                output_field=models.BooleanField()
+            )
+        )
+
+
 class DocumentShare(models.Model):
     """
     Document sharing relationships
@@ -395,12 +811,12 @@ class DocumentShare(models.Model):
         ('edit', 'Full Edit Access'),
     ]
     
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='shares')
     
     # Sharing details
-    share_type = models.CharField(max_length=20, choices=SHARE_TYPE_CHOICES)
-    access_level = models.CharField(max_length=20, choices=ACCESS_LEVEL_CHOICES, default='view')
+    share_type = SmallIntChoiceField(choices=SHARE_TYPE_CHOICES)
+    access_level = SmallIntChoiceField(choices=ACCESS_LEVEL_CHOICES, default='view')
     
     # Share targets
     shared_with_user = models.ForeignKey(
@@ -419,7 +835,8 @@ class DocumentShare(models.Model):
     )
     
     # Public link sharing
-    public_link_token = models.CharField(max_length=64, null=True, blank=True, unique=True)
+    # Raw 32-byte token; public_link_token exposes its URL-safe form
+    public_link_token_bin = models.BinaryField(max_length=32, null=True, blank=True, unique=True)
     link_password = models.CharField(max_length=128, null=True, blank=True)
     
     # Sharing metadata
@@ -448,6 +865,8 @@ class DocumentShare(models.Model):
     allow_reshare = models.BooleanField(default=False)
     notify_on_access = models.BooleanField(default=False)
     
+    objects = DocumentShareQuerySet.as_manager()
+    
     class Meta:
         db_table = 'documents_documentshare'
         verbose_name = 'Document Share'
@@ -457,24 +876,36 @@ class DocumentShare(models.Model):
                 check=(
                     models.Q(share_type='user', shared_with_user__isnull=False) |
                     models.Q(share_type='department', shared_with_department__isnull=False) |
-                    models.Q(share_type='public_link', public_link_token__isnull=False)
+                    models.Q(share_type='public_link', public_link_token_bin__isnull=False)
                 ),
                 name='valid_share_target'
             )
         ]
         indexes = [
-            models.Index(fields=['document']),
             models.Index(fields=['shared_with_user']),
             models.Index(fields=['shared_with_department']),
-            models.Index(fields=['public_link_token']),
             models.Index(fields=['expires_at']),
+            models.Index(
+                fields=['document', 'expires_at'],
+                condition=models.Q(is_active=True),
+                name='share_live'
+            ),
         ]
     
+    @property
+    def public_link_token(self):
+        if not self.public_link_token_bin:
+            return None
+        return share_token_str(self.public_link_token_bin)
+    
+    @public_link_token.setter
+    def public_link_token(self, token):
+        self.public_link_token_bin = share_token_bytes(token) if token else None
+    
     def save(self, *args, **kwargs):
         # Generate public link token if needed
-        if self.share_type == 'public_link' and not self.public_link_token:
-            import secrets
-            self.public_link_token = secrets.token_urlsafe(32)
+        if self.share_type == 'public_link' and not self.public_link_token_bin:
+            self.public_link_token_bin = secrets.token_bytes(32)
         super().save(*args, **kwargs)
     
     def __str__(self):
@@ -487,6 +918,12 @@ class DocumentShare(models.Model):
         
         return f"{self.document.title} shared with {target}"
     
+    @property
+    def access_count_live(self):
+        """access_count including increments still buffered in Redis"""
+        from .utils import pending_counter
+        return self.access_count + pending_counter('documentshare', self.pk, 'access_count')
+    
     def is_expired(self):
         """Check if the share has expired"""
         if self.expires_at:
@@ -501,10 +938,8 @@ class DocumentShare(models.Model):
         if self.share_type == 'user':
             return self.shared_with_user == user
         elif self.share_type == 'department':
-            return user.department_assignments.filter(
-                department=self.shared_with_department,
-                end_date__isnull=True
-            ).exists()
+            from .utils import user_in_department
+            return user_in_department(user, self.shared_with_department_id)
         elif self.share_type == 'public_link':
             return True  # Public links can be accessed by anyone with the token
         
@@ -4,10 +4,42 @@ Custom permission classes for document operations
 from rest_framework import permissions
 from departments.models import Permission
 from .utils import user_has_permission
+import functools
 import logging
 
 logger = logging.getLogger(__name__)
 
+
+def request_user_flags(request):
+    """(is_authenticated, is_admin) for the request's user, resolved once per request"""
+    flags = getattr(request, '_user_flags', None)
+    if flags is None:
+        user = request.user
+        is_authenticated = bool(user and user.is_authenticated)
+        flags = request._user_flags = (is_authenticated, is_authenticated and user.role == 'admin')
+    return flags
+
+
+@functools.lru_cache(maxsize=256)
+def _infer_action(view_cls, method):
+    """Infer the PERMISSION_MAP action for a view without one; memoized per (view class, method)"""
+    if not hasattr(view_cls, 'get_view_name'):
+        return None
+    
+    view_name = view_cls().get_view_name().lower()
+    if 'download' in view_name:
+        return 'download'
+    elif 'preview' in view_name:
+        return 'retrieve'
+    elif method == 'POST':
+        return 'create'
+    elif method in ['PUT', 'PATCH']:
+        return 'update'
+    elif method == 'DELETE':
+        return 'destroy'
+    return 'retrieve'
+
+
 class HasDocumentPermission(permissions.BasePermission):
     """
     Custom permission class that checks our custom permission system
@@ -28,31 +60,19 @@ class HasDocumentPermission(permissions.BasePermission):
     
     def has_permission(self, request, view):
         """Check if user is authenticated and has basic access"""
-        if not request.user or not request.user.is_authenticated:
+        is_authenticated, is_admin = request_user_flags(request)
+        if not is_authenticated:
             return False
         
         # Admin always has access
-        if request.user.role == 'admin':
+        if is_admin:
             return True
             
         # Get the action being performed
         action = getattr(view, 'action', None)
         if not action:
             # For function-based views, try to infer from method and view name
-            if hasattr(view, 'get_view_name'):
-                view_name = view.get_view_name().lower()
-                if 'download' in view_name:
-                    action = 'download'
-                elif 'preview' in view_name:
-                    action = 'retrieve'
-                elif request.method == 'POST':
-                    action = 'create'
-                elif request.method in ['PUT', 'PATCH']:
-                    action = 'update'
-                elif request.method == 'DELETE':
-                    action = 'destroy'
-                else:
-                    action = 'retrieve'
+            action = _infer_action(type(view), request.method)
         
         # Get required permission for this action
         required_permission = self.PERMISSION_MAP.get(action, 'documents.view_all')
@@ -70,11 +90,12 @@ class HasDocumentPermission(permissions.BasePermission):
     
     def has_object_permission(self, request, view, obj):
         """Check permissions for specific document objects"""
-        if not request.user or not request.user.is_authenticated:
+        is_authenticated, is_admin = request_user_flags(request)
+        if not is_authenticated:
             return False
         
         # Admin always has access
-        if request.user.role == 'admin':
+        if is_admin:
             return True
         
         # Document owner has access to their own documents
@@ -96,74 +117,28 @@ class HasDocumentPermission(permissions.BasePermission):
         required_permission = self.PERMISSION_MAP.get(action, 'documents.view_all')
         return user_has_permission(request.user, required_permission)
 
-class CanCreateDocuments(permissions.BasePermission):
-    """Check if user can create documents"""
-    
+def make_permission_class(permission_key, docstring):
+    """Build a DRF permission class that requires a single custom permission key"""
     def has_permission(self, request, view):
-        if not request.user or not request.user.is_authenticated:
+        is_authenticated, is_admin = request_user_flags(request)
+        if not is_authenticated:
             return False
         
-        if request.user.role == 'admin':
+        if is_admin:
             return True
-            
-        return user_has_permission(request.user, 'documents.create')
-
-class CanViewAllDocuments(permissions.BasePermission):
-    """Check if user can view all documents"""
-    
-    def has_permission(self, request, view):
-        if not request.user or not request.user.is_authenticated:
-            return False
         
-        if request.user.role == 'admin':
-            return True
-            
-        return user_has_permission(request.user, 'documents.view_all')
-
-class CanEditAllDocuments(permissions.BasePermission):
-    """Check if user can edit all documents"""
+        return user_has_permission(request.user, permission_key)
     
-    def has_permission(self, request, view):
-        if not request.user or not request.user.is_authenticated:
-            return False
-        
-        if request.user.role == 'admin':
-            return True
-            
-        return user_has_permission(request.user, 'documents.edit_all')
+    return type(
+        f"Has_{permission_key.replace('.', '_')}",
+        (permissions.BasePermission,),
+        {'__doc__': docstring, 'permission_key': permission_key, 'has_permission': has_permission}
+    )
 
-class CanDeleteAllDocuments(permissions.BasePermission):
-    """Check if user can delete all documents"""
-    
-    def has_permission(self, request, view):
-        if not request.user or not request.user.is_authenticated:
-            return False
-        
-        if request.user.role == 'admin':
-            return True
-            
-        return user_has_permission(request.user, 'documents.delete_all')
 
-class CanShareDocuments(permissions.BasePermission):
-    """Check if user can share documents"""
-    
-    def has_permission(self, request, view):
-        if not request.user or not request.user.is_authenticated:
-            return False
-        
-        if request.user.role == 'admin':
-            return True
-            
-        return user_has_permission(request.user, 'documents.share')
-
-class CanApproveDocuments(permissions.BasePermission):
-    """Check if user can approve documents"""
-    
-    def has_permission(self, request, view):
-        if not request.user or not request.user.is_authenticated:
-            return False
-        
-        if request.user.role == 'admin':
-            return True
-            
-        return user_has_permission(request.user, 'documents.approve') 
\ No newline at end of file
+CanCreateDocuments = make_permission_class('documents.create', "Check if user can create documents")
+CanViewAllDocuments = make_permission_class('documents.view_all', "Check if user can view all documents")
+CanEditAllDocuments = make_permission_class('documents.edit_all', "Check if user can edit all documents")
+CanDeleteAllDocuments = make_permission_class('documents.delete_all', "Check if user can delete all documents")
+CanShareDocuments = make_permission_class('documents.share', "Check if user can share documents")
+CanApproveDocuments = make_permission_class('documents.approve', "Check if user can approve documents")
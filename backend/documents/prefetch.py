@@ -0,0 +1,105 @@
+"""
+Infer select_related/prefetch_related lookups from a view's serializer
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+
+_lookup_cache = {}
+
+
+def _walk(model, parts):
+    """
+    Follow a dotted serializer source through model relations.
+
+    Returns (model_path, many, last_field): the relation path that could be
+    followed, whether it crosses a to-many relation, and the model field the
+    walk ended on (None when the source stops at a method or property).
+    """
+    path, many, field = [], False, None
+    for part in parts:
+        try:
+            field = model._meta.get_field(part)
+        except FieldDoesNotExist:
+            return path, many, None
+        if not field.is_relation:
+            return path, many, None
+        path.append(part)
+        many = many or field.one_to_many or field.many_to_many
+        model = field.related_model
+    return path, many, field
+
+
+def _collect(serializer, model, prefix, in_many, select, prefetch):
+    for field in serializer.fields.values():
+        if field.write_only or field.source == '*':
+            continue
+        if isinstance(field, serializers.SerializerMethodField):
+            continue
+
+        path, many, last = _walk(model, field.source_attrs)
+        if not path:
+            continue
+
+        nested = field.child if isinstance(field, serializers.ListSerializer) else field
+        if last is not None and isinstance(field, serializers.PrimaryKeyRelatedField):
+            # Primary key fields read the FK column; no join needed
+            path = path[:-1]
+            if not path:
+                continue
+
+        lookup = prefix + '__'.join(path)
+        if in_many or many:
+            prefetch.add(lookup)
+        else:
+            select.add(lookup)
+
+        if last is not None and isinstance(nested, serializers.BaseSerializer):
+            _collect(nested, last.related_model, lookup + '__', in_many or many, select, prefetch)
+
+
+def _hint_lookups(serializer_class, model, select, prefetch):
+    for hint in getattr(serializer_class, 'prefetch_hints', ()):
+        path, many, _ = _walk(model, hint.split('__'))
+        if path:
+            (prefetch if many else select).add('__'.join(path))
+
+
+def serializer_lookups(serializer_class):
+    """Return (select_related, prefetch_related) lookups a serializer will read"""
+    if serializer_class not in _lookup_cache:
+        model = serializer_class.Meta.model
+        select, prefetch = set(), set()
+        _collect(serializer_class(), model, '', False, select, prefetch)
+        _hint_lookups(serializer_class, model, select, prefetch)
+        _lookup_cache[serializer_class] = (sorted(select), sorted(prefetch))
+    return _lookup_cache[serializer_class]
+
+
+class AutoPrefetchMixin:
+    """
+    Add the joins and prefetches the view's serializer needs to get_queryset().
+
+    Lookups already on the queryset win: anything under an explicit Prefetch
+    with a custom queryset is left to it. Serializer method fields are opaque,
+    so serializers declare what they read in ``prefetch_hints``.
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        select, prefetch = serializer_lookups(self.get_serializer_class())
+
+        explicit = {
+            lookup.prefetch_to for lookup in queryset._prefetch_related_lookups
+            if isinstance(lookup, Prefetch) and lookup.queryset is not None
+        }
+        prefetch = [
+            lookup for lookup in prefetch
+            if not any(lookup == p or lookup.startswith(p + '__') for p in explicit)
+        ]
+
+        if select:
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        return queryset
@@ -1,18 +1,56 @@
+from collections import defaultdict
+from django.contrib.auth import get_user_model
+from django.db import models
 from rest_framework import serializers
+from departments.models import Department
 from .models import (
     DocumentCategory, Document, DocumentTag, DocumentPermission,
-    DocumentActivity, DocumentComment, DocumentShare
+    DocumentActivity, DocumentComment, DocumentShare, DOCUMENT_DETAIL_COLUMNS
 )
-from django.utils.text import slugify
+from .serializers_cache import SerializerCacheMixin
+from .signals import refresh_document_acl
+
+User = get_user_model()
+
+
+def absolute_url(context, path):
+    """
+    request.build_absolute_uri() for a root-relative path, with the scheme and
+    host resolved once per serializer context instead of once per row
+    """
+    base_url = context.get('base_url')
+    if base_url is None:
+        request = context.get('request')
+        if request is None:
+            return None
+        base_url = context['base_url'] = request.build_absolute_uri('/')[:-1]
+    return base_url + path
+
+
+def require_for_choice(attrs, choice_field, requirements):
+    """
+    Validate fields that depend on a choice (share type, bulk action).
+    
+    ``requirements`` maps a choice to ``(fields, message)``; at least one of
+    ``fields`` must be set when that choice is made.
+    """
+    requirement = requirements.get(attrs.get(choice_field))
+    if requirement is not None:
+        fields, message = requirement
+        if not any(attrs.get(field) for field in fields):
+            raise serializers.ValidationError(message)
 
 
 class DocumentCategorySerializer(serializers.ModelSerializer):
     """Serializer for document category"""
-    parent_category_name = serializers.SerializerMethodField()
-    department_name = serializers.SerializerMethodField()
+    parent_category_name = serializers.CharField(source='parent_category.name', read_only=True, allow_null=True)
+    department_name = serializers.CharField(source='department.name', read_only=True, allow_null=True)
     documents_count = serializers.SerializerMethodField()
     hierarchy = serializers.SerializerMethodField()
     
+    # get_hierarchy() falls back to walking parent categories
+    prefetch_hints = ('parent_category',)
+    
     class Meta:
         model = DocumentCategory
         fields = [
@@ -23,14 +61,10 @@ class DocumentCategorySerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ('id', 'slug', 'created_at', 'updated_at')
     
-    def get_parent_category_name(self, obj):
-        return obj.parent_category.name if obj.parent_category else None
-    
-    def get_department_name(self, obj):
-        return obj.department.name if obj.department else None
-    
     def get_documents_count(self, obj):
-        return obj.documents.count()
+        # Annotated by DocumentCategoryQuerySet.with_counts() on list/detail views
+        count = getattr(obj, 'documents_count', None)
+        return count if count is not None else obj.documents.count()
     
     def get_hierarchy(self, obj):
         return obj.get_full_hierarchy()
@@ -47,10 +81,11 @@ class DocumentCategoryListSerializer(serializers.ModelSerializer):
         ]
     
     def get_documents_count(self, obj):
-        return obj.documents.filter(status='published').count()
+        count = getattr(obj, 'published_documents_count', None)
+        return count if count is not None else obj.documents.filter(status='published').count()
 
 
-class DocumentTagSerializer(serializers.ModelSerializer):
+class DocumentTagSerializer(SerializerCacheMixin, serializers.ModelSerializer):
     """Serializer for document tag"""
     documents_count = serializers.SerializerMethodField()
     
@@ -62,15 +97,17 @@ class DocumentTagSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'slug', 'created_at')
     
     def get_documents_count(self, obj):
-        return obj.documents.count()
+        # Annotated by DocumentTagQuerySet.with_counts(), including prefetched document tags
+        count = getattr(obj, 'documents_count', None)
+        return count if count is not None else obj.documents.count()
 
 
 class DocumentSerializer(serializers.ModelSerializer):
     """Serializer for document model"""
-    category_name = serializers.SerializerMethodField()
-    created_by_name = serializers.SerializerMethodField()
-    owned_by_name = serializers.SerializerMethodField()
-    reviewer_name = serializers.SerializerMethodField()
+    category_name = serializers.CharField(source='category.name', read_only=True)
+    created_by_name = serializers.CharField(source='created_by.get_full_name', read_only=True)
+    owned_by_name = serializers.CharField(source='owned_by.get_full_name', read_only=True)
+    reviewer_name = serializers.CharField(source='reviewer.get_full_name', read_only=True, allow_null=True)
     tags = DocumentTagSerializer(many=True, read_only=True)
     tag_ids = serializers.ListField(
         child=serializers.UUIDField(),
@@ -97,23 +134,12 @@ class DocumentSerializer(serializers.ModelSerializer):
             'download_count', 'view_count', 'created_at', 'updated_at'
         )
     
-    def get_category_name(self, obj):
-        return obj.category.name
-    
-    def get_created_by_name(self, obj):
-        return obj.created_by.get_full_name()
-    
-    def get_owned_by_name(self, obj):
-        return obj.owned_by.get_full_name()
-    
-    def get_reviewer_name(self, obj):
-        return obj.reviewer.get_full_name() if obj.reviewer else None
-    
     def get_file_size_mb(self, obj):
         return obj.file_size_mb
     
     def get_comments_count(self, obj):
-        return obj.comments.count()
+        count = getattr(obj, 'comments_count', None)
+        return count if count is not None else obj.comments.count()
     
     def create(self, validated_data):
         tag_ids = validated_data.pop('tag_ids', [])
@@ -124,8 +150,8 @@ class DocumentSerializer(serializers.ModelSerializer):
         document = Document.objects.create(**validated_data)
         
         if tag_ids:
-            tags = DocumentTag.objects.filter(id__in=tag_ids)
-            document.tags.set(tags)
+            # A new document has no tags yet, so there is nothing to diff against
+            document.tags.add(*self._existing_tag_ids(tag_ids))
         
         return document
     
@@ -138,16 +164,26 @@ class DocumentSerializer(serializers.ModelSerializer):
         instance.save()
         
         if tag_ids is not None:
-            tags = DocumentTag.objects.filter(id__in=tag_ids)
-            instance.tags.set(tags)
+            # Touch only the through rows that change
+            new = self._existing_tag_ids(tag_ids)
+            current = set(instance.tags.values_list('id', flat=True))
+            if current - new:
+                instance.tags.remove(*(current - new))
+            if new - current:
+                instance.tags.add(*(new - current))
         
         return instance
+    
+    @staticmethod
+    def _existing_tag_ids(tag_ids):
+        """Drop ids of tags that do not exist, without loading the tag rows"""
+        return set(DocumentTag.objects.filter(id__in=tag_ids).values_list('id', flat=True))
 
 
 class DocumentListSerializer(serializers.ModelSerializer):
     """Simplified serializer for document lists"""
-    category_name = serializers.SerializerMethodField()
-    created_by_name = serializers.SerializerMethodField()
+    category_name = serializers.CharField(source='category.name', read_only=True)
+    created_by_name = serializers.CharField(source='created_by.get_full_name', read_only=True)
     file_size_mb = serializers.SerializerMethodField()
     
     class Meta:
@@ -158,22 +194,49 @@ class DocumentListSerializer(serializers.ModelSerializer):
             'version', 'created_at', 'updated_at'
         ]
     
-    def get_category_name(self, obj):
-        return obj.category.name
-    
-    def get_created_by_name(self, obj):
-        return obj.created_by.get_full_name()
-    
     def get_file_size_mb(self, obj):
         return obj.file_size_mb
 
 
-class DocumentPermissionSerializer(serializers.ModelSerializer):
+class DocumentListLiteSerializer(serializers.Serializer):
+    """
+    DocumentListSerializer's output built from ``values()`` rows, so list
+    endpoints never instantiate Document models
+    """
+    value_fields = (
+        'id', 'title', 'category__name', 'created_by__first_name',
+        'created_by__last_name', 'status', 'priority', 'file_type',
+        'file_size', 'version', 'created_at', 'updated_at'
+    )
+    
+    id = serializers.UUIDField(read_only=True)
+    title = serializers.CharField(read_only=True)
+    category_name = serializers.CharField(source='category__name', read_only=True)
+    created_by_name = serializers.SerializerMethodField()
+    status = serializers.CharField(read_only=True)
+    priority = serializers.CharField(read_only=True)
+    file_type = serializers.CharField(read_only=True)
+    file_size_mb = serializers.SerializerMethodField()
+    version = serializers.CharField(read_only=True)
+    created_at = serializers.DateTimeField(read_only=True)
+    updated_at = serializers.DateTimeField(read_only=True)
+    
+    # Same formatting as User.get_full_name() and Document.file_size_mb
+    def get_created_by_name(self, row):
+        return f"{row['created_by__first_name']} {row['created_by__last_name']}".strip()
+    
+    def get_file_size_mb(self, row):
+        if row['file_size']:
+            return round(row['file_size'] / (1024 * 1024), 2)
+        return 0
+
+
+class DocumentPermissionSerializer(SerializerCacheMixin, serializers.ModelSerializer):
     """Serializer for document permission"""
-    document_title = serializers.SerializerMethodField()
-    user_name = serializers.SerializerMethodField()
-    department_name = serializers.SerializerMethodField()
-    granted_by_name = serializers.SerializerMethodField()
+    document_title = serializers.CharField(source='document.title', read_only=True)
+    user_name = serializers.CharField(source='user.get_full_name', read_only=True, allow_null=True)
+    department_name = serializers.CharField(source='department.name', read_only=True, allow_null=True)
+    granted_by_name = serializers.CharField(source='granted_by.get_full_name', read_only=True)
     
     class Meta:
         model = DocumentPermission
@@ -184,27 +247,15 @@ class DocumentPermissionSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ('id', 'granted_by', 'created_at')
     
-    def get_document_title(self, obj):
-        return obj.document.title
-    
-    def get_user_name(self, obj):
-        return obj.user.get_full_name() if obj.user else None
-    
-    def get_department_name(self, obj):
-        return obj.department.name if obj.department else None
-    
-    def get_granted_by_name(self, obj):
-        return obj.granted_by.get_full_name()
-    
     def create(self, validated_data):
         validated_data['granted_by'] = self.context['request'].user
         return super().create(validated_data)
 
 
-class DocumentActivitySerializer(serializers.ModelSerializer):
+class DocumentActivitySerializer(SerializerCacheMixin, serializers.ModelSerializer):
     """Serializer for document activity"""
-    document_title = serializers.SerializerMethodField()
-    user_name = serializers.SerializerMethodField()
+    document_title = serializers.CharField(source='document.title', read_only=True)
+    user_name = serializers.CharField(source='user.get_full_name', read_only=True)
     
     class Meta:
         model = DocumentActivity
@@ -214,18 +265,35 @@ class DocumentActivitySerializer(serializers.ModelSerializer):
             'new_version', 'created_at'
         ]
         read_only_fields = ('id', 'created_at')
+
+
+class DocumentCommentListSerializer(serializers.ListSerializer):
+    """
+    Serialize comment threads from one query: every reply of the listed
+    comments' documents is fetched together and grouped by parent in Python.
+    """
     
-    def get_document_title(self, obj):
-        return obj.document.title
-    
-    def get_user_name(self, obj):
-        return obj.user.get_full_name()
+    def to_representation(self, data):
+        comments = list(data.all() if isinstance(data, models.Manager) else data)
+        
+        children = defaultdict(list)
+        if comments:
+            replies = DocumentComment.objects.select_related('author', 'resolved_by').filter(
+                document_id__in={comment.document_id for comment in comments},
+                parent_comment__isnull=False
+            )
+            for reply in replies:
+                children[reply.parent_comment_id].append(reply)
+        
+        # The child serializer renders replies itself, reusing its bound fields
+        self.child._comment_children = children
+        return [self.child.to_representation(comment) for comment in comments]
 
 
-class DocumentCommentSerializer(serializers.ModelSerializer):
+class DocumentCommentSerializer(SerializerCacheMixin, serializers.ModelSerializer):
     """Serializer for document comment"""
-    author_name = serializers.SerializerMethodField()
-    resolved_by_name = serializers.SerializerMethodField()
+    author_name = serializers.CharField(source='author.get_full_name', read_only=True)
+    resolved_by_name = serializers.CharField(source='resolved_by.get_full_name', read_only=True, allow_null=True)
     replies = serializers.SerializerMethodField()
     replies_count = serializers.SerializerMethodField()
     
@@ -241,21 +309,30 @@ class DocumentCommentSerializer(serializers.ModelSerializer):
             'id', 'author', 'resolved_by', 'resolved_at',
             'created_at', 'updated_at'
         )
+        list_serializer_class = DocumentCommentListSerializer
     
-    def get_author_name(self, obj):
-        return obj.author.get_full_name()
-    
-    def get_resolved_by_name(self, obj):
-        return obj.resolved_by.get_full_name() if obj.resolved_by else None
+    def _children_of(self, obj):
+        children = getattr(self, '_comment_children', None)
+        if children is not None:
+            return children.get(obj.id, [])
+        
+        # Serialized on its own rather than through DocumentCommentListSerializer
+        prefetched = getattr(obj, '_prefetched_replies', None)
+        if prefetched is not None:
+            return prefetched
+        standalone = self.__dict__.setdefault('_standalone_children', {})
+        if obj.id not in standalone:
+            standalone[obj.id] = list(obj.replies.select_related('author', 'resolved_by'))
+        return standalone[obj.id]
     
     def get_replies(self, obj):
-        if obj.parent_comment is None:  # Only get replies for top-level comments
-            replies = obj.replies.all()
-            return DocumentCommentSerializer(replies, many=True, context=self.context).data
-        return []
+        # Only top-level comments carry their replies; no lookup for the rest
+        if obj.parent_comment_id is not None:
+            return []
+        return [self.to_representation(reply) for reply in self._children_of(obj)]
     
     def get_replies_count(self, obj):
-        return obj.replies.count()
+        return len(self._children_of(obj))
     
     def create(self, validated_data):
         validated_data['author'] = self.context['request'].user
@@ -264,7 +341,7 @@ class DocumentCommentSerializer(serializers.ModelSerializer):
 
 class DocumentVersionSerializer(serializers.ModelSerializer):
     """Serializer for document version information"""
-    created_by_name = serializers.SerializerMethodField()
+    created_by_name = serializers.CharField(source='created_by.get_full_name', read_only=True)
     
     class Meta:
         model = Document
@@ -272,17 +349,15 @@ class DocumentVersionSerializer(serializers.ModelSerializer):
             'id', 'version', 'created_by_name', 'file', 'file_size_mb',
             'is_latest_version', 'created_at'
         ]
-    
-    def get_created_by_name(self, obj):
-        return obj.created_by.get_full_name()
 
 
 class DocumentSearchSerializer(serializers.ModelSerializer):
     """Serializer for document search results"""
-    category_name = serializers.SerializerMethodField()
-    created_by_name = serializers.SerializerMethodField()
+    category_name = serializers.CharField(source='category.name', read_only=True)
+    created_by_name = serializers.CharField(source='created_by.get_full_name', read_only=True)
     tags = DocumentTagSerializer(many=True, read_only=True)
-    highlight = serializers.SerializerMethodField()
+    # Attached by the search backend when it highlights matches; {} otherwise
+    highlight = serializers.JSONField(source='_highlight', default=dict, read_only=True)
     
     class Meta:
         model = Document
@@ -291,17 +366,6 @@ class DocumentSearchSerializer(serializers.ModelSerializer):
             'created_by_name', 'status', 'tags', 'file_type',
             'created_at', 'highlight'
         ]
-    
-    def get_category_name(self, obj):
-        return obj.category.name
-    
-    def get_created_by_name(self, obj):
-        return obj.created_by.get_full_name()
-    
-    def get_highlight(self, obj):
-        # This would be used for search result highlighting
-        # Implementation depends on search backend (e.g., Elasticsearch)
-        return getattr(obj, '_highlight', {})
 
 
 class DocumentStatsSerializer(serializers.Serializer):
@@ -335,23 +399,26 @@ class BulkDocumentActionSerializer(serializers.Serializer):
         required=False
     )
     
+    ACTION_REQUIREMENTS = {
+        'change_category': (('category_id',), "category_id is required for change_category action"),
+        'add_tags': (('tag_ids',), "tag_ids is required for tag actions"),
+        'remove_tags': (('tag_ids',), "tag_ids is required for tag actions"),
+    }
+    
     def validate(self, attrs):
-        action = attrs.get('action')
-        if action == 'change_category' and not attrs.get('category_id'):
-            raise serializers.ValidationError("category_id is required for change_category action")
-        if action in ['add_tags', 'remove_tags'] and not attrs.get('tag_ids'):
-            raise serializers.ValidationError("tag_ids is required for tag actions")
-        return attrs 
+        require_for_choice(attrs, 'action', self.ACTION_REQUIREMENTS)
+        return attrs
 
 
-class DocumentShareSerializer(serializers.ModelSerializer):
+class DocumentShareSerializer(SerializerCacheMixin, serializers.ModelSerializer):
     """Serializer for document sharing"""
-    document_title = serializers.SerializerMethodField()
-    shared_by_name = serializers.SerializerMethodField()
-    shared_with_user_name = serializers.SerializerMethodField()
-    shared_with_department_name = serializers.SerializerMethodField()
+    document_title = serializers.CharField(source='document.title', read_only=True)
+    shared_by_name = serializers.CharField(source='shared_by.get_full_name', read_only=True)
+    shared_with_user_name = serializers.CharField(source='shared_with_user.get_full_name', read_only=True, allow_null=True)
+    shared_with_department_name = serializers.CharField(source='shared_with_department.name', read_only=True, allow_null=True)
     is_expired = serializers.SerializerMethodField()
     public_link_url = serializers.SerializerMethodField()
+    public_link_token = serializers.CharField(read_only=True)
     
     class Meta:
         model = DocumentShare
@@ -368,48 +435,38 @@ class DocumentShareSerializer(serializers.ModelSerializer):
             'public_link_token'
         ]
     
-    def get_document_title(self, obj):
-        return obj.document.title
-    
-    def get_shared_by_name(self, obj):
-        return obj.shared_by.get_full_name()
-    
-    def get_shared_with_user_name(self, obj):
-        return obj.shared_with_user.get_full_name() if obj.shared_with_user else None
-    
-    def get_shared_with_department_name(self, obj):
-        return obj.shared_with_department.name if obj.shared_with_department else None
-    
     def get_is_expired(self, obj):
-        return obj.is_expired()
+        # Annotated by DocumentShareQuerySet.with_expiry() on list and detail views
+        expired = getattr(obj, 'is_expired_db', None)
+        return expired if expired is not None else obj.is_expired()
     
     def get_public_link_url(self, obj):
         if obj.share_type == 'public_link' and obj.public_link_token:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(
-                    f'/api/v1/documents/shared/{obj.public_link_token}/'
-                )
+            return absolute_url(self.context, f'/api/v1/documents/shared/{obj.public_link_token}/')
         return None
     
+    SHARE_TYPE_REQUIREMENTS = {
+        'user': (('shared_with_user',), "shared_with_user is required for user shares"),
+        'department': (('shared_with_department',), "shared_with_department is required for department shares"),
+    }
+    
+    # Target fields that only apply to one share type
+    SHARE_TYPE_FIELDS = {
+        'user': ('shared_with_user',),
+        'department': ('shared_with_department',),
+        'public_link': ('public_link_token_bin', 'link_password'),
+    }
+    
     def validate(self, attrs):
         """Validate share data"""
-        share_type = attrs.get('share_type')
-        
-        if share_type == 'user' and not attrs.get('shared_with_user'):
-            raise serializers.ValidationError("shared_with_user is required for user shares")
-        
-        if share_type == 'department' and not attrs.get('shared_with_department'):
-            raise serializers.ValidationError("shared_with_department is required for department shares")
+        require_for_choice(attrs, 'share_type', self.SHARE_TYPE_REQUIREMENTS)
         
         # Clear inappropriate fields based on share type
-        if share_type != 'user':
-            attrs['shared_with_user'] = None
-        if share_type != 'department':
-            attrs['shared_with_department'] = None
-        if share_type != 'public_link':
-            attrs['public_link_token'] = None
-            attrs['link_password'] = None
+        share_type = attrs.get('share_type')
+        for other_type, fields in self.SHARE_TYPE_FIELDS.items():
+            if other_type != share_type:
+                for field in fields:
+                    attrs[field] = None
         
         return attrs
     
@@ -448,20 +505,13 @@ class ShareDocumentSerializer(serializers.Serializer):
     send_notification = serializers.BooleanField(default=True)
     message = serializers.CharField(required=False, allow_blank=True, max_length=500)
     
+    SHARE_TYPE_REQUIREMENTS = {
+        'user': (('user_email', 'user_ids'), "Either user_email or user_ids is required for user shares"),
+        'department': (('department_id',), "department_id is required for department shares"),
+    }
+    
     def validate(self, attrs):
-        share_type = attrs.get('share_type')
-        
-        if share_type == 'user':
-            if not attrs.get('user_email') and not attrs.get('user_ids'):
-                raise serializers.ValidationError(
-                    "Either user_email or user_ids is required for user shares"
-                )
-        elif share_type == 'department':
-            if not attrs.get('department_id'):
-                raise serializers.ValidationError(
-                    "department_id is required for department shares"
-                )
-        
+        require_for_choice(attrs, 'share_type', self.SHARE_TYPE_REQUIREMENTS)
         return attrs
 
 
@@ -473,32 +523,41 @@ class DocumentAccessSerializer(serializers.Serializer):
         fields = ['password']
 
 
-class DocumentDetailSerializer(serializers.ModelSerializer):
+class DocumentDetailSerializer(SerializerCacheMixin, serializers.ModelSerializer):
     """Detailed serializer for document retrieval"""
-    category_name = serializers.SerializerMethodField()
-    owned_by_name = serializers.SerializerMethodField()
+    category_name = serializers.CharField(source='category.name', read_only=True, allow_null=True)
+    owned_by_name = serializers.CharField(source='owned_by.get_full_name', read_only=True, allow_null=True)
     tags = DocumentTagSerializer(many=True, read_only=True)
     permissions = DocumentPermissionSerializer(many=True, read_only=True)
     activities = DocumentActivitySerializer(many=True, read_only=True)
-    comments = DocumentCommentSerializer(many=True, read_only=True)
+    comments = serializers.SerializerMethodField()
     shares = DocumentShareSerializer(many=True, read_only=True)
     file_url = serializers.SerializerMethodField()
     
     class Meta:
         model = Document
-        fields = '__all__'
-    
-    def get_category_name(self, obj):
-        return obj.category.name if obj.category else None
+        # Same fields and order '__all__' produced; keep DOCUMENT_DETAIL_COLUMNS in step
+        fields = [
+            'id', 'category_name', 'owned_by_name', 'tags', 'permissions',
+            'activities', 'comments', 'shares', 'file_url',
+            *DOCUMENT_DETAIL_COLUMNS[1:]
+        ]
     
-    def get_owned_by_name(self, obj):
-        return obj.owned_by.get_full_name() if obj.owned_by else None
+    def get_comments(self, obj):
+        # Top-level threads; replies are nested by DocumentCommentSerializer
+        comments = getattr(obj, 'top_level_comments', None)
+        if comments is None:
+            comments = obj.comments.filter(parent_comment__isnull=True)
+        # One bound comment list serializer per detail serializer, reused across documents
+        comment_list = getattr(self, '_comment_list', None)
+        if comment_list is None:
+            comment_list = self._comment_list = DocumentCommentSerializer(many=True, context=self.context)
+        return comment_list.to_representation(comments)
     
     def get_file_url(self, obj):
         if obj.file:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(obj.file.url)
+            # MEDIA_URL is root-relative, so file URLs share the request's base
+            return absolute_url(self.context, obj.file.url)
         return None
 
 
@@ -566,12 +625,7 @@ class DocumentCreateSerializer(serializers.ModelSerializer):
         
         # Handle tags
         if tag_names:
-            for tag_name in tag_names:
-                tag, created = DocumentTag.objects.get_or_create(
-                    name=tag_name.strip(),
-                    defaults={'slug': slugify(tag_name.strip())}
-                )
-                document.tags.add(tag)
+            document.tags.add(*DocumentTag.get_or_create_many(tag_names))
         
         # Handle document visibility and permissions
         self._handle_document_visibility(
@@ -584,60 +638,37 @@ class DocumentCreateSerializer(serializers.ModelSerializer):
     def _handle_document_visibility(self, document, visibility, shared_departments, 
                                    shared_user_emails, allow_download, allow_reshare):
         """Handle document visibility and create appropriate shares/permissions"""
-        from django.contrib.auth import get_user_model
-        from departments.models import Department
-        
-        User = get_user_model()
+        share_defaults = {
+            'document': document,
+            'access_level': 'download' if allow_download else 'view',
+            'shared_by': self.context['request'].user,
+            'allow_download': allow_download,
+            'allow_reshare': allow_reshare,
+            'is_active': True,
+        }
         
         if visibility == 'department' and shared_departments:
-            # Share with specific departments
-            for dept_id in shared_departments:
-                try:
-                    department = Department.objects.get(id=dept_id)
-                    DocumentShare.objects.create(
-                        document=document,
-                        share_type='department',
-                        access_level='download' if allow_download else 'view',
-                        shared_with_department=department,
-                        shared_by=self.context['request'].user,
-                        allow_download=allow_download,
-                        allow_reshare=allow_reshare,
-                        is_active=True
-                    )
-                except Department.DoesNotExist:
-                    continue
+            # Share with specific departments; unknown ids are skipped
+            departments = Department.objects.in_bulk(shared_departments)
+            DocumentShare.objects.bulk_create([
+                DocumentShare(share_type='department', shared_with_department=department, **share_defaults)
+                for department in departments.values()
+            ])
         
         elif visibility == 'users' and shared_user_emails:
-            # Share with specific users
-            for email in shared_user_emails:
-                try:
-                    user = User.objects.get(email=email)
-                    DocumentShare.objects.create(
-                        document=document,
-                        share_type='user',
-                        access_level='download' if allow_download else 'view',
-                        shared_with_user=user,
-                        shared_by=self.context['request'].user,
-                        allow_download=allow_download,
-                        allow_reshare=allow_reshare,
-                        is_active=True
-                    )
-                except User.DoesNotExist:
-                    continue
+            # Share with specific users; unknown emails are skipped
+            users = User.objects.filter(email__in=shared_user_emails)
+            shares = DocumentShare.objects.bulk_create([
+                DocumentShare(share_type='user', shared_with_user=user, **share_defaults)
+                for user in users
+            ])
+            # bulk_create skips the post_save receiver that republishes the ACL
+            if shares:
+                refresh_document_acl(document.id)
         
         elif visibility == 'public':
-            # Create public link
-            import secrets
-            DocumentShare.objects.create(
-                document=document,
-                share_type='public_link',
-                access_level='download' if allow_download else 'view',
-                public_link_token=secrets.token_urlsafe(32),
-                shared_by=self.context['request'].user,
-                allow_download=allow_download,
-                allow_reshare=allow_reshare,
-                is_active=True
-            )
+            # Create public link (the token is generated on save)
+            DocumentShare.objects.create(share_type='public_link', **share_defaults)
         
         # For 'private' visibility, no additional sharing is created
         # Document remains accessible only to admin and owner
@@ -668,12 +699,6 @@ class DocumentUpdateSerializer(serializers.ModelSerializer):
         
         # Update tags if provided
         if tag_names is not None:
-            instance.tags.clear()
-            for tag_name in tag_names:
-                tag, created = DocumentTag.objects.get_or_create(
-                    name=tag_name.strip(),
-                    defaults={'slug': slugify(tag_name.strip())}
-                )
-                instance.tags.add(tag)
+            instance.tags.set(DocumentTag.get_or_create_many(tag_names))
         
         return instance 
\ No newline at end of file
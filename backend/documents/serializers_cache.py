@@ -0,0 +1,32 @@
+"""
+Per-request memoization for nested document serializers
+"""
+
+REPRESENTATION_CACHE_KEY = '_representation_cache'
+
+
+class SerializerCacheMixin:
+    """
+    Serialize each saved instance at most once per serializer class and context.
+    
+    The cache lives in the serializer context, which the root serializer shares
+    with its nested fields and which views build afresh for every request, so
+    repeat objects (the same tag, share or comment reached through two paths)
+    reuse the representation built the first time. Unsaved instances are never
+    cached.
+    
+    Only representations are cached: ``fields`` is already computed once per
+    serializer instance, and ``many=True`` lists reuse a single child, so the
+    bound fields cannot be shared across serializer instances safely.
+    """
+    
+    def to_representation(self, instance):
+        pk = getattr(instance, 'pk', None)
+        if pk is None:
+            return super().to_representation(instance)
+        
+        cache = self.context.setdefault(REPRESENTATION_CACHE_KEY, {})
+        key = (type(self), pk)
+        if key not in cache:
+            cache[key] = super().to_representation(instance)
+        return cache[key]
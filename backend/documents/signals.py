@@ -0,0 +1,60 @@
+"""
+Signal handlers that keep cached permission decisions and stats in sync with the database
+"""
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from departments.models import Permission, EmployeeDepartment
+from .models import Document, DocumentPermission, DocumentShare
+from .utils import (
+    invalidate_user_permissions, invalidate_department_membership, invalidate_document_permissions,
+    invalidate_document_stats
+)
+
+
+@receiver([post_save, post_delete], sender=Permission)
+def invalidate_permission_cache(sender, instance, **kwargs):
+    """Drop cached decisions for every user a permission row applies to"""
+    if instance.entity_type == 'user':
+        invalidate_user_permissions(instance.entity_id)
+    elif instance.entity_type == 'department':
+        employee_ids = EmployeeDepartment.objects.filter(
+            department_id=instance.entity_id
+        ).values_list('employee_id', flat=True).distinct()
+        invalidate_user_permissions(*employee_ids)
+
+
+@receiver([post_save, post_delete], sender=EmployeeDepartment)
+def invalidate_assignment_permission_cache(sender, instance, **kwargs):
+    """Department membership changes which department permissions and shares a user inherits"""
+    invalidate_user_permissions(instance.employee_id)
+    invalidate_department_membership(instance.employee_id)
+
+
+@receiver([post_save, post_delete], sender=DocumentPermission)
+def invalidate_document_permission_cache(sender, instance, **kwargs):
+    """A grant may have changed permission, target or is_active, so drop all of the document's sets"""
+    invalidate_document_permissions(instance.document_id)
+
+
+def refresh_document_acl(document_id):
+    """Re-publish a document's access payload to the vector index once the change commits"""
+    from .tasks import update_document_permissions
+    transaction.on_commit(lambda: update_document_permissions.delay(str(document_id)))
+
+
+@receiver([post_save, post_delete], sender=DocumentPermission)
+def refresh_permission_acl(sender, instance, **kwargs):
+    refresh_document_acl(instance.document_id)
+
+
+@receiver([post_save, post_delete], sender=DocumentShare)
+def refresh_share_acl(sender, instance, **kwargs):
+    if instance.shared_with_user_id:
+        refresh_document_acl(instance.document_id)
+
+
+@receiver([post_save, post_delete], sender=Document)
+def invalidate_document_stats_cache(sender, instance, **kwargs):
+    """Document counts by status may have changed"""
+    invalidate_document_stats()
@@ -1,67 +1,173 @@
+import hashlib
 import logging
+from collections import defaultdict
 from celery import shared_task
+from celery.signals import worker_process_init
+from django.apps import apps
+from django.db import DatabaseError, connection
 from django.core.files.storage import default_storage
-from .models import Document
+from django.db.models import Case, F, IntegerField, Prefetch, Value, When
+from departments.models import EmployeeDepartment
+from portal_backend.redis_client import get_redis
+from .models import Document, DocumentActivity, DocumentPermission, DocumentShare
+from .utils import counter_key
 from .vector_service import vector_service
 
 logger = logging.getLogger(__name__)
 
 
-@shared_task(bind=True, max_retries=3)
-def index_document_task(self, document_id: str):
+@worker_process_init.connect
+def warm_up_embedding_model(**kwargs):
+    """Pay the embedding model's cold start when a worker process boots, not on its first task"""
+    try:
+        vector_service.warmup()
+    except Exception as e:
+        logger.warning(f"Embedding model warmup failed: {e}")
+
+
+def file_content_hash(document) -> str:
+    """SHA1 of a document's file content, read in storage-sized chunks"""
+    digest = hashlib.sha1()
+    with document.file.open('rb') as file:
+        for chunk in file.chunks():
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def documents_for_indexing():
+    """
+    Documents with everything document_index_metadata reads loaded up front:
+    the category and its department joined, active permissions with their
+    users and departments, and those departments' current employees.
+    """
+    current_employees = EmployeeDepartment.objects.filter(end_date__isnull=True).only(
+        'id', 'employee_id', 'department_id'
+    )
+    active_permissions = DocumentPermission.objects.filter(is_active=True).select_related(
+        'department'
+    ).prefetch_related(
+        Prefetch('department__employees', queryset=current_employees, to_attr='current_employees')
+    )
+    user_shares = DocumentShare.objects.filter(
+        is_active=True, shared_with_user__isnull=False
+    ).only('id', 'document_id', 'shared_with_user_id')
+    return Document.objects.select_related('category__department').prefetch_related(
+        Prefetch('permissions', queryset=active_permissions, to_attr='active_permissions'),
+        Prefetch('shares', queryset=user_shares, to_attr='user_shares')
+    )
+
+
+def document_acl_tokens(document) -> list:
+    """
+    Payload tokens for who may receive a document as AI context: "u:<user id>"
+    for its creator and for users with a view/edit/delete grant or an active
+    share, "d:<department id>" for its category's department.
+    
+    A superset of AIAssistantService._user_can_access_document: share expiry
+    and publication status are still checked after retrieval.
+    """
+    tokens = {f"u:{document.created_by_id}"}
+    if document.category.department_id:
+        tokens.add(f"d:{document.category.department_id}")
+    
+    permissions = getattr(document, 'active_permissions', None)
+    if permissions is None:
+        permissions = document.permissions.filter(is_active=True)
+    for permission in permissions:
+        if permission.user_id and permission.permission in ('view', 'edit', 'delete'):
+            tokens.add(f"u:{permission.user_id}")
+    
+    shares = getattr(document, 'user_shares', None)
+    if shares is None:
+        shares = document.shares.filter(is_active=True, shared_with_user__isnull=False)
+    for share in shares:
+        tokens.add(f"u:{share.shared_with_user_id}")
+    
+    return sorted(tokens)
+
+
+def document_index_metadata(document) -> dict:
+    """Qdrant payload describing a document, including who may see it"""
+    metadata = {
+        "document_id": str(document.id),
+        "category_id": str(document.category_id),
+        "category_name": document.category.name,
+        "status": document.status,
+        "priority": document.priority,
+        "file_type": document.file_type,
+        "created_by": str(document.created_by_id),
+        "owned_by": str(document.owned_by_id),
+        "created_at": document.created_at.isoformat(),
+    }
+    
+    # Add department information if available
+    department = document.category.department
+    if department:
+        metadata["department_id"] = str(department.id)
+        metadata["department_name"] = department.name
+    
+    # Get accessible users (for permission filtering)
+    accessible_users = []
+    
+    # Add document owner and creator
+    accessible_users.extend([str(document.owned_by_id), str(document.created_by_id)])
+    
+    # Add users with explicit permissions; prefetched by documents_for_indexing()
+    permissions = getattr(document, 'active_permissions', None)
+    if permissions is None:
+        permissions = document.permissions.filter(is_active=True).select_related('department')
+    
+    for permission in permissions:
+        if permission.user_id:
+            accessible_users.append(str(permission.user_id))
+        elif permission.department:
+            # Add all users in the department
+            employees = getattr(permission.department, 'current_employees', None)
+            if employees is None:
+                employees = permission.department.employees.filter(end_date__isnull=True)
+            accessible_users.extend([str(assignment.employee_id) for assignment in employees])
+    
+    metadata["accessible_by"] = list(set(accessible_users))
+    metadata["acl"] = document_acl_tokens(document)
+    return metadata
+
+
+@shared_task(
+    bind=True,
+    autoretry_for=(Exception,),
+    retry_backoff=60,
+    retry_backoff_max=900,
+    retry_jitter=True,
+    max_retries=3,
+    acks_late=True,
+    reject_on_worker_lost=True
+)
+def index_document_task(self, document_id: str, skip_unchanged: bool = False):
     """
     Celery task to index a document in the vector database
+    
+    With skip_unchanged, documents whose file content hash matches the last
+    indexed hash are not re-embedded. Failures are retried with jittered
+    exponential backoff; the message is only acknowledged once the task
+    finishes, so a worker crash hands the document to another worker.
     """
     try:
         # Get the document
-        document = Document.objects.get(id=document_id)
+        document = documents_for_indexing().get(id=document_id)
         
-        # Get file path
-        file_path = document.file.path
+        content_hash = file_content_hash(document)
+        if skip_unchanged and document.content_hash == content_hash:
+            logger.info(f"Document {document_id} unchanged since last index, skipping")
+            return {"status": "skipped", "document_id": document_id}
         
-        # Extract text content
-        content = vector_service.extract_text_from_file(file_path, document.file_type)
+        # Extract text content, streamed from whichever storage holds the file
+        content = vector_service.extract_document_text(document)
         
         if not content:
             logger.warning(f"No content extracted from document {document_id}")
             return {"status": "warning", "message": "No content extracted"}
         
-        # Prepare metadata
-        metadata = {
-            "document_id": str(document.id),
-            "category_id": str(document.category.id),
-            "category_name": document.category.name,
-            "status": document.status,
-            "priority": document.priority,
-            "file_type": document.file_type,
-            "created_by": str(document.created_by.id),
-            "owned_by": str(document.owned_by.id),
-            "created_at": document.created_at.isoformat(),
-        }
-        
-        # Add department information if available
-        if document.category.department:
-            metadata["department_id"] = str(document.category.department.id)
-            metadata["department_name"] = document.category.department.name
-        
-        # Get accessible users (for permission filtering)
-        accessible_users = []
-        
-        # Add document owner and creator
-        accessible_users.extend([str(document.owned_by.id), str(document.created_by.id)])
-        
-        # Add users with explicit permissions
-        for permission in document.permissions.filter(is_active=True):
-            if permission.user:
-                accessible_users.append(str(permission.user.id))
-            elif permission.department:
-                # Add all users in the department
-                dept_users = permission.department.employees.filter(
-                    end_date__isnull=True
-                ).values_list('employee__id', flat=True)
-                accessible_users.extend([str(uid) for uid in dept_users])
-        
-        metadata["accessible_by"] = list(set(accessible_users))
+        metadata = document_index_metadata(document)
         
         # Index the document
         success = vector_service.index_document(
@@ -72,6 +178,7 @@ def index_document_task(self, document_id: str):
         )
         
         if success:
+            Document.objects.filter(id=document.id).update(content_hash=content_hash)
             logger.info(f"Successfully indexed document {document_id}")
             return {"status": "success", "document_id": document_id}
         else:
@@ -82,14 +189,9 @@ def index_document_task(self, document_id: str):
         return {"status": "error", "message": "Document not found"}
     
     except Exception as e:
-        logger.error(f"Error indexing document {document_id}: {e}")
-        
-        # Retry the task
-        if self.request.retries < self.max_retries:
-            logger.info(f"Retrying indexing for document {document_id}")
-            raise self.retry(countdown=60 * (self.request.retries + 1))
-        
-        return {"status": "error", "message": str(e)}
+        # Re-raised for autoretry_for
+        logger.error(f"Error indexing document {document_id} (attempt {self.request.retries + 1}): {e}")
+        raise
 
 
 @shared_task(bind=True)
@@ -111,46 +213,113 @@ def delete_document_from_index(self, document_id: str):
         return {"status": "error", "message": str(e)}
 
 
+# Points per Qdrant upsert and documents per task during bulk indexing
+BULK_INDEX_POINTS = 512
+BULK_INDEX_DOCUMENTS = 50
+
+# Rows fetched per round trip and dispatch progress interval during a full reindex
+REINDEX_FETCH_SIZE = 1000
+REINDEX_LOG_EVERY = 10000
+
+
+@shared_task(bind=True)
+def bulk_index_documents_task(self, document_ids: list):
+    """
+    Index many documents, writing their points to Qdrant in large batches
+    
+    Used by reindex_all_documents; a document that fails is counted as an
+    error and does not stop the rest of the batch.
+    """
+    points = []
+    pending = {}  # document id -> (content hash, point ids) for documents whose points are buffered
+    indexed = {}
+    
+    def flush():
+        vector_service.upsert_points(points, wait=False)
+        points.clear()
+        for document_id, (content_hash, point_ids) in pending.items():
+            vector_service.delete_stale_points(str(document_id), point_ids, wait=False)
+            indexed[document_id] = content_hash
+        pending.clear()
+    
+    for document in documents_for_indexing().filter(id__in=document_ids).iterator(chunk_size=BULK_INDEX_DOCUMENTS):
+        try:
+            content_hash = file_content_hash(document)
+            content = vector_service.extract_document_text(document)
+            if not content:
+                logger.warning(f"No content extracted from document {document.id}")
+                continue
+            
+            document_points = vector_service.build_points(
+                document_id=str(document.id),
+                title=document.title,
+                content=content,
+                metadata=document_index_metadata(document)
+            )
+            points.extend(document_points)
+            pending[document.id] = (content_hash, [point.id for point in document_points])
+            
+            if len(points) >= BULK_INDEX_POINTS:
+                flush()
+        except Exception as e:
+            logger.error(f"Error indexing document {document.id}: {e}")
+    
+    try:
+        flush()
+    except Exception as e:
+        logger.error(f"Error writing points for {len(pending)} documents: {e}")
+    
+    for document_id, content_hash in indexed.items():
+        Document.objects.filter(id=document_id).update(content_hash=content_hash)
+    
+    error_count = len(document_ids) - len(indexed)
+    logger.info(f"Bulk index batch completed: {len(indexed)} success, {error_count} errors")
+    
+    # Anything not indexed (no content, failures, deleted documents) is an error
+    return {
+        "status": "success",
+        "success_count": len(indexed),
+        "error_count": error_count
+    }
+
+
 @shared_task(bind=True)
 def reindex_all_documents(self):
     """
     Celery task to reindex all published documents
+    
+    Document ids are streamed from the database and dispatched to
+    bulk_index_documents_task as each batch fills, so memory stays flat no
+    matter how many documents there are. Each batch logs its own totals.
     """
     try:
-        documents = Document.objects.filter(
+        document_ids = Document.objects.filter(
             status__in=['published', 'approved'],
             is_latest_version=True
-        )
+        ).values_list('id', flat=True)
         
-        total_documents = documents.count()
-        logger.info(f"Starting reindex of {total_documents} documents")
+        logger.info("Starting reindex of published documents")
         
-        success_count = 0
-        error_count = 0
+        batch = []
+        dispatched = 0
+        for document_id in document_ids.iterator(chunk_size=REINDEX_FETCH_SIZE):
+            batch.append(str(document_id))
+            if len(batch) < BULK_INDEX_DOCUMENTS:
+                continue
+            
+            bulk_index_documents_task.delay(batch)
+            dispatched += len(batch)
+            batch = []
+            if dispatched % REINDEX_LOG_EVERY == 0:
+                logger.info(f"Reindex dispatched {dispatched} documents")
         
-        for document in documents:
-            try:
-                result = index_document_task.apply_async(args=[str(document.id)])
-                # Wait for task to complete (for reporting)
-                task_result = result.get(timeout=300)  # 5 minutes timeout
-                
-                if task_result.get("status") == "success":
-                    success_count += 1
-                else:
-                    error_count += 1
-                    
-            except Exception as e:
-                logger.error(f"Error reindexing document {document.id}: {e}")
-                error_count += 1
+        if batch:
+            bulk_index_documents_task.delay(batch)
+            dispatched += len(batch)
         
-        logger.info(f"Reindex completed: {success_count} success, {error_count} errors")
+        logger.info(f"Reindex dispatched {dispatched} documents in total")
         
-        return {
-            "status": "completed",
-            "total_documents": total_documents,
-            "success_count": success_count,
-            "error_count": error_count
-        }
+        return {"status": "dispatched", "total_documents": dispatched}
     
     except Exception as e:
         logger.error(f"Error during bulk reindex: {e}")
@@ -160,13 +329,114 @@ def reindex_all_documents(self):
 @shared_task(bind=True)
 def update_document_permissions(self, document_id: str):
     """
-    Update the permissions for a document in the vector database
+    Refresh the access payload (accessible_by, acl) on a document's indexed
+    chunks after its grants or shares change, without re-embedding it
     """
     try:
-        # This would update the accessible_by field in the vector database
-        # For now, we'll re-index the document to update permissions
-        return index_document_task.apply_async(args=[document_id]).get()
+        document = documents_for_indexing().get(id=document_id)
+        metadata = document_index_metadata(document)
+        vector_service.set_document_payload(
+            str(document.id),
+            {"accessible_by": metadata["accessible_by"], "acl": metadata["acl"]}
+        )
+        return {"status": "success", "document_id": document_id}
+    
+    except Document.DoesNotExist:
+        return {"status": "error", "message": "Document not found"}
     
     except Exception as e:
         logger.error(f"Error updating permissions for document {document_id}: {e}")
-        return {"status": "error", "message": str(e)} 
\ No newline at end of file
+        return {"status": "error", "message": str(e)}
+
+
+@shared_task(bind=True)
+def flush_counters_task(self, batch_size: int = 500):
+    """
+    Write analytics counters buffered in Redis by utils.bump_counter to the database
+    
+    Each key is read and cleared atomically with GETDEL, then every
+    (model, field) pair is applied with one UPDATE ... CASE per batch. If an
+    UPDATE fails, the amounts not yet written are added back to their keys.
+    """
+    client = get_redis()
+    pending = defaultdict(dict)
+    flushed = 0
+    
+    for key in client.scan_iter(match='ctr:*', count=batch_size):
+        value = client.getdel(key)
+        if not value:
+            continue
+        _, model_name, pk, field = key.decode().split(':', 3)
+        pending[(model_name, field)][pk] = int(value)
+    
+    batches = []
+    for (model_name, field), increments in pending.items():
+        items = list(increments.items())
+        for start in range(0, len(items), batch_size):
+            batches.append((model_name, field, items[start:start + batch_size]))
+    
+    for index, (model_name, field, batch) in enumerate(batches):
+        model = apps.get_model('documents', model_name)
+        delta = Case(
+            *[When(pk=pk, then=Value(amount)) for pk, amount in batch],
+            default=Value(0),
+            output_field=IntegerField()
+        )
+        try:
+            model.objects.filter(pk__in=[pk for pk, _ in batch]).update(**{field: F(field) + delta})
+        except DatabaseError:
+            # The keys were already cleared by GETDEL, so add every unwritten
+            # amount back for the next run rather than losing it
+            logger.exception(f"Counter flush failed, requeueing {len(batches) - index} batches")
+            pipe = client.pipeline()
+            for requeue_model, requeue_field, requeue_batch in batches[index:]:
+                for pk, amount in requeue_batch:
+                    pipe.incrby(counter_key(requeue_model, pk, requeue_field), amount)
+            pipe.execute()
+            raise
+        flushed += len(batch)
+    
+    if flushed:
+        logger.info(f"Flushed {flushed} buffered counters")
+    return {"status": "success", "flushed": flushed}
+
+
+@shared_task(bind=True)
+def drain_activity_queue_task(self, batch_size: int = 500, max_batches: int = 100):
+    """
+    Bulk insert activities queued by DocumentActivity.log_async
+    
+    Runs on a short beat interval so events are written in multi-row INSERTs
+    rather than one per request; max_batches bounds a single run.
+    """
+    inserted = 0
+    for _ in range(max_batches):
+        drained = DocumentActivity.drain_queue(batch_size)
+        inserted += drained
+        if drained < batch_size:
+            break
+    
+    if inserted:
+        logger.info(f"Inserted {inserted} queued activities")
+    return {"status": "success", "inserted": inserted}
+
+
+@shared_task(bind=True)
+def ensure_activity_partitions(self, months_ahead: int = 24):
+    """
+    Keep monthly DocumentActivity partitions created months_ahead months out
+    
+    Delegates to documents_ensure_activity_partitions (migration 0014), which
+    also moves rows that already landed in the default partition for a month
+    into that month's new partition.
+    """
+    if connection.vendor != 'postgresql':
+        return {"status": "skipped"}
+    
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT documents_ensure_activity_partitions(%s)', [months_ahead])
+        created = cursor.fetchone()[0]
+    
+    if created:
+        logger.info(f"Created {created} activity partitions")
+    return {"status": "success", "created": created}
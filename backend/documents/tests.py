@@ -1,3 +1,625 @@
-from django.test import TestCase
+import importlib
+import json
+import secrets
+import uuid
+from datetime import datetime, timedelta
+from unittest import mock
+import redis
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from django.db.models import Prefetch
+from rest_framework import serializers
+from rest_framework.test import APIRequestFactory, force_authenticate
+from departments.models import Department, EmployeeDepartment, Permission
+from .models import (
+    ACTIVITY_QUEUE_KEY, Document, DocumentActivity, DocumentCategory, DocumentPermission, DocumentShare,
+    share_token_bytes, share_token_str
+)
 
-# Create your tests here.
+# documents.vector_service builds its VectorService singleton on import, which
+# connects to Qdrant and loads the embedding model. Import it, and tasks which
+# imports it, with both stubbed so the suite runs without either service.
+with mock.patch('qdrant_client.QdrantClient'), mock.patch('sentence_transformers.SentenceTransformer'):
+    from . import tasks, vector_service  # noqa: F401
+from . import utils
+from .prefetch import AutoPrefetchMixin, serializer_lookups
+
+User = get_user_model()
+
+
+class RedisMockMixin:
+    """Point every module that talks to Redis at one MagicMock client"""
+
+    def setUp(self):
+        super().setUp()
+        self.redis = mock.MagicMock()
+        for target in ('documents.models.get_redis', 'documents.utils.get_redis', 'documents.tasks.get_redis'):
+            patcher = mock.patch(target, return_value=self.redis)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+
+def make_document(**kwargs):
+    user = User.objects.create_user(
+        email='owner@example.com', password='x', username='owner',
+        first_name='Doc', last_name='Owner'
+    )
+    category = DocumentCategory.objects.create(name='General')
+    defaults = {
+        'title': 'Handbook',
+        'file': 'documents/handbook.pdf',
+        'file_size': 1024,
+        'file_type': 'PDF',
+        'category': category,
+        'created_by': user,
+        'owned_by': user,
+    }
+    defaults.update(kwargs)
+    return Document.objects.create(**defaults)
+
+
+class SmallIntChoiceFieldTests(SimpleTestCase):
+    def setUp(self):
+        # PERMISSION_CHOICES: view, download, edit, delete, share
+        self.field = DocumentPermission._meta.get_field('permission')
+
+    def test_get_prep_value_maps_choice_to_its_position(self):
+        self.assertEqual(self.field.get_prep_value('view'), 0)
+        self.assertEqual(self.field.get_prep_value('share'), 4)
+
+    def test_get_prep_value_passes_through_none_and_codes(self):
+        self.assertIsNone(self.field.get_prep_value(None))
+        self.assertEqual(self.field.get_prep_value(2), 2)
+
+    def test_get_prep_value_maps_unknown_choice_to_none(self):
+        self.assertIsNone(self.field.get_prep_value('publish'))
+
+    def test_to_python_maps_codes_back_to_choices(self):
+        self.assertEqual(self.field.to_python(1), 'download')
+        self.assertEqual(self.field.to_python('edit'), 'edit')
+        self.assertIs(self.field.to_python(True), True)
+
+    def test_from_db_value(self):
+        self.assertEqual(self.field.from_db_value(3, None, connection), 'delete')
+        self.assertIsNone(self.field.from_db_value(None, None, connection))
+        # A code with no choice is left as is rather than raising
+        self.assertEqual(self.field.from_db_value(99, None, connection), 99)
+
+
+class SmallIntChoiceFieldDatabaseTests(RedisMockMixin, TestCase):
+    def test_round_trip_stores_code_and_loads_choice(self):
+        document = make_document(status='published')
+
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT status FROM documents_document WHERE id = %s', [document.pk])
+            self.assertEqual(cursor.fetchone()[0], 3)
+
+        self.assertEqual(Document.objects.get(pk=document.pk).status, 'published')
+        self.assertTrue(Document.objects.filter(status='published').exists())
+        self.assertFalse(Document.objects.filter(status='draft').exists())
+
+
+class DrainActivityQueueTests(RedisMockMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.document = make_document()
+        self.user = self.document.created_by
+
+    def queue(self, *actions, created_at=None):
+        created_at = created_at or timezone.now()
+        batch = [
+            json.dumps({
+                'document_id': str(self.document.pk),
+                'user_id': str(self.user.pk),
+                'action': action,
+                'description': f'{action} event',
+                'created_at': created_at.isoformat(),
+            }).encode()
+            for action in actions
+        ]
+        self.redis.pipeline.return_value.execute.return_value = [batch, True]
+        return batch
+
+    def test_queued_activities_are_inserted(self):
+        self.queue('viewed', 'downloaded')
+
+        self.assertEqual(DocumentActivity.drain_queue(batch_size=10), 2)
+        self.assertEqual(
+            sorted(DocumentActivity.objects.filter(document=self.document).values_list('action', flat=True)),
+            ['downloaded', 'viewed']
+        )
+        pipe = self.redis.pipeline.return_value
+        pipe.lrange.assert_called_once_with(ACTIVITY_QUEUE_KEY, 0, 9)
+        pipe.ltrim.assert_called_once_with(ACTIVITY_QUEUE_KEY, 10, -1)
+
+    def test_drained_rows_keep_their_event_time(self):
+        event_time = timezone.now() - timedelta(hours=3)
+        self.queue('viewed', created_at=event_time)
+
+        DocumentActivity.drain_queue()
+
+        self.assertEqual(DocumentActivity.objects.get(document=self.document).created_at, event_time)
+
+    def test_empty_queue(self):
+        self.queue()
+        self.assertEqual(DocumentActivity.drain_queue(), 0)
+        self.assertFalse(DocumentActivity.objects.exists())
+
+    def test_batch_is_requeued_in_order_on_database_error(self):
+        batch = self.queue('viewed', 'downloaded')
+
+        with mock.patch.object(DocumentActivity.objects, 'bulk_create', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                DocumentActivity.drain_queue()
+
+        self.redis.lpush.assert_called_once_with(ACTIVITY_QUEUE_KEY, *reversed(batch))
+
+    def test_log_async_pushes_one_timestamped_entry(self):
+        before = timezone.now()
+        DocumentActivity.log_async(self.document.pk, self.user.pk, 'viewed', ip_address='10.0.0.1')
+
+        key, payload = self.redis.rpush.call_args.args
+        payload = json.loads(payload)
+        created_at = payload.pop('created_at')
+        self.assertEqual(key, ACTIVITY_QUEUE_KEY)
+        self.assertEqual(payload, {
+            'document_id': str(self.document.pk),
+            'user_id': str(self.user.pk),
+            'action': 'viewed',
+            'ip_address': '10.0.0.1',
+        })
+        self.assertGreaterEqual(datetime.fromisoformat(created_at), before)
+
+    def test_synchronous_fallback_keeps_event_time(self):
+        self.redis.rpush.side_effect = redis.RedisError
+
+        DocumentActivity.log_async(self.document.pk, self.user.pk, 'viewed')
+
+        activity = DocumentActivity.objects.get(document=self.document)
+        self.assertEqual(activity.action, 'viewed')
+        self.assertIsNotNone(activity.created_at)
+
+
+class ChunkTextTests(SimpleTestCase):
+    def chunk(self, text, chunk_size=None, chunk_overlap=None):
+        return vector_service.chunk_text(text, chunk_size, chunk_overlap)
+
+    def test_short_text_is_one_chunk(self):
+        self.assertEqual(self.chunk('One. Two. Three.', 100, 10), ['One. Two. Three.'])
+
+    def test_blank_text_has_no_chunks(self):
+        self.assertEqual(self.chunk('   ', 10, 0), [])
+
+    def test_chunks_break_on_sentence_boundaries(self):
+        self.assertEqual(self.chunk('Aaaa. Bbbb. Cccc. Dddd.', 11, 0), ['Aaaa. Bbbb.', 'Cccc. Dddd.'])
+
+    def test_trailing_sentences_are_carried_as_overlap(self):
+        self.assertEqual(
+            self.chunk('Aaaa. Bbbb. Cccc. Dddd.', 11, 6),
+            ['Aaaa. Bbbb.', 'Bbbb. Cccc.', 'Cccc. Dddd.']
+        )
+        self.assertEqual(
+            self.chunk('Aaaa. Bbbb. Cccc. Dddd.', 17, 6),
+            ['Aaaa. Bbbb. Cccc.', 'Cccc. Dddd.']
+        )
+
+    def test_overlap_never_pushes_a_chunk_past_chunk_size(self):
+        text = 'Aa. ' + 'B' * 20 + '. ' + 'C' * 60 + '. D.'
+
+        chunks = self.chunk(text, 64, 30)
+
+        self.assertEqual(chunks, ['Aa. ' + 'B' * 20 + '.', 'C' * 60 + '. D.'])
+        self.assertTrue(all(len(chunk) <= 64 for chunk in chunks))
+
+    def test_oversized_sentence_is_its_own_chunk(self):
+        self.assertEqual(
+            self.chunk('Short. ' + 'x' * 30 + '. End.', 10, 0),
+            ['Short.', 'x' * 30 + '.', 'End.']
+        )
+
+    @override_settings(CHUNK_SIZE=11, CHUNK_OVERLAP=0)
+    def test_defaults_come_from_settings(self):
+        self.assertEqual(self.chunk('Aaaa. Bbbb. Cccc. Dddd.'), ['Aaaa. Bbbb.', 'Cccc. Dddd.'])
+
+
+class FlushCountersTaskTests(RedisMockMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.document = make_document(view_count=5)
+        self.counters = {
+            f'ctr:document:{self.document.pk}:view_count'.encode(): b'3',
+            f'ctr:document:{self.document.pk}:download_count'.encode(): b'2',
+        }
+        self.redis.scan_iter.return_value = list(self.counters)
+        self.redis.getdel.side_effect = self.counters.get
+
+    def test_counters_are_added_to_the_rows(self):
+        result = tasks.flush_counters_task()
+
+        self.assertEqual(result, {'status': 'success', 'flushed': 2})
+        self.document.refresh_from_db()
+        self.assertEqual(self.document.view_count, 8)
+        self.assertEqual(self.document.download_count, 2)
+        self.redis.scan_iter.assert_called_once_with(match='ctr:*', count=500)
+
+    def test_unwritten_counters_are_requeued_on_database_error(self):
+        with mock.patch('django.db.models.query.QuerySet.update', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                tasks.flush_counters_task()
+
+        pipe = self.redis.pipeline.return_value
+        pipe.incrby.assert_has_calls([
+            mock.call(f'ctr:document:{self.document.pk}:view_count', 3),
+            mock.call(f'ctr:document:{self.document.pk}:download_count', 2),
+        ], any_order=True)
+        pipe.execute.assert_called_once_with()
+        self.document.refresh_from_db()
+        self.assertEqual(self.document.view_count, 5)
+
+
+class DocumentAclTokensTests(RedisMockMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.department = Department.objects.create(name='Finance', code='FIN')
+        self.document = make_document()
+        self.document.category.department = self.department
+        self.document.category.save()
+        self.owner = self.document.created_by
+        self.reader = User.objects.create_user(email='reader@example.com', password='x', username='reader')
+        self.downloader = User.objects.create_user(email='dl@example.com', password='x', username='dl')
+        self.colleague = User.objects.create_user(email='colleague@example.com', password='x', username='colleague')
+
+    def grant(self, user, permission, **kwargs):
+        return DocumentPermission.objects.create(
+            document=self.document, user=user, permission=permission, granted_by=self.owner, **kwargs
+        )
+
+    def expected(self, *users):
+        return sorted({f'u:{user.pk}' for user in (self.owner, *users)} | {f'd:{self.department.pk}'})
+
+    def test_creator_department_grants_and_shares(self):
+        self.grant(self.reader, 'view')
+        self.grant(self.downloader, 'download')
+        self.grant(self.colleague, 'edit', is_active=False)
+        DocumentShare.objects.create(
+            document=self.document, share_type='user', shared_with_user=self.colleague, shared_by=self.owner
+        )
+
+        self.assertEqual(tasks.document_acl_tokens(self.document), self.expected(self.reader, self.colleague))
+
+    def test_prefetched_documents_give_the_same_tokens(self):
+        self.grant(self.reader, 'view')
+        DocumentShare.objects.create(
+            document=self.document, share_type='user', shared_with_user=self.colleague, shared_by=self.owner
+        )
+
+        document = tasks.documents_for_indexing().get(pk=self.document.pk)
+        with self.assertNumQueries(0):
+            tokens = tasks.document_acl_tokens(document)
+
+        self.assertEqual(tokens, self.expected(self.reader, self.colleague))
+
+
+class InitVectorDbAclBackfillTests(RedisMockMixin, TestCase):
+    def test_indexed_documents_get_their_access_payload(self):
+        document = make_document(status='published')
+        # Drafts aren't indexed, so they have no chunks to update
+        Document.objects.create(
+            title='Draft', file='documents/draft.pdf', file_size=1, file_type='PDF',
+            category=document.category, created_by=document.created_by, owned_by=document.owned_by
+        )
+
+        with mock.patch('documents.management.commands.init_vector_db.vector_service') as service:
+            call_command('init_vector_db', stdout=mock.MagicMock())
+
+        service.set_document_payload.assert_called_once()
+        document_id, payload = service.set_document_payload.call_args.args
+        self.assertEqual(document_id, str(document.pk))
+        self.assertEqual(set(payload), {'accessible_by', 'acl'})
+        self.assertIn(f'u:{document.created_by_id}', payload['acl'])
+        service.index_document.assert_not_called()
+
+
+class DocumentCategoryPathTests(RedisMockMixin, TestCase):
+    def test_deep_hierarchy_path_is_stored_in_full(self):
+        category = None
+        for depth in range(12):
+            category = DocumentCategory.objects.create(name=f'{depth:02d}' + 'x' * 60, parent_category=category)
+
+        category.refresh_from_db()
+        self.assertGreater(len(category.path), 512)
+        self.assertEqual(category.path.count(' > '), 11)
+
+
+class PermissionCacheTests(RedisMockMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_user(email='admin@example.com', password='x', username='admin', role='admin')
+        self.user = User.objects.create_user(email='user@example.com', password='x', username='user')
+        self.colleague = User.objects.create_user(email='colleague@example.com', password='x', username='colleague')
+        self.department = Department.objects.create(name='Finance', code='FIN')
+        for employee in (self.user, self.colleague):
+            EmployeeDepartment.objects.create(
+                employee=employee, department=self.department, start_date=timezone.now().date()
+            )
+        self.redis.reset_mock()
+        # Department ids are cached in Redis too; make every lookup a miss
+        self.redis.get.return_value = None
+
+    def grant(self, entity_type, entity_id):
+        return Permission.objects.create(
+            entity_type=entity_type, entity_id=entity_id, permission='documents.view_all',
+            permission_category='documents', granted_by=self.admin
+        )
+
+    def test_user_grant_drops_that_users_hash(self):
+        self.grant('user', self.user.pk)
+
+        self.redis.delete.assert_called_once_with(f'perm:{self.user.pk}')
+
+    def test_department_grant_drops_every_member_hash_in_one_delete(self):
+        self.grant('department', self.department.pk)
+
+        self.redis.delete.assert_called_once()
+        self.assertCountEqual(
+            self.redis.delete.call_args.args,
+            [f'perm:{self.user.pk}', f'perm:{self.colleague.pk}']
+        )
+
+    def test_cached_decision_skips_the_database(self):
+        self.redis.hget.return_value = b'1'
+
+        with self.assertNumQueries(0):
+            self.assertTrue(utils.user_has_permission(self.user, 'documents.view_all'))
+
+        self.redis.hget.assert_called_once_with(f'perm:{self.user.pk}', 'documents.view_all')
+
+    def test_miss_is_written_to_the_users_hash(self):
+        self.redis.hget.return_value = None
+        self.grant('department', self.department.pk)
+
+        self.assertTrue(utils.user_has_permission(self.user, 'documents.view_all'))
+
+        pipe = self.redis.pipeline.return_value
+        pipe.hset.assert_called_once_with(f'perm:{self.user.pk}', 'documents.view_all', '1')
+        pipe.expire.assert_called_once_with(f'perm:{self.user.pk}', 60)
+
+    def test_redis_error_falls_back_to_the_database(self):
+        self.redis.hget.side_effect = redis.RedisError
+
+        self.assertFalse(utils.user_has_permission(self.user, 'documents.view_all'))
+
+
+class DocumentPermissionCacheTests(RedisMockMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.document = make_document()
+        self.owner = self.document.created_by
+        self.reader = User.objects.create_user(email='reader@example.com', password='x', username='reader')
+        self.redis.reset_mock()
+
+    def test_grant_change_drops_every_grantee_set_by_key(self):
+        DocumentPermission.objects.create(
+            document=self.document, user=self.reader, permission='view', granted_by=self.owner
+        )
+
+        self.redis.delete.assert_called_once_with(*(
+            f'dperm:{self.document.pk}:{permission}'
+            for permission in ('view', 'download', 'edit', 'delete', 'share')
+        ))
+        self.redis.scan_iter.assert_not_called()
+
+    def test_cold_set_is_warmed_with_live_grants_only(self):
+        DocumentPermission.objects.create(
+            document=self.document, user=self.reader, permission='view', granted_by=self.owner,
+            expires_at=timezone.now() + timedelta(minutes=10)
+        )
+        DocumentPermission.objects.create(
+            document=self.document, user=self.owner, permission='view', granted_by=self.owner,
+            expires_at=timezone.now() - timedelta(minutes=1)
+        )
+        self.redis.exists.return_value = 0
+        self.redis.smismember.return_value = [1]
+
+        self.assertTrue(utils.document_permission_granted(self.document.pk, 'view', self.reader.pk))
+
+        key = f'dperm:{self.document.pk}:view'
+        pipe = self.redis.pipeline.return_value
+        pipe.sadd.assert_called_once_with(key, '_', f'u:{self.reader.pk}')
+        # The set lives no longer than its earliest expiring grant
+        ttl = pipe.expire.call_args.args[1]
+        self.assertLessEqual(ttl, 600)
+        self.assertGreater(ttl, 500)
+        self.redis.smismember.assert_called_once_with(key, [f'u:{self.reader.pk}'])
+
+    def test_redis_error_falls_back_to_live_grants(self):
+        DocumentPermission.objects.create(
+            document=self.document, user=self.reader, permission='view', granted_by=self.owner,
+            is_active=False
+        )
+        self.redis.exists.side_effect = redis.RedisError
+
+        self.assertFalse(utils.document_permission_granted(self.document.pk, 'view', self.reader.pk))
+
+
+class PublicLinkTokenTests(RedisMockMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.document = make_document()
+
+    def share(self, **kwargs):
+        return DocumentShare.objects.create(
+            document=self.document, share_type='public_link', shared_by=self.document.created_by, **kwargs
+        )
+
+    def test_token_round_trips_through_its_url_form(self):
+        raw = secrets.token_bytes(32)
+        token = share_token_str(raw)
+
+        self.assertEqual(len(token), 43)
+        self.assertNotIn('=', token)
+        self.assertEqual(share_token_bytes(token), raw)
+
+    def test_malformed_tokens_decode_to_none(self):
+        self.assertIsNone(share_token_bytes('not a token!'))
+        self.assertIsNone(share_token_bytes(share_token_str(b'short')))
+
+    def test_public_link_gets_a_32_byte_token(self):
+        share = self.share()
+
+        share.refresh_from_db()
+        self.assertEqual(len(bytes(share.public_link_token_bin)), 32)
+        self.assertEqual(share_token_bytes(share.public_link_token), bytes(share.public_link_token_bin))
+
+    def test_token_setter_stores_the_raw_bytes(self):
+        raw = secrets.token_bytes(32)
+        share = self.share(public_link_token=share_token_str(raw))
+
+        self.assertEqual(bytes(DocumentShare.objects.get(pk=share.pk).public_link_token_bin), raw)
+
+    def test_shared_access_looks_up_by_token_bytes(self):
+        from .views import DocumentSharedAccessView
+
+        share = self.share()
+        view = DocumentSharedAccessView()
+
+        self.assertEqual(view._get_share(share.public_link_token).pk, share.pk)
+        with self.assertNumQueries(0), self.assertRaises(DocumentShare.DoesNotExist):
+            view._get_share('not a token!')
+        share.is_active = False
+        share.save()
+        with self.assertRaises(DocumentShare.DoesNotExist):
+            view._get_share(share.public_link_token)
+
+
+class PublicLinkTokenMigrationTests(SimpleTestCase):
+    migration = importlib.import_module('documents.migrations.0009_documentshare_public_link_token_bin')
+
+    def run_copy(self, copy, share):
+        apps = mock.Mock()
+        apps.get_model.return_value.objects.filter.return_value.only.return_value.iterator.return_value = [share]
+        copy(apps, None)
+
+    def test_text_tokens_are_decoded_in_place(self):
+        raw = secrets.token_bytes(32)
+        share = mock.Mock(public_link_token=share_token_str(raw))
+
+        self.run_copy(self.migration.copy_tokens_to_bytes, share)
+
+        self.assertEqual(share.public_link_token_bin, raw)
+        share.save.assert_called_once_with(update_fields=['public_link_token_bin'])
+
+    def test_reverse_restores_the_text_token(self):
+        raw = secrets.token_bytes(32)
+        share = mock.Mock(public_link_token_bin=memoryview(raw))
+
+        self.run_copy(self.migration.copy_tokens_to_text, share)
+
+        self.assertEqual(share.public_link_token, share_token_str(raw))
+        share.save.assert_called_once_with(update_fields=['public_link_token'])
+
+
+class DocumentVersionsTests(RedisMockMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.document = make_document(title='Handbook v1')
+        self.owner = self.document.created_by
+
+    def get(self, pk):
+        from .views import document_versions
+
+        request = APIRequestFactory().get(f'/api/v1/documents/{pk}/versions/')
+        force_authenticate(request, user=self.owner)
+        return document_versions(request, pk=pk)
+
+    def make_version(self, title, previous_version):
+        return Document.objects.create(
+            title=title, file='documents/handbook.pdf', file_size=2 * 1024 * 1024, file_type='PDF',
+            category=self.document.category, created_by=self.owner, owned_by=self.owner,
+            previous_version=previous_version
+        )
+
+    def test_document_and_its_direct_successors_newest_first(self):
+        v2 = self.make_version('Handbook v2', self.document)
+        v3 = self.make_version('Handbook v3', v2)
+
+        with self.assertNumQueries(1):
+            response = self.get(self.document.pk)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['id'] for row in response.data], [str(v2.pk), str(self.document.pk)])
+        self.assertNotIn(str(v3.pk), [row['id'] for row in response.data])
+        self.assertEqual(response.data[0]['category_name'], 'General')
+        self.assertEqual(response.data[0]['created_by_name'], 'Doc Owner')
+        self.assertEqual(response.data[0]['file_size_mb'], 2.0)
+        self.assertEqual(response.data[0]['status'], 'draft')
+
+    def test_unknown_document_is_404(self):
+        self.assertEqual(self.get(uuid.uuid4()).status_code, 404)
+
+
+class GrantSerializer(serializers.ModelSerializer):
+    user_email = serializers.CharField(source='user.email')
+
+    class Meta:
+        model = DocumentPermission
+        fields = ['id', 'permission', 'user_email', 'granted_by']
+
+
+class InferredDocumentSerializer(serializers.ModelSerializer):
+    category_name = serializers.CharField(source='category.name')
+    department_name = serializers.CharField(source='category.department.name')
+    owner_name = serializers.CharField(source='owned_by.get_full_name')
+    permissions = GrantSerializer(many=True)
+    size = serializers.FloatField(source='file_size_mb')
+    share_count = serializers.SerializerMethodField()
+
+    prefetch_hints = ('shares',)
+
+    class Meta:
+        model = Document
+        fields = [
+            'id', 'title', 'category_name', 'department_name', 'owner_name', 'created_by',
+            'permissions', 'size', 'share_count'
+        ]
+
+    def get_share_count(self, obj):
+        return len(obj.shares.all())
+
+
+class AutoPrefetchTests(SimpleTestCase):
+    def test_lookups_follow_serializer_sources(self):
+        select, prefetch = serializer_lookups(InferredDocumentSerializer)
+
+        # created_by is a primary key field and reads the FK column without a join
+        self.assertEqual(select, ['category', 'category__department', 'owned_by'])
+        # shares comes from prefetch_hints; the method field itself is opaque
+        self.assertEqual(prefetch, ['permissions', 'permissions__user', 'shares'])
+
+    def test_explicit_prefetch_querysets_win(self):
+        class Base:
+            def get_queryset(self):
+                return Document.objects.prefetch_related(
+                    Prefetch('permissions', queryset=DocumentPermission.objects.live())
+                )
+
+            def get_serializer_class(self):
+                return InferredDocumentSerializer
+
+        class View(AutoPrefetchMixin, Base):
+            pass
+
+        queryset = View().get_queryset()
+
+        lookups = [
+            lookup.prefetch_to if isinstance(lookup, Prefetch) else lookup
+            for lookup in queryset._prefetch_related_lookups
+        ]
+        self.assertEqual(lookups, ['permissions', 'shares'])
+        self.assertEqual(
+            queryset.query.select_related,
+            {'category': {'department': {}}, 'owned_by': {}}
+        )
@@ -1,12 +1,306 @@
 """
 Document utility functions including permission checking
 """
+import functools
+import json
+import logging
+import uuid
 from typing import List, Optional
+import redis
+from django.apps import apps
 from django.contrib.auth import get_user_model
+from django.db.models import Exists, F, Q
+from django.utils import timezone
 from departments.models import Permission
+from portal_backend.redis_client import get_redis, delete_pattern
 
 User = get_user_model()
+logger = logging.getLogger(__name__)
 
+# Seconds a user's hash of resolved permission decisions stays cached in Redis
+PERMISSION_CACHE_TTL = 60
+
+# Seconds a resolved (user, department) membership stays cached in Redis
+DEPARTMENT_MEMBERSHIP_CACHE_TTL = 120
+
+# Seconds a document's denormalized permission grantee sets live in Redis
+DOCUMENT_PERMISSION_CACHE_TTL = 24 * 60 * 60
+
+# Seconds the document_stats payload stays cached in Redis
+DOCUMENT_STATS_CACHE_KEY = 'docstats'
+DOCUMENT_STATS_CACHE_TTL = 30
+
+
+def permission_cache_key(user_id) -> str:
+    """Hash of a user's cached decisions, permission_key -> '1' or '0'"""
+    return f'perm:{user_id}'
+
+
+def invalidate_user_permissions(*user_ids) -> None:
+    """Drop every cached permission decision for the given users with one DEL"""
+    if not user_ids:
+        return
+    try:
+        get_redis().delete(*(permission_cache_key(user_id) for user_id in user_ids))
+    except redis.RedisError as e:
+        logger.warning(f"Could not invalidate cached permissions for {len(user_ids)} users: {e}")
+
+
+def department_membership_cache_key(user_id, department_id) -> str:
+    return f'deptmem:{user_id}:{department_id}'
+
+
+def user_departments_cache_key(user_id) -> str:
+    return f'deptids:{user_id}'
+
+
+def invalidate_department_membership(user_id) -> None:
+    """Drop every cached department membership for a user"""
+    try:
+        delete_pattern(department_membership_cache_key(user_id, '*'))
+        get_redis().delete(user_departments_cache_key(user_id))
+    except redis.RedisError as e:
+        logger.warning(f"Could not invalidate cached memberships for user {user_id}: {e}")
+
+
+def user_in_department(user: User, department_id) -> bool:
+    """
+    Check whether a user currently belongs to a department, cached in Redis
+    for DEPARTMENT_MEMBERSHIP_CACHE_TTL seconds.
+    """
+    key = department_membership_cache_key(user.id, department_id)
+    try:
+        cached = get_redis().get(key)
+    except redis.RedisError as e:
+        logger.warning(f"Membership cache unavailable: {e}")
+        cached = None
+    
+    if cached is not None:
+        return cached == b'1'
+    
+    result = user.department_assignments.filter(
+        department_id=department_id,
+        end_date__isnull=True
+    ).only('pk')[:1].exists()
+    try:
+        get_redis().set(key, '1' if result else '0', ex=DEPARTMENT_MEMBERSHIP_CACHE_TTL)
+    except redis.RedisError as e:
+        logger.warning(f"Membership cache unavailable: {e}")
+    return result
+
+
+def get_user_department_ids(user: User) -> tuple:
+    """
+    Ids of the user's active departments, memoized on the user instance for
+    the rest of the request and cached in Redis for
+    DEPARTMENT_MEMBERSHIP_CACHE_TTL seconds.
+    """
+    cached = user.__dict__.get('_department_ids')
+    if cached is not None:
+        return cached
+    
+    key = user_departments_cache_key(user.id)
+    try:
+        raw = get_redis().get(key)
+    except redis.RedisError as e:
+        logger.warning(f"Membership cache unavailable: {e}")
+        raw = None
+    
+    if raw is not None:
+        department_ids = tuple(uuid.UUID(department_id) for department_id in json.loads(raw))
+    else:
+        department_ids = tuple(
+            user.department_assignments.filter(
+                end_date__isnull=True
+            ).values_list('department_id', flat=True)
+        )
+        try:
+            get_redis().set(
+                key,
+                json.dumps([str(department_id) for department_id in department_ids]),
+                ex=DEPARTMENT_MEMBERSHIP_CACHE_TTL
+            )
+        except redis.RedisError as e:
+            logger.warning(f"Membership cache unavailable: {e}")
+    
+    user._department_ids = department_ids
+    return department_ids
+
+
+def cached_document_stats(compute) -> dict:
+    """
+    Return the site-wide document stats from Redis, calling compute() and
+    caching its result for DOCUMENT_STATS_CACHE_TTL seconds on a miss
+    """
+    try:
+        cached = get_redis().get(DOCUMENT_STATS_CACHE_KEY)
+    except redis.RedisError as e:
+        logger.warning(f"Stats cache unavailable: {e}")
+        cached = None
+    
+    if cached is not None:
+        return json.loads(cached)
+    
+    stats = compute()
+    try:
+        get_redis().set(DOCUMENT_STATS_CACHE_KEY, json.dumps(stats), ex=DOCUMENT_STATS_CACHE_TTL)
+    except redis.RedisError as e:
+        logger.warning(f"Stats cache unavailable: {e}")
+    return stats
+
+
+def invalidate_document_stats() -> None:
+    try:
+        get_redis().delete(DOCUMENT_STATS_CACHE_KEY)
+    except redis.RedisError as e:
+        logger.warning(f"Could not invalidate cached document stats: {e}")
+
+
+def counter_key(model_name: str, pk, field: str) -> str:
+    return f'ctr:{model_name}:{pk}:{field}'
+
+
+def bump_counter(model_name: str, pk, field: str, amount: int = 1) -> None:
+    """
+    Increment an analytics counter (e.g. Document.view_count) in Redis.
+    
+    Pending increments are written to the database in batches by
+    flush_counters_task. If Redis is unavailable the row is updated directly.
+    """
+    try:
+        get_redis().incrby(counter_key(model_name, pk, field), amount)
+    except redis.RedisError as e:
+        logger.warning(f"Counter buffer unavailable, updating {model_name} {pk} directly: {e}")
+        model = apps.get_model('documents', model_name)
+        model.objects.filter(pk=pk).update(**{field: F(field) + amount})
+
+
+def pending_counter(model_name: str, pk, field: str) -> int:
+    """Increments buffered in Redis that have not been flushed to the database yet"""
+    try:
+        value = get_redis().get(counter_key(model_name, pk, field))
+    except redis.RedisError:
+        return 0
+    return int(value) if value else 0
+
+
+def document_permission_key(document_id, permission: str) -> str:
+    return f'dperm:{document_id}:{permission}'
+
+
+def invalidate_document_permissions(document_id) -> None:
+    """Drop every cached grantee set for a document"""
+    # The permission names are a fixed set, so the keys are known without a SCAN
+    DocumentPermission = apps.get_model('documents', 'DocumentPermission')
+    try:
+        get_redis().delete(*(
+            document_permission_key(document_id, permission)
+            for permission, _ in DocumentPermission.PERMISSION_CHOICES
+        ))
+    except redis.RedisError as e:
+        logger.warning(f"Could not invalidate cached grants for document {document_id}: {e}")
+
+
+def _warm_document_permission_set(client, key, document_id, permission: str) -> None:
+    """
+    Load the live grantees of (document, permission) into a Redis set.
+    
+    Members are 'u:<user id>' and 'd:<department id>'; the '_' sentinel keeps
+    a document without grants cached as an existing (non-empty) set. The set
+    expires no later than the earliest grant in it, so expiry needs no signal.
+    """
+    DocumentPermission = apps.get_model('documents', 'DocumentPermission')
+    grants = DocumentPermission.objects.live().filter(
+        document_id=document_id,
+        permission=permission
+    ).values_list('user_id', 'department_id', 'expires_at')
+    members = []
+    ttl = DOCUMENT_PERMISSION_CACHE_TTL
+    now = timezone.now()
+    for user_id, department_id, expires_at in grants:
+        members.append(f'u:{user_id}' if user_id else f'd:{department_id}')
+        if expires_at:
+            ttl = min(ttl, max(1, int((expires_at - now).total_seconds())))
+    
+    pipe = client.pipeline()
+    pipe.delete(key)
+    pipe.sadd(key, '_', *members)
+    pipe.expire(key, ttl)
+    pipe.execute()
+
+
+def document_permission_granted(document_id, permission: str, user_id, department_ids=()) -> bool:
+    """
+    Whether a live (active, unexpired) DocumentPermission grants `permission` on a document to the
+    user directly or to one of `department_ids`, answered with one SMISMEMBER.
+    
+    Grantee sets are warmed on first use and dropped by the DocumentPermission
+    signal handlers; Redis errors fall back to the database.
+    """
+    members = [f'u:{user_id}', *(f'd:{department_id}' for department_id in department_ids)]
+    key = document_permission_key(document_id, permission)
+    try:
+        client = get_redis()
+        if not client.exists(key):
+            _warm_document_permission_set(client, key, document_id, permission)
+        return any(client.smismember(key, members))
+    except redis.RedisError as e:
+        logger.warning(f"Document permission cache unavailable: {e}")
+    
+    DocumentPermission = apps.get_model('documents', 'DocumentPermission')
+    return DocumentPermission.objects.live().filter(
+        Q(user_id=user_id) | Q(department_id__in=list(department_ids)),
+        document_id=document_id,
+        permission=permission
+    ).exists()
+
+
+def redis_cached_permission(func):
+    """
+    Cache a (user, permission_key) -> bool check in Redis for PERMISSION_CACHE_TTL seconds.
+    
+    Anonymous and admin users are answered without touching Redis, and Redis
+    errors fall back to the wrapped database check. Answers are also memoized
+    on the user instance, so repeat checks within a request skip Redis.
+    """
+    @functools.wraps(func)
+    def wrapper(user, permission_key):
+        if not user or not user.is_authenticated or user.role == 'admin':
+            return func(user, permission_key)
+        
+        # request.user lives for one request, so decisions memoized on it are request-scoped
+        memo = user.__dict__.setdefault('_permission_checks', {})
+        if permission_key not in memo:
+            memo[permission_key] = _redis_permission_check(func, user, permission_key)
+        return memo[permission_key]
+    
+    return wrapper
+
+
+def _redis_permission_check(func, user, permission_key) -> bool:
+    key = permission_cache_key(user.id)
+    try:
+        cached = get_redis().hget(key, permission_key)
+    except redis.RedisError as e:
+        logger.warning(f"Permission cache unavailable: {e}")
+        return func(user, permission_key)
+    
+    if cached is not None:
+        return cached == b'1'
+    
+    result = func(user, permission_key)
+    try:
+        # The TTL covers the whole hash; signal handlers drop it on every change
+        pipe = get_redis().pipeline()
+        pipe.hset(key, permission_key, '1' if result else '0')
+        pipe.expire(key, PERMISSION_CACHE_TTL)
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"Permission cache unavailable: {e}")
+    return result
+
+
+@redis_cached_permission
 def user_has_permission(user: User, permission_key: str) -> bool:
     """
     Check if a user has a specific permission either directly or through department
@@ -25,31 +319,13 @@ def user_has_permission(user: User, permission_key: str) -> bool:
     if user.role == 'admin':
         return True
     
-    # Check direct user permissions
-    user_permission = Permission.objects.filter(
-        entity_type='user',
-        entity_id=user.id,
-        permission=permission_key,
-        is_active=True
-    ).exists()
-    
-    if user_permission:
-        return True
-    
-    # Check department permissions
-    # Get user's active departments
-    user_departments = user.department_assignments.filter(
-        end_date__isnull=True
-    ).values_list('department_id', flat=True)
-    
-    department_permission = Permission.objects.filter(
-        entity_type='department',
-        entity_id__in=user_departments,
+    # Direct user permissions and those of the user's active departments, in one query
+    return Permission.objects.filter(
+        Q(entity_type='user', entity_id=user.id) |
+        Q(entity_type='department', entity_id__in=get_user_department_ids(user)),
         permission=permission_key,
         is_active=True
     ).exists()
-    
-    return department_permission
 
 def get_user_permissions(user: User) -> List[str]:
     """
@@ -75,6 +351,11 @@ def get_user_permissions(user: User) -> List[str]:
             'system.admin_settings', 'system.view_analytics', 'system.manage_settings', 'system.backup'
         ]
     
+    # Memoized on the user instance for the rest of the request
+    cached = user.__dict__.get('_permission_list')
+    if cached is not None:
+        return list(cached)
+    
     permissions = set()
     
     # Direct user permissions
@@ -86,17 +367,14 @@ def get_user_permissions(user: User) -> List[str]:
     permissions.update(user_permissions)
     
     # Department permissions
-    user_departments = user.department_assignments.filter(
-        end_date__isnull=True
-    ).values_list('department_id', flat=True)
-    
     department_permissions = Permission.objects.filter(
         entity_type='department',
-        entity_id__in=user_departments,
+        entity_id__in=get_user_department_ids(user),
         is_active=True
     ).values_list('permission', flat=True)
     permissions.update(department_permissions)
     
+    user._permission_list = frozenset(permissions)
     return list(permissions)
 
 def get_accessible_document_categories(user: User) -> List:
@@ -118,40 +396,17 @@ def get_accessible_document_categories(user: User) -> List:
     if user.role == 'admin':
         return list(DocumentCategory.objects.values_list('id', flat=True))
     
-    accessible_categories = set()
+    # categories.view_all (direct or through an active department) opens every
+    # category; otherwise only public ones. One query either way.
+    has_view_all = Permission.objects.filter(
+        Q(entity_type='user', entity_id=user.id) |
+        Q(entity_type='department', entity_id__in=get_user_department_ids(user)),
+        permission='categories.view_all',
+        is_active=True
+    )
     
-    # If user has categories.view_all permission, they can see all categories
-    if user_has_permission(user, 'categories.view_all'):
-        accessible_categories.update(DocumentCategory.objects.values_list('id', flat=True))
-    else:
-        # Check category-specific permissions
-        user_departments = user.department_assignments.filter(
-            end_date__isnull=True
-        ).values_list('department_id', flat=True)
-        
-        # Categories with user permissions
-        user_category_permissions = Permission.objects.filter(
-            entity_type='user',
-            entity_id=user.id,
-            permission='categories.view_all',
-            is_active=True
-        ).values_list('entity_id', flat=True)
-        
-        # Categories with department permissions
-        dept_category_permissions = Permission.objects.filter(
-            entity_type='department',
-            entity_id__in=user_departments,
-            permission='categories.view_all',
-            is_active=True
-        ).values_list('entity_id', flat=True)
-        
-        # Public categories
-        public_categories = DocumentCategory.objects.filter(
-            is_public=True
+    return list(
+        DocumentCategory.objects.filter(
+            Q(is_public=True) | Q(Exists(has_view_all))
         ).values_list('id', flat=True)
-        
-        accessible_categories.update(user_category_permissions)
-        accessible_categories.update(dept_category_permissions)
-        accessible_categories.update(public_categories)
-    
-    return list(accessible_categories) 
\ No newline at end of file
+    ) 
\ No newline at end of file
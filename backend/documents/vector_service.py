@@ -1,28 +1,112 @@
+import hashlib
+import io
 import os
+import re
 import logging
 import numpy as np
+import redis
+import torch
 import uuid
 from typing import List, Dict, Any, Optional
 from django.conf import settings
 from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct, Filter, FieldCondition, Range
+from qdrant_client.models import (
+    Distance, VectorParams, PointStruct, Filter, FieldCondition, Range, HasIdCondition, MatchValue,
+    MatchAny, PayloadSchemaType,
+    ScalarQuantization, ScalarQuantizationConfig, ScalarType, HnswConfigDiff,
+    SearchParams, QuantizationSearchParams
+)
 from sentence_transformers import SentenceTransformer
 import openai
 import magic
 import PyPDF2
+import pymupdf
 from docx import Document as DocxDocument
 from bs4 import BeautifulSoup
-import nltk
-from nltk.tokenize import sent_tokenize, word_tokenize
-from nltk.corpus import stopwords
+from portal_backend.circuit_breaker import CircuitBreaker, CircuitOpenError
+from portal_backend.redis_client import get_redis
 
 logger = logging.getLogger(__name__)
 
+OPENAI_EMBEDDING_MODEL = "text-embedding-ada-002"
+
+# Sentence ends: whitespace following terminal punctuation
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+')
+
+# Chunk point ids are uuid5(namespace, "<document_id>:<chunk_index>"), so
+# reindexing a document overwrites its points in place
+CHUNK_ID_NAMESPACE = uuid.UUID('6f1c2b7e-4d3a-5e8f-9b0c-1a2d3e4f5a6b')
+
+# Seconds a chunk embedding stays cached in Redis, keyed by model and text
+EMBEDDING_CACHE_TTL = 24 * 60 * 60
+
+# int8 scalar quantization keeps a 4x smaller copy of every vector in RAM for
+# HNSW traversal; searches rescore the oversampled top-k with the originals.
+VECTOR_QUANTIZATION = ScalarQuantization(
+    scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True)
+)
+VECTOR_HNSW_CONFIG = HnswConfigDiff(m=16, ef_construct=200)
+VECTOR_SEARCH_PARAMS = SearchParams(
+    quantization=QuantizationSearchParams(rescore=True, oversampling=2.0)
+)
+
+# Shared across workers: after repeated Qdrant failures, searches fail fast
+# for 30s instead of each waiting out a connection timeout
+QDRANT_BREAKER = CircuitBreaker('qdrant', fail_max=5, window=60, reset_timeout=30)
+
+def chunk_text(text: str, chunk_size: int = None, chunk_overlap: int = None) -> List[str]:
+    """
+    Split text into sentence-aligned chunks of at most chunk_size characters
+    
+    Consecutive chunks share up to chunk_overlap characters of trailing
+    sentences so context spanning a boundary is retrievable from either; the
+    overlap shrinks when carrying it would push the next chunk past
+    chunk_size. A single sentence longer than chunk_size becomes its own chunk.
+    """
+    if not chunk_size:
+        chunk_size = settings.CHUNK_SIZE
+    if chunk_overlap is None:
+        chunk_overlap = settings.CHUNK_OVERLAP
+    
+    sentences = [sentence for sentence in SENTENCE_BOUNDARY.split(text.strip()) if sentence]
+    chunks = []
+    start = 0
+    length = 0  # Length of " ".join(sentences[start:i])
+    
+    for i, sentence in enumerate(sentences):
+        if i > start and length + 1 + len(sentence) > chunk_size:
+            chunks.append(" ".join(sentences[start:i]))
+            
+            # Carry trailing sentences into the next chunk, always dropping at least
+            # one, and only while they still fit alongside the incoming sentence
+            kept = 0
+            new_start = i
+            while new_start - 1 > start:
+                carried = kept + len(sentences[new_start - 1]) + 1
+                if carried > chunk_overlap or carried + len(sentence) > chunk_size:
+                    break
+                new_start -= 1
+                kept = carried
+            start = new_start
+            length = kept - 1 if kept else 0
+        
+        length += len(sentence) + (1 if i > start else 0)
+    
+    if start < len(sentences):
+        chunks.append(" ".join(sentences[start:]))
+    
+    return chunks
+
+
 class VectorService:
     """Service for managing vector embeddings and semantic search"""
     
     def __init__(self):
-        self.client = QdrantClient(url=settings.VECTOR_DB_URL)
+        self.client = QdrantClient(
+            url=settings.VECTOR_DB_URL,
+            prefer_grpc=settings.VECTOR_DB_PREFER_GRPC,
+            grpc_port=settings.VECTOR_DB_GRPC_PORT
+        )
         self.collection_name = settings.VECTOR_COLLECTION_NAME
         self.embedding_model = None
         self.use_local_embeddings = settings.USE_LOCAL_EMBEDDINGS
@@ -35,28 +119,37 @@ class VectorService:
         if self.use_local_embeddings:
             self._load_local_model()
         
-        # Initialize NLTK data
-        self._init_nltk()
-        
         # Create collection if it doesn't exist
         self._ensure_collection_exists()
     
     def _load_local_model(self):
         """Load local sentence transformer model"""
         try:
-            self.embedding_model = SentenceTransformer(settings.EMBEDDING_MODEL)
-            logger.info(f"Loaded local embedding model: {settings.EMBEDDING_MODEL}")
+            # fp16 on a GPU when there is one; fp32 on CPU, where half precision is slower
+            device = 'cuda' if torch.cuda.is_available() else 'cpu'
+            self.embedding_model = SentenceTransformer(settings.EMBEDDING_MODEL, device=device)
+            if device == 'cuda':
+                self.embedding_model = self.embedding_model.half()
+            if settings.EMBEDDING_TORCH_COMPILE:
+                # Sequence lengths vary per batch, so compile for dynamic shapes
+                # rather than letting every new length trigger a recompile
+                transformer = self.embedding_model._first_module()
+                transformer.auto_model = torch.compile(transformer.auto_model, dynamic=True)
+            logger.info(f"Loaded local embedding model: {settings.EMBEDDING_MODEL} on {device}")
         except Exception as e:
             logger.error(f"Failed to load local embedding model: {e}")
             raise
     
-    def _init_nltk(self):
-        """Initialize NLTK data"""
-        try:
-            nltk.download('punkt', quiet=True)
-            nltk.download('stopwords', quiet=True)
-        except Exception as e:
-            logger.warning(f"Failed to download NLTK data: {e}")
+    def warmup(self):
+        """
+        Run one throwaway batch through the local model so lazy initialization
+        (and compilation, when enabled) happens before the first real request
+        """
+        if not self.use_local_embeddings:
+            return
+        if not self.embedding_model:
+            self._load_local_model()
+        self.embedding_model.encode(["warmup"] * 8, batch_size=8, show_progress_bar=False)
     
     def _ensure_collection_exists(self):
         """Create the documents collection if it doesn't exist"""
@@ -72,74 +165,87 @@ class VectorService:
                     vectors_config=VectorParams(
                         size=vector_size,
                         distance=Distance.COSINE
-                    )
+                    ),
+                    hnsw_config=VECTOR_HNSW_CONFIG,
+                    quantization_config=VECTOR_QUANTIZATION
                 )
                 logger.info(f"Created collection: {self.collection_name}")
+                self.ensure_payload_indexes()
         except Exception as e:
             logger.error(f"Failed to create collection: {e}")
             raise
     
-    def extract_text_from_file(self, file_path: str, file_type: str) -> str:
-        """Extract text content from various file types"""
+    def ensure_payload_indexes(self):
+        """Keyword index on the acl payload so access filters prune before the ANN step"""
+        self.client.create_payload_index(
+            collection_name=self.collection_name,
+            field_name="acl",
+            field_schema=PayloadSchemaType.KEYWORD
+        )
+    
+    def enable_quantization(self):
+        """Apply the quantization and HNSW settings to an existing collection"""
+        self.client.update_collection(
+            collection_name=self.collection_name,
+            hnsw_config=VECTOR_HNSW_CONFIG,
+            quantization_config=VECTOR_QUANTIZATION
+        )
+        logger.info(f"Enabled int8 quantization on collection: {self.collection_name}")
+    
+    def extract_document_text(self, document) -> str:
+        """Extract a Document's text, streaming the file through its storage backend"""
+        with document.file.open('rb') as file_obj:
+            return self.extract_text_from_file(file_obj, document.file_type)
+    
+    def extract_text_from_file(self, file_obj, file_type: str) -> str:
+        """Extract text content from a binary file-like object of various file types"""
+        name = getattr(file_obj, 'name', 'file')
         try:
             text = ""
             
             if file_type.lower() == 'pdf':
-                with open(file_path, 'rb') as file:
-                    pdf_reader = PyPDF2.PdfReader(file)
-                    for page in pdf_reader.pages:
-                        text += page.extract_text() + "\n"
+                text = self._extract_pdf_text(file_obj)
             
             elif file_type.lower() in ['doc', 'docx']:
-                doc = DocxDocument(file_path)
+                doc = DocxDocument(file_obj)
                 text = "\n".join([paragraph.text for paragraph in doc.paragraphs])
             
             elif file_type.lower() in ['txt', 'md']:
-                with open(file_path, 'r', encoding='utf-8') as file:
-                    text = file.read()
+                text = file_obj.read().decode('utf-8')
             
             elif file_type.lower() in ['html', 'htm']:
-                with open(file_path, 'r', encoding='utf-8') as file:
-                    soup = BeautifulSoup(file.read(), 'html.parser')
-                    text = soup.get_text()
+                soup = BeautifulSoup(file_obj, 'html.parser')
+                text = soup.get_text()
             
             else:
                 # Try to read as plain text
                 try:
-                    with open(file_path, 'r', encoding='utf-8') as file:
-                        text = file.read()
-                except:
+                    text = file_obj.read().decode('utf-8')
+                except UnicodeDecodeError:
                     logger.warning(f"Could not extract text from file type: {file_type}")
                     return ""
             
             return text.strip()
         
         except Exception as e:
-            logger.error(f"Error extracting text from {file_path}: {e}")
+            logger.error(f"Error extracting text from {name}: {e}")
             return ""
     
-    def chunk_text(self, text: str, chunk_size: int = None) -> List[str]:
-        """Split text into chunks for embedding"""
-        if not chunk_size:
-            chunk_size = settings.CHUNK_SIZE
-        
-        # Split by sentences first
-        sentences = sent_tokenize(text)
-        chunks = []
-        current_chunk = ""
-        
-        for sentence in sentences:
-            if len(current_chunk) + len(sentence) <= chunk_size:
-                current_chunk += " " + sentence if current_chunk else sentence
-            else:
-                if current_chunk:
-                    chunks.append(current_chunk.strip())
-                current_chunk = sentence
-        
-        if current_chunk:
-            chunks.append(current_chunk.strip())
+    def _extract_pdf_text(self, file_obj) -> str:
+        """PDF text via MuPDF, falling back to PyPDF2 for files MuPDF cannot open"""
+        data = file_obj.read()
+        try:
+            with pymupdf.open(stream=data, filetype='pdf') as doc:
+                return "\n".join(page.get_text("text") for page in doc)
+        except Exception as e:
+            logger.warning(f"MuPDF could not read {getattr(file_obj, 'name', 'PDF')}, falling back to PyPDF2: {e}")
         
-        return chunks
+        pdf_reader = PyPDF2.PdfReader(io.BytesIO(data))
+        return "\n".join(page.extract_text() for page in pdf_reader.pages)
+    
+    def chunk_text(self, text: str, chunk_size: int = None, chunk_overlap: int = None) -> List[str]:
+        """Split text into sentence-aligned chunks; see the module-level chunk_text"""
+        return chunk_text(text, chunk_size, chunk_overlap)
     
     def generate_embedding(self, text: str) -> List[float]:
         """Generate embedding for text using OpenAI or local model"""
@@ -153,7 +259,7 @@ class VectorService:
             else:
                 # Use OpenAI embeddings
                 response = openai.embeddings.create(
-                    model="text-embedding-ada-002",
+                    model=OPENAI_EMBEDDING_MODEL,
                     input=text
                 )
                 return response.data[0].embedding
@@ -162,42 +268,137 @@ class VectorService:
             logger.error(f"Error generating embedding: {e}")
             raise
     
-    def index_document(self, document_id: str, title: str, content: str, metadata: Dict[str, Any]) -> bool:
-        """Index a document in the vector database"""
+    def generate_embeddings(self, texts: List[str]) -> np.ndarray:
+        """
+        Generate embeddings for many texts, reusing cached vectors for texts
+        already embedded by the same model and batching the rest in one call
+        
+        Returns a float32 array of shape (len(texts), dim).
+        """
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        
+        keys = [self._embedding_cache_key(text) for text in texts]
         try:
-            # Split content into chunks if too long
-            chunks = self.chunk_text(content)
-            points = []
+            cached = get_redis().mget(keys)
+        except redis.RedisError as e:
+            logger.warning(f"Embedding cache unavailable: {e}")
+            cached = [None] * len(texts)
+        
+        embeddings = [np.frombuffer(raw, dtype=np.float16) if raw else None for raw in cached]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            computed = self._embed_batch([texts[i] for i in missing])
+            try:
+                pipe = get_redis().pipeline()
+                for i, embedding in zip(missing, computed.astype(np.float16)):
+                    pipe.set(keys[i], embedding.tobytes(), ex=EMBEDDING_CACHE_TTL)
+                pipe.execute()
+            except redis.RedisError as e:
+                logger.warning(f"Embedding cache unavailable: {e}")
             
-            for i, chunk in enumerate(chunks):
-                if not chunk.strip():
-                    continue
-                
-                # Generate embedding
-                embedding = self.generate_embedding(chunk)
-                
-                # Create point with metadata
-                point_id = uuid.uuid4().hex
+            for i, embedding in zip(missing, computed):
+                embeddings[i] = embedding
+        
+        return np.stack(embeddings).astype(np.float32, copy=False)
+    
+    def _embedding_cache_key(self, text: str) -> str:
+        model = settings.EMBEDDING_MODEL if self.use_local_embeddings else OPENAI_EMBEDDING_MODEL
+        digest = hashlib.blake2b(f"{model}|{text}".encode(), digest_size=16).hexdigest()
+        return f'emb:{digest}'
+    
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        """One batched model call or request for all texts, as a float32 (N, dim) array"""
+        try:
+            if self.use_local_embeddings:
+                if not self.embedding_model:
+                    self._load_local_model()
                 
-                point = PointStruct(
-                    id=point_id,
-                    vector=embedding,
-                    payload={
-                        "document_id": document_id,
-                        "title": title,
-                        "content": chunk,
-                        "chunk_index": i,
-                        "total_chunks": len(chunks),
-                        **metadata
-                    }
+                embeddings = self.embedding_model.encode(
+                    texts,
+                    batch_size=64,
+                    convert_to_numpy=True,
+                    show_progress_bar=False
+                )
+                return embeddings.astype(np.float32, copy=False)
+            else:
+                # The embeddings endpoint accepts a list and returns items in input order
+                response = openai.embeddings.create(
+                    model=OPENAI_EMBEDDING_MODEL,
+                    input=texts
+                )
+                return np.array(
+                    [item.embedding for item in sorted(response.data, key=lambda item: item.index)],
+                    dtype=np.float32
                 )
-                points.append(point)
+        
+        except Exception as e:
+            logger.error(f"Error generating embeddings: {e}")
+            raise
+    
+    def build_points(self, document_id: str, title: str, content: str, metadata: Dict[str, Any]) -> List[PointStruct]:
+        """Chunk and embed a document into Qdrant points without writing them"""
+        # Split content into chunks if too long
+        chunks = self.chunk_text(content)
+        indexed_chunks = [(i, chunk) for i, chunk in enumerate(chunks) if chunk.strip()]
+        
+        # Embed every chunk in one batch; one 2-D tolist() converts the whole
+        # matrix in C instead of boxing each row separately
+        embeddings = self.generate_embeddings([chunk for _, chunk in indexed_chunks]).tolist()
+        points = []
+        
+        for (i, chunk), embedding in zip(indexed_chunks, embeddings):
+            # Create point with metadata
+            point_id = str(uuid.uuid5(CHUNK_ID_NAMESPACE, f"{document_id}:{i}"))
             
-            # Upsert points to Qdrant
+            point = PointStruct(
+                id=point_id,
+                vector=embedding,
+                payload={
+                    "document_id": document_id,
+                    "title": title,
+                    "content": chunk,
+                    "chunk_index": i,
+                    "total_chunks": len(chunks),
+                    **metadata
+                }
+            )
+            points.append(point)
+        
+        return points
+    
+    def upsert_points(self, points: List[PointStruct], wait: bool = True):
+        """Write points to the collection in one request"""
+        if points:
             self.client.upsert(
                 collection_name=self.collection_name,
-                points=points
+                points=points,
+                wait=wait
             )
+    
+    def delete_stale_points(self, document_id: str, keep_ids: List[str], wait: bool = True):
+        """
+        Delete a document's points other than keep_ids: chunks past the new end
+        of the document, and points written under the old random ids
+        """
+        must_not = [HasIdCondition(has_id=keep_ids)] if keep_ids else []
+        self.client.delete(
+            collection_name=self.collection_name,
+            points_selector=Filter(
+                must=[FieldCondition(key="document_id", match=MatchValue(value=document_id))],
+                must_not=must_not
+            ),
+            wait=wait
+        )
+    
+    def index_document(self, document_id: str, title: str, content: str, metadata: Dict[str, Any]) -> bool:
+        """Index a document in the vector database"""
+        try:
+            points = self.build_points(document_id, title, content, metadata)
+            
+            # Upsert points to Qdrant; ids are stable, so existing chunks are overwritten
+            self.upsert_points(points)
+            self.delete_stale_points(document_id, [point.id for point in points])
             
             logger.info(f"Indexed document {document_id} with {len(points)} chunks")
             return True
@@ -206,6 +407,16 @@ class VectorService:
             logger.error(f"Error indexing document {document_id}: {e}")
             return False
     
+    def set_document_payload(self, document_id: str, payload: Dict[str, Any]):
+        """Overwrite payload keys on every chunk of a document without re-embedding it"""
+        self.client.set_payload(
+            collection_name=self.collection_name,
+            payload=payload,
+            points=Filter(
+                must=[FieldCondition(key="document_id", match=MatchValue(value=document_id))]
+            )
+        )
+    
     def delete_document(self, document_id: str) -> bool:
         """Delete a document from the vector database"""
         try:
@@ -216,7 +427,7 @@ class VectorService:
                     must=[
                         FieldCondition(
                             key="document_id",
-                            match={"value": document_id}
+                            match=MatchValue(value=document_id)
                         )
                     ]
                 )
@@ -235,9 +446,19 @@ class VectorService:
         limit: int = 10, 
         department_id: str = None,
         user_id: str = None,
-        filter_params: Dict[str, Any] = None
+        filter_params: Dict[str, Any] = None,
+        acl_tokens: Optional[List[str]] = None
     ) -> List[Dict[str, Any]]:
-        """Search for documents using semantic similarity"""
+        """
+        Search for documents using semantic similarity
+        
+        With acl_tokens, only chunks whose acl payload holds at least one of
+        them are considered (see tasks.document_acl_tokens).
+        
+        Errors are raised to the caller; CircuitOpenError means Qdrant was
+        skipped because QDRANT_BREAKER is open.
+        """
+        QDRANT_BREAKER.check()
         try:
             # Generate query embedding
             query_embedding = self.generate_embedding(query)
@@ -249,7 +470,7 @@ class VectorService:
                 filter_conditions.append(
                     FieldCondition(
                         key="department_id",
-                        match={"value": department_id}
+                        match=MatchValue(value=department_id)
                     )
                 )
             
@@ -257,7 +478,15 @@ class VectorService:
                 filter_conditions.append(
                     FieldCondition(
                         key="accessible_by",
-                        match={"value": user_id}
+                        match=MatchValue(value=user_id)
+                    )
+                )
+            
+            if acl_tokens is not None:
+                filter_conditions.append(
+                    FieldCondition(
+                        key="acl",
+                        match=MatchAny(any=acl_tokens)
                     )
                 )
             
@@ -266,37 +495,38 @@ class VectorService:
                     filter_conditions.append(
                         FieldCondition(
                             key=key,
-                            match={"value": value}
+                            match=MatchValue(value=value)
                         )
                     )
             
             # Perform search
             search_filter = Filter(must=filter_conditions) if filter_conditions else None
             
-            results = self.client.search(
-                collection_name=self.collection_name,
-                query_vector=query_embedding,
-                limit=limit,
-                query_filter=search_filter,
-                with_payload=True,
-                with_vectors=False
-            )
+            # Qdrant groups hits by document, so limit counts distinct documents
+            try:
+                groups = self.client.search_groups(
+                    collection_name=self.collection_name,
+                    query_vector=query_embedding,
+                    group_by="document_id",
+                    group_size=1,
+                    limit=limit,
+                    query_filter=search_filter,
+                    search_params=VECTOR_SEARCH_PARAMS,
+                    with_payload=True,
+                    with_vectors=False
+                ).groups
+            except Exception:
+                QDRANT_BREAKER.record_failure()
+                raise
+            QDRANT_BREAKER.record_success()
             
-            # Process results
+            # Process results; each group holds its document's best-scoring chunk
             processed_results = []
-            seen_documents = set()
             
-            for result in results:
-                doc_id = result.payload.get("document_id")
-                
-                # Avoid duplicate documents (when multiple chunks match)
-                if doc_id in seen_documents:
-                    continue
-                
-                seen_documents.add(doc_id)
-                
+            for group in groups:
+                result = group.hits[0]
                 processed_results.append({
-                    "document_id": doc_id,
+                    "document_id": result.payload.get("document_id"),
                     "title": result.payload.get("title"),
                     "content_snippet": result.payload.get("content", "")[:200] + "...",
                     "score": result.score,
@@ -309,12 +539,15 @@ class VectorService:
         
         except Exception as e:
             logger.error(f"Error searching documents: {e}")
-            return []
+            raise
     
     def get_document_stats(self) -> Dict[str, Any]:
         """Get statistics about the vector database"""
+        if QDRANT_BREAKER.is_open():
+            return {"status": "unavailable", "error": "Vector database circuit open"}
         try:
             collection_info = self.client.get_collection(self.collection_name)
+            QDRANT_BREAKER.record_success()
             
             return {
                 "total_points": collection_info.points_count,
@@ -324,6 +557,7 @@ class VectorService:
             }
         
         except Exception as e:
+            QDRANT_BREAKER.record_failure()
             logger.error(f"Error getting vector database stats: {e}")
             return {"status": "error", "error": str(e)}
 
@@ -15,29 +15,40 @@ Department Portal - Document Views
 - Text-based search fallback: ✅ WORKING
 """
 
+from celery import group
 from django.shortcuts import render, get_object_or_404
 from rest_framework import generics, status, permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from django.db.models import Q, Count, Sum, Avg
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import transaction
+from django.db.models import F, Q, Count, Sum, Avg
 from django.utils import timezone
 from .models import (
     DocumentCategory, Document, DocumentTag, DocumentPermission,
-    DocumentActivity, DocumentComment, DocumentShare
+    DocumentActivity, DocumentComment, DocumentShare, share_token_bytes
 )
 from .serializers import (
     DocumentCategorySerializer, DocumentListSerializer, DocumentDetailSerializer,
     DocumentCreateSerializer, DocumentUpdateSerializer, DocumentPermissionSerializer,
     DocumentActivitySerializer, DocumentCommentSerializer, DocumentShareSerializer,
     ShareDocumentSerializer, DocumentAccessSerializer, BulkDocumentActionSerializer,
-    DocumentSearchSerializer, DocumentTagSerializer
+    DocumentSearchSerializer, DocumentTagSerializer, DocumentListLiteSerializer
 )
 from .vector_service import vector_service
+from portal_backend.circuit_breaker import CircuitOpenError
 from .tasks import index_document_task, delete_document_from_index
 from .ai_service import ai_assistant
-from .utils import user_has_permission
+from .utils import (
+    user_has_permission, bump_counter, cached_document_stats, invalidate_document_stats,
+    get_user_department_ids
+)
+from .prefetch import AutoPrefetchMixin
+from .signals import refresh_document_acl
 import logging
+import mimetypes
+import uuid
 from accounts.permissions import (
     DocumentOwnerOrAdmin, DocumentSharePermission, log_security_event
 )
@@ -45,13 +56,19 @@ from .permissions import (
     HasDocumentPermission, CanCreateDocuments, CanViewAllDocuments, 
     CanEditAllDocuments, CanDeleteAllDocuments, CanShareDocuments, CanApproveDocuments
 )
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
 from django.http import FileResponse, HttpResponse
+from django.utils.http import content_disposition_header
+from urllib.parse import quote
 
 logger = logging.getLogger(__name__)
 
 # Document Categories
-class DocumentCategoryListView(generics.ListCreateAPIView):
-    queryset = DocumentCategory.objects.filter(is_active=True)
+class DocumentCategoryListView(AutoPrefetchMixin, generics.ListCreateAPIView):
+    queryset = DocumentCategory.objects.with_counts().select_related(
+        'parent_category', 'department'
+    ).filter(is_active=True)
     serializer_class = DocumentCategorySerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -60,8 +77,8 @@ class DocumentCategoryCreateView(generics.CreateAPIView):
     serializer_class = DocumentCategorySerializer
     permission_classes = [permissions.IsAuthenticated]
 
-class DocumentCategoryDetailView(generics.RetrieveAPIView):
-    queryset = DocumentCategory.objects.all()
+class DocumentCategoryDetailView(AutoPrefetchMixin, generics.RetrieveAPIView):
+    queryset = DocumentCategory.objects.with_counts().select_related('parent_category', 'department')
     serializer_class = DocumentCategorySerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -76,8 +93,8 @@ class DocumentCategoryDeleteView(generics.DestroyAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
 # Document Tags
-class DocumentTagListView(generics.ListCreateAPIView):
-    queryset = DocumentTag.objects.all()
+class DocumentTagListView(AutoPrefetchMixin, generics.ListCreateAPIView):
+    queryset = DocumentTag.objects.with_counts()
     serializer_class = DocumentTagSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -86,8 +103,8 @@ class DocumentTagCreateView(generics.CreateAPIView):
     serializer_class = DocumentTagSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-class DocumentTagDetailView(generics.RetrieveAPIView):
-    queryset = DocumentTag.objects.all()
+class DocumentTagDetailView(AutoPrefetchMixin, generics.RetrieveAPIView):
+    queryset = DocumentTag.objects.with_counts()
     serializer_class = DocumentTagSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -125,6 +142,17 @@ class DocumentListView(generics.ListAPIView):
         
         # Otherwise, only show documents they own or have explicit access to
         return queryset.filter(owned_by=user)
+    
+    def list(self, request, *args, **kwargs):
+        # Rows are read with values(); DocumentListSerializer documents the same shape
+        queryset = self.filter_queryset(self.get_queryset()).values(
+            *DocumentListLiteSerializer.value_fields
+        )
+        
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(DocumentListLiteSerializer(page, many=True).data)
+        return Response(DocumentListLiteSerializer(queryset, many=True).data)
 
 class DocumentCreateView(generics.CreateAPIView):
     queryset = Document.objects.all()
@@ -140,8 +168,8 @@ class DocumentCreateView(generics.CreateAPIView):
         except Exception as e:
             logger.error(f"Failed to index document {document.id}: {str(e)}")
 
-class DocumentDetailView(generics.RetrieveAPIView):
-    queryset = Document.objects.all()
+class DocumentDetailView(AutoPrefetchMixin, generics.RetrieveAPIView):
+    queryset = Document.objects.with_detail()
     serializer_class = DocumentDetailSerializer
     permission_classes = [CanViewAllDocuments]
 
@@ -189,7 +217,7 @@ class DocumentPermissionListView(generics.ListAPIView):
     
     def get_queryset(self):
         document_id = self.kwargs['document_id']
-        return DocumentPermission.objects.filter(document_id=document_id)
+        return DocumentPermission.objects.with_related().filter(document_id=document_id)
 
 class DocumentPermissionCreateView(generics.CreateAPIView):
     serializer_class = DocumentPermissionSerializer
@@ -212,7 +240,7 @@ class DocumentCommentListView(generics.ListAPIView):
     
     def get_queryset(self):
         document_id = self.kwargs['document_id']
-        return DocumentComment.objects.filter(
+        return DocumentComment.objects.with_related().filter(
             document_id=document_id,
             parent_comment__isnull=True  # Only top-level comments
         )
@@ -222,7 +250,7 @@ class DocumentCommentCreateView(generics.CreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
 class DocumentCommentUpdateView(generics.UpdateAPIView):
-    queryset = DocumentComment.objects.all()
+    queryset = DocumentComment.objects.with_replies()
     serializer_class = DocumentCommentSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -238,7 +266,7 @@ class DocumentActivityListView(generics.ListAPIView):
     
     def get_queryset(self):
         document_id = self.kwargs['document_id']
-        return DocumentActivity.objects.filter(document_id=document_id)
+        return DocumentActivity.objects.with_related().filter(document_id=document_id)
 
 # API Views and Functions
 
@@ -264,20 +292,36 @@ def document_search(request):
                 department_id=department if department else None
             )
             
-            # Transform vector results to expected format
-            search_results = []
+            # Load every hit in one query (plus one for tags), then keep score order
+            document_ids = []
             for result in vector_results:
                 try:
-                    document = Document.objects.get(id=result['document_id'])
-                    search_results.append({
-                        'document': DocumentSearchSerializer(document).data,
-                        'score': result['score'],
-                        'snippet': result['content_snippet'],
-                        'metadata': result.get('metadata', {})
-                    })
-                except Document.DoesNotExist:
-                    # Skip documents that don't exist in the database
-                    continue
+                    document_ids.append(uuid.UUID(str(result['document_id'])))
+                except (KeyError, ValueError):
+                    document_ids.append(None)
+            documents = Document.objects.for_search().in_bulk(
+                [document_id for document_id in document_ids if document_id]
+            )
+            
+            # Skip hits whose documents don't exist in the database
+            hits = [
+                (result, documents[document_id])
+                for result, document_id in zip(vector_results, document_ids)
+                if document_id in documents
+            ]
+            # One serializer for the whole page; many=True reuses a single child
+            serialized = DocumentSearchSerializer([document for _, document in hits], many=True).data
+            
+            # Transform vector results to expected format
+            search_results = [
+                {
+                    'document': document_data,
+                    'score': result['score'],
+                    'snippet': result['content_snippet'],
+                    'metadata': result.get('metadata', {})
+                }
+                for (result, _), document_data in zip(hits, serialized)
+            ]
             
             return Response({
                 'query': query,
@@ -287,24 +331,34 @@ def document_search(request):
             })
             
         except Exception as vector_error:
-            logger.warning(f"Vector search failed, falling back to text search: {vector_error}")
+            if isinstance(vector_error, CircuitOpenError):
+                # Qdrant has been failing; text search without waiting on it
+                logger.info("Vector search circuit open, using text search")
+            else:
+                logger.warning(f"Vector search failed, falling back to text search: {vector_error}")
             
-            # Fallback to basic text search
-            documents = Document.objects.filter(
-                Q(title__icontains=query) | 
-                Q(description__icontains=query),
+            # Fallback to full-text search over the GIN-indexed title/description vector
+            search_query = SearchQuery(query, config='english', search_type='websearch')
+            documents = Document.objects.for_search().annotate(
+                rank=SearchRank(F('search_vector'), search_query)
+            ).filter(
+                search_vector=search_query,
                 status__in=['published', 'approved']
-            )[:limit]
+            ).order_by('-rank')[:limit]
+            
+            documents = list(documents)
+            serialized = DocumentSearchSerializer(documents, many=True).data
             
             # Format results to match expected structure
-            results = []
-            for doc in documents:
-                results.append({
-                    'document': DocumentSearchSerializer(doc).data,
-                    'score': 0.8,  # Mock score
+            results = [
+                {
+                    'document': document_data,
+                    'score': doc.rank,
                     'snippet': doc.description[:200] + "..." if doc.description else "No description available",
                     'metadata': {'department': 'General'}
-                })
+                }
+                for doc, document_data in zip(documents, serialized)
+            ]
             
             return Response({
                 'query': query,
@@ -319,28 +373,33 @@ def document_search(request):
             'error': 'Search service temporarily unavailable'
         }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
+def compute_document_stats():
+    """Site-wide document counts (one aggregate query) and vector DB stats"""
+    stats = Document.objects.aggregate(
+        total_documents=Count('id'),
+        published_documents=Count('id', filter=Q(status='published')),
+        draft_documents=Count('id', filter=Q(status='draft')),
+        pending_review=Count('id', filter=Q(status='review')),
+    )
+    
+    # Try to get vector database stats
+    try:
+        stats['vector_db_stats'] = vector_service.get_document_stats()
+    except Exception as e:
+        logger.warning(f"Could not get vector DB stats: {e}")
+        stats['vector_db_stats'] = {
+            'status': 'unavailable', 
+            'indexed_documents': 0,
+            'error': str(e)
+        }
+    return stats
+
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def document_stats(request):
     """Get document statistics"""
     try:
-        stats = {
-            'total_documents': Document.objects.count(),
-            'published_documents': Document.objects.filter(status='published').count(),
-            'draft_documents': Document.objects.filter(status='draft').count(),
-            'pending_review': Document.objects.filter(status='review').count(),
-        }
-        
-        # Try to get vector database stats
-        try:
-            stats['vector_db_stats'] = vector_service.get_document_stats()
-        except Exception as e:
-            logger.warning(f"Could not get vector DB stats: {e}")
-            stats['vector_db_stats'] = {
-                'status': 'unavailable', 
-                'indexed_documents': 0,
-                'error': str(e)
-            }
+        stats = cached_document_stats(compute_document_stats)
         
         if request.user.role == 'admin':
             stats['user_documents'] = Document.objects.filter(created_by=request.user).count()
@@ -389,32 +448,92 @@ def bulk_document_action(request):
     action = serializer.validated_data['action']
     
     try:
-        documents = Document.objects.filter(id__in=document_ids)
-        
-        if action == 'delete':
-            # Remove documents from vector database
-            for doc in documents:
-                delete_document_from_index.delay(str(doc.id))
-            documents.delete()
-        
-        elif action == 'publish':
-            documents.update(status='published', published_at=timezone.now())
-            # Index published documents in vector database
-            for doc in documents:
-                index_document_task.delay(str(doc.id))
+        with transaction.atomic():
+            # Lock the rows once; rows another bulk action holds are skipped rather than waited on
+            ids = list(
+                Document.objects.filter(id__in=document_ids)
+                .select_for_update(skip_locked=True)
+                .values_list('id', flat=True)
+            )
+            documents = Document.objects.filter(id__in=ids)
+            task = None
+            
+            if action == 'delete':
+                documents.delete()
+                # Remove documents from vector database
+                task = delete_document_from_index
+            
+            elif action == 'publish':
+                documents.update(status='published', published_at=timezone.now())
+                # Index published documents in vector database
+                task = index_document_task
+            
+            elif action == 'archive':
+                documents.update(status='archived')
+                # Remove archived documents from vector database
+                task = delete_document_from_index
+            
+            # One broker publish for the whole batch, once the new state has committed
+            if task and ids:
+                signatures = [task.s(str(document_id)) for document_id in ids]
+                transaction.on_commit(lambda: group(signatures).apply_async())
         
-        elif action == 'archive':
-            documents.update(status='archived')
-            # Remove archived documents from vector database
-            for doc in documents:
-                delete_document_from_index.delay(str(doc.id))
+        # Queryset update()/delete() skip the Document signals that drop cached stats
+        invalidate_document_stats()
         
-        return Response({'message': f'{action} completed for {len(document_ids)} documents'})
+        return Response({'message': f'{action} completed for {len(ids)} documents'})
     
     except Exception as e:
         logger.error(f"Error in bulk action: {e}")
         return Response({'error': 'Bulk action failed'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+# Content types of the formats documents are uploaded in, keyed by lower-case file_type
+DOCUMENT_CONTENT_TYPES = {
+    'pdf': 'application/pdf',
+    'doc': 'application/msword',
+    'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'xls': 'application/vnd.ms-excel',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'ppt': 'application/vnd.ms-powerpoint',
+    'pptx': 'application/vnd.openxmlformats-officedocument.presentationml.presentation',
+    'txt': 'text/plain',
+    'csv': 'text/csv',
+    'md': 'text/markdown',
+    'html': 'text/html',
+    'rtf': 'application/rtf',
+}
+
+
+def document_content_type(document):
+    """Table lookup on file_type; mimetypes only for formats outside the table"""
+    content_type = DOCUMENT_CONTENT_TYPES.get(document.file_type.lower())
+    if content_type is None:
+        content_type = mimetypes.guess_type(document.file.name)[0] or 'application/octet-stream'
+    return content_type
+
+
+def document_file_response(document, as_attachment):
+    """
+    Response serving a document's file: an X-Accel-Redirect for nginx to send
+    from disk when SENDFILE_ACCEL_PREFIX is configured and the file is on the
+    local filesystem, otherwise a FileResponse streamed by Django
+    """
+    filename = f"{document.title}.{document.file_type.lower()}"
+    content_type = document_content_type(document)
+    
+    if settings.SENDFILE_ACCEL_PREFIX and isinstance(document.file.storage, FileSystemStorage):
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = settings.SENDFILE_ACCEL_PREFIX + quote(document.file.name)
+        response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+        return response
+    
+    return FileResponse(
+        document.file.open('rb'),
+        content_type=content_type,
+        as_attachment=as_attachment,
+        filename=filename
+    )
+
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def download_document(request, pk):
@@ -439,41 +558,25 @@ def download_document(request, pk):
         if not document.file:
             return Response({'error': 'No file associated with this document'}, status=status.HTTP_404_NOT_FOUND)
         
-        if not document.file.storage.exists(document.file.name):
+        # Opening the file is the existence check; a separate exists() costs a
+        # storage round trip (a HEAD request on object storage)
+        try:
+            response = document_file_response(document, as_attachment=True)
+        except FileNotFoundError:
             return Response({'error': 'File not found on server'}, status=status.HTTP_404_NOT_FOUND)
         
         # Increment download count
-        document.download_count += 1
-        document.save(update_fields=['download_count'])
+        bump_counter('document', document.id, 'download_count')
         
         # Log activity
-        DocumentActivity.objects.create(
-            document=document,
-            user=request.user,
-            action='downloaded',
+        DocumentActivity.log_async(
+            document.id,
+            request.user.id,
+            'downloaded',
             ip_address=request.META.get('REMOTE_ADDR'),
             user_agent=request.META.get('HTTP_USER_AGENT', '')
         )
         
-        # Serve the file
-        import mimetypes
-        
-        # Get the file content
-        file_handle = document.file.open()
-        
-        # Determine content type
-        content_type, _ = mimetypes.guess_type(document.file.name)
-        if not content_type:
-            content_type = 'application/octet-stream'
-        
-        # Create response
-        response = FileResponse(
-            file_handle,
-            content_type=content_type,
-            as_attachment=True,
-            filename=f"{document.title}.{document.file_type.lower()}"
-        )
-        
         return response
         
     except Document.DoesNotExist:
@@ -506,57 +609,25 @@ def preview_document(request, pk):
         if not document.file:
             return Response({'error': 'No file associated with this document'}, status=status.HTTP_404_NOT_FOUND)
         
-        if not document.file.storage.exists(document.file.name):
+        # Serve the file for inline viewing; the response carries an inline Content-Disposition.
+        # Opening the file doubles as the existence check
+        try:
+            response = document_file_response(document, as_attachment=False)
+        except FileNotFoundError:
             return Response({'error': 'File not found on server'}, status=status.HTTP_404_NOT_FOUND)
         
         # Increment view count
-        document.view_count += 1
-        document.save(update_fields=['view_count'])
+        bump_counter('document', document.id, 'view_count')
         
         # Log activity
-        DocumentActivity.objects.create(
-            document=document,
-            user=request.user,
-            action='viewed',
+        DocumentActivity.log_async(
+            document.id,
+            request.user.id,
+            'viewed',
             ip_address=request.META.get('REMOTE_ADDR'),
             user_agent=request.META.get('HTTP_USER_AGENT', '')
         )
         
-        # Serve the file for inline viewing
-        import mimetypes
-        
-        # Get the file content
-        file_handle = document.file.open()
-        
-        # Determine content type
-        content_type, _ = mimetypes.guess_type(document.file.name)
-        if not content_type:
-            # Default content types for common document formats
-            ext = document.file_type.lower()
-            if ext == 'pdf':
-                content_type = 'application/pdf'
-            elif ext in ['doc', 'docx']:
-                content_type = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
-            elif ext in ['xls', 'xlsx']:
-                content_type = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-            elif ext in ['ppt', 'pptx']:
-                content_type = 'application/vnd.openxmlformats-officedocument.presentationml.presentation'
-            elif ext == 'txt':
-                content_type = 'text/plain'
-            else:
-                content_type = 'application/octet-stream'
-        
-        # Create response for inline viewing
-        response = FileResponse(
-            file_handle,
-            content_type=content_type,
-            as_attachment=False,  # This makes it display inline instead of downloading
-            filename=f"{document.title}.{document.file_type.lower()}"
-        )
-        
-        # Add headers to help with inline viewing
-        response['Content-Disposition'] = f'inline; filename="{document.title}.{document.file_type.lower()}"'
-        
         # Add CORS headers to allow cross-origin requests
         response['Access-Control-Allow-Origin'] = 'http://localhost:5173'
         response['Access-Control-Allow-Credentials'] = 'true'
@@ -576,14 +647,13 @@ def view_document(request, pk):
     """Record document view and increment view count"""
     try:
         document = Document.objects.get(pk=pk)
-        document.view_count += 1
-        document.save()
+        bump_counter('document', document.id, 'view_count')
         
         # Log activity
-        DocumentActivity.objects.create(
-            document=document,
-            user=request.user,
-            action='viewed',
+        DocumentActivity.log_async(
+            document.id,
+            request.user.id,
+            'viewed',
             ip_address=request.META.get('REMOTE_ADDR'),
             user_agent=request.META.get('HTTP_USER_AGENT', '')
         )
@@ -596,37 +666,43 @@ def view_document(request, pk):
 @permission_classes([permissions.IsAuthenticated])
 def document_versions(request, pk):
     """Get all versions of a document"""
-    try:
-        document = Document.objects.get(pk=pk)
-        versions = Document.objects.filter(
-            Q(id=document.id) | Q(previous_version=document)
+    # The document and its versions in one statement; it is among them if it exists.
+    # UNION ALL keeps each branch an index equality lookup instead of an OR across columns
+    fields = DocumentListLiteSerializer.value_fields
+    versions = list(
+        Document.objects.filter(id=pk).values(*fields).union(
+            Document.objects.filter(previous_version_id=pk).values(*fields),
+            all=True
         ).order_by('-created_at')
-        
-        serializer = DocumentListSerializer(versions, many=True)
-        return Response(serializer.data)
-    except Document.DoesNotExist:
+    )
+    
+    if not any(str(version['id']) == str(pk) for version in versions):
         return Response({'error': 'Document not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    serializer = DocumentListLiteSerializer(versions, many=True)
+    return Response(serializer.data)
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def resolve_comment(request, pk):
     """Resolve a comment"""
-    try:
-        comment = DocumentComment.objects.get(pk=pk)
-        comment.is_resolved = True
-        comment.resolved_by = request.user
-        comment.resolved_at = timezone.now()
-        comment.save()
-        
-        return Response({'message': 'Comment resolved'})
-    except DocumentComment.DoesNotExist:
+    resolved = DocumentComment.objects.filter(pk=pk).update(
+        is_resolved=True,
+        resolved_by=request.user,
+        resolved_at=timezone.now(),
+        updated_at=timezone.now()
+    )
+    if not resolved:
         return Response({'error': 'Comment not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    return Response({'message': 'Comment resolved'})
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def all_activities(request):
     """Get all document activities"""
-    activities = DocumentActivity.objects.all()[:100]  # Latest 100 activities
+    # Latest 100 activities; Meta.ordering is newest first
+    activities = DocumentActivity.objects.with_related()[:100]
     serializer = DocumentActivitySerializer(activities, many=True)
     return Response(serializer.data)
 
@@ -635,91 +711,81 @@ def all_activities(request):
 @permission_classes([permissions.IsAuthenticated])
 def submit_for_review(request, pk):
     """Submit document for review"""
-    try:
-        document = Document.objects.get(pk=pk)
-        document.status = 'review'
-        document.save()
-        
-        # Log activity
-        DocumentActivity.objects.create(
-            document=document,
-            user=request.user,
-            action='reviewed',
-            description='Document submitted for review'
-        )
-        
-        return Response({'message': 'Document submitted for review'})
-    except Document.DoesNotExist:
+    # One narrow UPDATE of the workflow columns; no load, no full-row write
+    if not Document.objects.filter(pk=pk).update(status='review', updated_at=timezone.now()):
         return Response({'error': 'Document not found'}, status=status.HTTP_404_NOT_FOUND)
+    invalidate_document_stats()
+    
+    # Log activity
+    DocumentActivity.log_async(
+        pk,
+        request.user.id,
+        'reviewed',
+        description='Document submitted for review'
+    )
+    
+    return Response({'message': 'Document submitted for review'})
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def approve_document(request, pk):
     """Approve document (Admin/Manager only)"""
-    try:
-        # Check if user has approval permission
-        if not (request.user.role == 'admin' or 
-                user_has_permission(request.user, 'documents.approve')):
-            log_security_event(
-                user=request.user,
-                action='approve_denied',
-                resource=f"document_id:{pk}",
-                success=False,
-                details="User lacks approve permission"
-            )
-            return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
-        
-        document = Document.objects.get(pk=pk)
-        document.status = 'approved'
-        document.approved_by = request.user
-        document.approved_at = timezone.now()
-        document.save()
-        
-        # Log activity
-        DocumentActivity.objects.create(
-            document=document,
+    # Check if user has approval permission
+    if not (request.user.role == 'admin' or 
+            user_has_permission(request.user, 'documents.approve')):
+        log_security_event(
             user=request.user,
-            action='approved',
-            ip_address=request.META.get('REMOTE_ADDR'),
-            user_agent=request.META.get('HTTP_USER_AGENT', '')
+            action='approve_denied',
+            resource=f"document_id:{pk}",
+            success=False,
+            details="User lacks approve permission"
         )
-        
-        return Response({'message': 'Document approved successfully'})
-    except Document.DoesNotExist:
+        return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+    
+    now = timezone.now()
+    if not Document.objects.filter(pk=pk).update(
+        status='approved', reviewer=request.user, reviewed_at=now, updated_at=now
+    ):
         return Response({'error': 'Document not found'}, status=status.HTTP_404_NOT_FOUND)
+    invalidate_document_stats()
+    
+    # Log activity
+    DocumentActivity.log_async(
+        pk,
+        request.user.id,
+        'approved',
+        ip_address=request.META.get('REMOTE_ADDR'),
+        user_agent=request.META.get('HTTP_USER_AGENT', '')
+    )
+    
+    return Response({'message': 'Document approved successfully'})
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def publish_document(request, pk):
     """Publish a document"""
-    try:
-        document = Document.objects.get(pk=pk)
-        document.status = 'published'
-        document.published_at = timezone.now()
-        document.save()
-        
-        # TEMPORARILY DISABLED - Re-enable when vector DB is restored
-        # index_document_task.delay(str(document.id))
-        
-        return Response({'message': 'Document published'})
-    except Document.DoesNotExist:
+    now = timezone.now()
+    if not Document.objects.filter(pk=pk).update(status='published', published_at=now, updated_at=now):
         return Response({'error': 'Document not found'}, status=status.HTTP_404_NOT_FOUND)
+    invalidate_document_stats()
+    
+    # TEMPORARILY DISABLED - Re-enable when vector DB is restored
+    # index_document_task.delay(str(pk))
+    
+    return Response({'message': 'Document published'})
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def archive_document(request, pk):
     """Archive a document"""
-    try:
-        document = Document.objects.get(pk=pk)
-        document.status = 'archived'
-        document.save()
-        
-        # TEMPORARILY DISABLED - Re-enable when vector DB is restored
-        # delete_document_from_index.delay(str(document.id))
-        
-        return Response({'message': 'Document archived'})
-    except Document.DoesNotExist:
+    if not Document.objects.filter(pk=pk).update(status='archived', updated_at=timezone.now()):
         return Response({'error': 'Document not found'}, status=status.HTTP_404_NOT_FOUND)
+    invalidate_document_stats()
+    
+    # TEMPORARILY DISABLED - Re-enable when vector DB is restored
+    # delete_document_from_index.delay(str(pk))
+    
+    return Response({'message': 'Document archived'})
 
 # Report endpoints
 @api_view(['GET'])
@@ -779,15 +845,15 @@ class DocumentShareView(APIView):
                 shares_created = self._create_public_link(document, user, data)
             
             # Log sharing activity
+            ip_address = self._get_client_ip(request)
+            DocumentActivity.log_many_async([
+                (document.id, user.id, 'shared', {
+                    'description': f"Document shared via {share_type}",
+                    'ip_address': ip_address,
+                })
+                for _ in shares_created
+            ])
             for share in shares_created:
-                DocumentActivity.objects.create(
-                    document=document,
-                    user=user,
-                    action='shared',
-                    description=f"Document shared via {share_type}",
-                    ip_address=self._get_client_ip(request)
-                )
-                
                 log_security_event(
                     user=user,
                     action='document_share',
@@ -823,53 +889,63 @@ class DocumentShareView(APIView):
         from accounts.models import User
         shares = []
         
-        # Get users by email or IDs
-        users = []
+        # Get users by email and IDs in one query
+        targets = Q()
         if data.get('user_email'):
-            try:
-                user = User.objects.get(email=data['user_email'], is_active=True)
-                users.append(user)
-            except User.DoesNotExist:
-                raise ValueError(f"User with email {data['user_email']} not found")
-        
+            targets |= Q(email=data['user_email'])
         if data.get('user_ids'):
-            users.extend(
-                User.objects.filter(id__in=data['user_ids'], is_active=True)
-            )
-        
-        # Create shares
-        for user in users:
-            # Check if share already exists
-            existing_share = DocumentShare.objects.filter(
+            targets |= Q(id__in=data['user_ids'])
+        # Only what the email check and the response's recipient name read
+        users = list(
+            User.objects.filter(targets, is_active=True).only('id', 'email', 'first_name', 'last_name')
+        ) if targets else []
+        
+        if data.get('user_email') and not any(user.email == data['user_email'] for user in users):
+            raise ValueError(f"User with email {data['user_email']} not found")
+        
+        # One lookup for shares that already exist, then one UPDATE and one INSERT
+        existing = {
+            share.shared_with_user_id: share
+            for share in DocumentShare.objects.filter(
                 document=document,
                 share_type='user',
-                shared_with_user=user,
+                shared_with_user__in=users,
                 is_active=True
-            ).first()
-            
-            if existing_share:
-                # Update existing share
-                existing_share.access_level = data['access_level']
-                existing_share.allow_download = data.get('allow_download', True)
-                existing_share.allow_reshare = data.get('allow_reshare', False)
-                existing_share.notify_on_access = data.get('notify_on_access', False)
-                existing_share.expires_at = data.get('expires_at')
-                existing_share.save()
-                shares.append(existing_share)
+            )
+        }
+        settings_fields = {
+            'access_level': data['access_level'],
+            'allow_download': data.get('allow_download', True),
+            'allow_reshare': data.get('allow_reshare', False),
+            'notify_on_access': data.get('notify_on_access', False),
+            'expires_at': data.get('expires_at'),
+        }
+        updated, created = [], []
+        for user in users:
+            share = existing.get(user.id)
+            if share:
+                for field, value in settings_fields.items():
+                    setattr(share, field, value)
+                updated.append(share)
             else:
-                # Create new share
-                share = DocumentShare.objects.create(
+                share = DocumentShare(
                     document=document,
                     share_type='user',
                     shared_with_user=user,
                     shared_by=shared_by,
-                    access_level=data['access_level'],
-                    allow_download=data.get('allow_download', True),
-                    allow_reshare=data.get('allow_reshare', False),
-                    notify_on_access=data.get('notify_on_access', False),
-                    expires_at=data.get('expires_at')
+                    **settings_fields
                 )
-                shares.append(share)
+                created.append(share)
+            shares.append(share)
+        
+        with transaction.atomic():
+            if updated:
+                DocumentShare.objects.bulk_update(updated, list(settings_fields))
+            if created:
+                DocumentShare.objects.bulk_create(created)
+            # Bulk writes skip the post_save receivers that republish the ACL
+            if shares:
+                refresh_document_acl(document.id)
         
         return shares
     
@@ -964,7 +1040,7 @@ class DocumentShareView(APIView):
         return ip
 
 
-class DocumentShareListView(generics.ListAPIView):
+class DocumentShareListView(AutoPrefetchMixin, generics.ListAPIView):
     """List document shares"""
     serializer_class = DocumentShareSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -975,30 +1051,52 @@ class DocumentShareListView(generics.ListAPIView):
         
         if user.role == 'admin':
             # Admin can see all shares
-            return DocumentShare.objects.all()
+            return DocumentShare.objects.with_related().with_expiry()
         else:
-            # Users can see shares they created or received
-            return DocumentShare.objects.filter(
+            # Users can see shares they created or received. Every branch tests the
+            # share's own columns (departments via a subquery), so rows never repeat
+            # and no DISTINCT is needed
+            return DocumentShare.objects.with_related().with_expiry().filter(
                 Q(shared_by=user) | 
                 Q(shared_with_user=user) |
-                Q(shared_with_department__in=user.department_assignments.filter(
-                    end_date__isnull=True
-                ).values_list('department', flat=True))
-            ).distinct()
+                Q(shared_with_department__in=get_user_department_ids(user))
+            )
+
+
+# Seconds within which repeat public link accesses leave last_accessed_at as is
+SHARE_ACCESS_TOUCH_INTERVAL = 60
 
 
 class DocumentSharedAccessView(APIView):
     """Access document via public link"""
     permission_classes = [permissions.AllowAny]
     
+    # Share columns either method reads
+    share_fields = ('id', 'document', 'access_level', 'allow_download', 'link_password', 'expires_at')
+    # Document columns the link preview renders, joined into the share lookup
+    preview_document_fields = (
+        'document__id', 'document__title', 'document__description',
+        'document__file_type', 'document__file_size', 'document__created_at'
+    )
+    
+    def _get_share(self, token, document_fields=()):
+        """Look up an active public link share by its URL token"""
+        token_bytes = share_token_bytes(token)
+        if token_bytes is None:
+            raise DocumentShare.DoesNotExist
+        shares = DocumentShare.objects.only(*self.share_fields, *document_fields)
+        if document_fields:
+            shares = shares.select_related('document')
+        return shares.get(
+            public_link_token_bin=token_bytes,
+            share_type='public_link',
+            is_active=True
+        )
+    
     def get(self, request, token):
         """Access document via public share token"""
         try:
-            share = DocumentShare.objects.get(
-                public_link_token=token,
-                share_type='public_link',
-                is_active=True
-            )
+            share = self._get_share(token, self.preview_document_fields)
         except DocumentShare.DoesNotExist:
             return Response(
                 {'error': 'Invalid or expired share link'},
@@ -1032,11 +1130,7 @@ class DocumentSharedAccessView(APIView):
     def post(self, request, token):
         """Access document with password if required"""
         try:
-            share = DocumentShare.objects.get(
-                public_link_token=token,
-                share_type='public_link',
-                is_active=True
-            )
+            share = self._get_share(token)
         except DocumentShare.DoesNotExist:
             return Response(
                 {'error': 'Invalid or expired share link'},
@@ -1063,23 +1157,31 @@ class DocumentSharedAccessView(APIView):
                     status=status.HTTP_401_UNAUTHORIZED
                 )
         
-        # Update access tracking
-        share.access_count += 1
-        share.last_accessed_at = timezone.now()
-        share.save()
-        
-        # Log access
-        DocumentActivity.objects.create(
-            document=share.document,
-            user=request.user if request.user.is_authenticated else None,
-            action='viewed',
-            description='Document accessed via public link',
-            ip_address=self._get_client_ip(request)
-        )
+        # Update access tracking. The count is buffered in Redis and flushed with
+        # an F() increment; the timestamp is only rewritten once it is stale, so a
+        # busy link does not produce a new row version on every access
+        bump_counter('documentshare', share.id, 'access_count')
+        now = timezone.now()
+        DocumentShare.objects.filter(
+            Q(last_accessed_at__isnull=True) |
+            Q(last_accessed_at__lt=now - timezone.timedelta(seconds=SHARE_ACCESS_TOUCH_INTERVAL)),
+            pk=share.pk
+        ).update(last_accessed_at=now)
+        
+        # Log access; activities need a user, so anonymous link visits are only counted
+        if request.user.is_authenticated:
+            DocumentActivity.log_async(
+                share.document_id,
+                request.user.id,
+                'viewed',
+                description='Document accessed via public link',
+                ip_address=self._get_client_ip(request)
+            )
         
         # Return document details
+        document = Document.objects.with_detail().get(pk=share.document_id)
         return Response({
-            'document': DocumentDetailSerializer(share.document, context={'request': request}).data,
+            'document': DocumentDetailSerializer(document, context={'request': request}).data,
             'access_level': share.access_level,
             'allow_download': share.allow_download,
         })
@@ -1101,7 +1203,7 @@ class RevokeDocumentShareView(APIView):
     def delete(self, request, share_id):
         """Revoke a document share"""
         try:
-            share = DocumentShare.objects.get(id=share_id)
+            share = DocumentShare.objects.select_related('document').get(id=share_id)
         except DocumentShare.DoesNotExist:
             return Response(
                 {'error': 'Share not found'},
@@ -1111,9 +1213,9 @@ class RevokeDocumentShareView(APIView):
         user = request.user
         
         # Check permissions to revoke share
-        if share.shared_by != user and user.role != 'admin':
+        if share.shared_by_id != user.id and user.role != 'admin':
             # Document owners can also revoke shares
-            if not (hasattr(share.document, 'owned_by') and share.document.owned_by == user):
+            if share.document.owned_by_id != user.id:
                 log_security_event(
                     user=user,
                     action='revoke_share_denied',
@@ -1126,15 +1228,15 @@ class RevokeDocumentShareView(APIView):
                     status=status.HTTP_403_FORBIDDEN
                 )
         
-        # Revoke the share
+        # Revoke the share; save() rather than update() so the ACL refresh signal fires
         share.is_active = False
-        share.save()
+        share.save(update_fields=['is_active'])
         
         # Log revocation
-        DocumentActivity.objects.create(
-            document=share.document,
-            user=user,
-            action='shared',
+        DocumentActivity.log_async(
+            share.document_id,
+            user.id,
+            'shared',
             description='Document share revoked',
             ip_address=self._get_client_ip(request)
         )
@@ -0,0 +1,72 @@
+"""
+Redis-backed circuit breaker shared by every process talking to a dependency
+"""
+import logging
+import redis
+from portal_backend.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose breaker is open"""
+
+
+class CircuitBreaker:
+    """
+    Trips open after fail_max failures within a fixed window of window
+    seconds and stays open for reset_timeout seconds, during which callers
+    skip the dependency. Any success clears the failure count.
+    
+    After the open period the breaker is half-open: until a call succeeds,
+    a single failure trips it again. State lives in Redis so all workers
+    share it; if Redis is unavailable the breaker stays closed.
+    """
+    
+    def __init__(self, name: str, fail_max: int = 5, window: int = 60, reset_timeout: int = 30):
+        self.fail_max = fail_max
+        self.window = window
+        self.reset_timeout = reset_timeout
+        self.open_key = f'cb:{name}:open'
+        self.failures_key = f'cb:{name}:failures'
+        self.half_open_key = f'cb:{name}:half_open'
+    
+    def is_open(self) -> bool:
+        try:
+            return bool(get_redis().exists(self.open_key))
+        except redis.RedisError as e:
+            logger.warning(f"Circuit breaker state unavailable: {e}")
+            return False
+    
+    def check(self) -> None:
+        """Raise CircuitOpenError if the breaker is open"""
+        if self.is_open():
+            raise CircuitOpenError(self.open_key)
+    
+    def record_success(self) -> None:
+        """Close the breaker fully: drop the failure count and any half-open state"""
+        try:
+            get_redis().delete(self.failures_key, self.half_open_key)
+        except redis.RedisError as e:
+            logger.warning(f"Circuit breaker state unavailable: {e}")
+    
+    def record_failure(self) -> None:
+        try:
+            client = get_redis()
+            pipe = client.pipeline()
+            pipe.incr(self.failures_key)
+            pipe.exists(self.half_open_key)
+            failures, half_open = pipe.execute()
+            if failures == 1:
+                # The window starts at its first failure and is not extended by later ones
+                client.expire(self.failures_key, self.window)
+            if failures >= self.fail_max or half_open:
+                pipe = client.pipeline()
+                pipe.set(self.open_key, '1', ex=self.reset_timeout)
+                pipe.delete(self.failures_key)
+                # Half-open for a window past the open period, until a call succeeds
+                pipe.set(self.half_open_key, '1', ex=self.reset_timeout + self.window)
+                pipe.execute()
+                logger.warning(f"Circuit {self.open_key} opened for {self.reset_timeout}s after {failures} failures")
+        except redis.RedisError as e:
+            logger.warning(f"Circuit breaker state unavailable: {e}")
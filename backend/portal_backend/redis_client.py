@@ -0,0 +1,32 @@
+"""
+Shared Redis connection for caches, counters and queues
+"""
+import redis
+from django.conf import settings
+
+_client = None
+
+
+def get_redis() -> redis.Redis:
+    """Return the process-wide Redis client (connection-pooled, thread-safe)"""
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(
+            settings.REDIS_URL,
+            socket_timeout=0.5,
+            socket_connect_timeout=0.5
+        )
+    return _client
+
+
+def delete_pattern(pattern: str) -> None:
+    """Delete all keys matching a glob pattern using SCAN + UNLINK"""
+    client = get_redis()
+    batch = []
+    for key in client.scan_iter(match=pattern, count=500):
+        batch.append(key)
+        if len(batch) >= 500:
+            client.unlink(*batch)
+            batch = []
+    if batch:
+        client.unlink(*batch)
@@ -50,6 +50,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     
     # Third party apps
     'rest_framework',
@@ -158,6 +159,11 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# When set (e.g. '/protected/'), document downloads are handed to nginx through
+# X-Accel-Redirect to this internal location aliased to MEDIA_ROOT, instead of
+# being streamed by Django. Only enable it when requests reach Django through nginx.
+SENDFILE_ACCEL_PREFIX = os.environ.get('SENDFILE_ACCEL_PREFIX') or None
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -268,12 +274,17 @@ CORS_ALLOWED_METHODS = [
 
 # Vector Database Configuration
 VECTOR_DB_URL = os.environ.get('VECTOR_DB_URL', 'http://localhost:6333')
+# Talk to Qdrant over gRPC (protobuf vectors instead of JSON float arrays); host from VECTOR_DB_URL
+VECTOR_DB_PREFER_GRPC = os.environ.get('VECTOR_DB_PREFER_GRPC', 'True') == 'True'
+VECTOR_DB_GRPC_PORT = int(os.environ.get('VECTOR_DB_GRPC_PORT', '6334'))
 VECTOR_COLLECTION_NAME = 'documents'
 
 # AI Configuration
 USE_LOCAL_EMBEDDINGS = True  # Use local sentence-transformers instead of OpenAI
 EMBEDDING_MODEL = 'all-MiniLM-L6-v2'  # Local embedding model
+EMBEDDING_TORCH_COMPILE = os.environ.get('EMBEDDING_TORCH_COMPILE', 'False') == 'True'  # torch.compile the local model's transformer
 CHUNK_SIZE = 512  # Text chunk size for embeddings
+CHUNK_OVERLAP = 75  # Characters of trailing sentences repeated at the start of the next chunk
 
 # OpenAI Configuration (for when not using local embeddings)
 OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY', None)
@@ -283,6 +294,7 @@ OLLAMA_URL = os.environ.get('OLLAMA_URL', 'http://ollama:11434')
 OLLAMA_MODEL = os.environ.get('OLLAMA_MODEL', 'tinyllama')
 MAX_CONTEXT_DOCS = int(os.environ.get('MAX_CONTEXT_DOCS', '5'))
 MAX_CONTEXT_LENGTH = int(os.environ.get('MAX_CONTEXT_LENGTH', '4000'))
+AI_AUDIT_ACCESS = os.environ.get('AI_AUDIT_ACCESS', 'False') == 'True'  # Record AI context/denial decisions as DocumentActivity rows
 
 # Redis Configuration for Celery
 REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
@@ -295,6 +307,32 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 
+# Indexing is slow and uneven, so it gets its own queue, and workers reserve one
+# message at a time instead of holding a prefetched backlog behind a long task
+CELERY_TASK_ROUTES = {
+    'documents.tasks.index_document_task': {'queue': 'indexing'},
+    'documents.tasks.bulk_index_documents_task': {'queue': 'indexing'},
+}
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+# Not optional: buffered counters (utils.bump_counter) and queued activities
+# (DocumentActivity.log_async) only reach the database through these tasks, so
+# every deployment runs exactly one `celery -A portal_backend beat` process
+# (the celery-beat service in the compose files)
+CELERY_BEAT_SCHEDULE = {
+    'flush-document-counters': {
+        'task': 'documents.tasks.flush_counters_task',
+        'schedule': float(os.environ.get('COUNTER_FLUSH_INTERVAL', '30')),
+    },
+    'drain-activity-queue': {
+        'task': 'documents.tasks.drain_activity_queue_task',
+        'schedule': float(os.environ.get('ACTIVITY_FLUSH_INTERVAL', '10')),
+    },
+    'ensure-activity-partitions': {
+        'task': 'documents.tasks.ensure_activity_partitions',
+        'schedule': 24 * 60 * 60,
+    },
+}
+
 # File processing settings
 MAX_EMBEDDING_LENGTH = 8192  # Maximum tokens for embedding
 